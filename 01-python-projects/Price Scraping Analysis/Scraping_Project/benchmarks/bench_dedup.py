@@ -0,0 +1,82 @@
+# Benchmark for the streaming spec-row deduplication used by SpecPipeline.
+#
+# Usage (from Scraping_Project):
+#     python benchmarks/bench_dedup.py
+#     python benchmarks/bench_dedup.py --sizes 10000 100000 --legacy
+#
+# Rows are synthetic (providerKey, SpecificationKey, SpecificationValue)
+# tuples with ~10% duplicates, similar to a Gigatron spec crawl.
+
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy'))
+
+from project_nonproxy.dedup import FingerprintSet
+
+SPEC_KEYS = [f"Specifikacija {i}" for i in range(787)]
+SPEC_VALUES = ["Da", "Ne", "Samsung", "LG", "Crna", "Bela"] + [f"{i} W" for i in range(200)]
+
+
+def generate_rows(count, seed=42):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        if rows and rnd.random() < 0.1:
+            rows.append(rows[rnd.randrange(len(rows))])  # duplicate
+            continue
+        gtin = str(8800000000000 + i // 25)  # ~25 specs per product
+        rows.append([gtin, rnd.choice(SPEC_KEYS), rnd.choice(SPEC_VALUES)])
+    return rows
+
+
+def run_streaming(rows, path):
+    seen = FingerprintSet()
+    written = 0
+    start = time.perf_counter()
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+        for row in rows:
+            if seen.add(row):
+                writer.writerow(row)
+                written += 1
+    return time.perf_counter() - start, written
+
+
+def run_legacy(rows):
+    data = []
+    start = time.perf_counter()
+    for row in rows:
+        if row not in data:
+            data.append(row)
+    return time.perf_counter() - start, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spec-row dedup throughput')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy', action='store_true', help='also run the old list-based dedup (slow above 10k)')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'mode':>10} {'seconds':>9} {'rows/s':>12} {'written':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            rows = generate_rows(size)
+            elapsed, written = run_streaming(rows, os.path.join(tmp, 'spec.csv'))
+            print(f"{size:>10} {'streaming':>10} {elapsed:>9.3f} {size / elapsed:>12,.0f} {written:>10}")
+            if args.legacy:
+                elapsed, written = run_legacy(rows)
+                print(f"{size:>10} {'legacy':>10} {elapsed:>9.3f} {size / elapsed:>12,.0f} {written:>10}")
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS: {peak_mb:.1f} MB (includes the generated input rows)")
+
+
+if __name__ == '__main__':
+    main()
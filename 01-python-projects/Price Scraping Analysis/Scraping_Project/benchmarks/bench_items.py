@@ -0,0 +1,127 @@
+# Benchmark for the Selenium spider's item classes (project_nonproxy.records).
+#
+# Compares the old dict subclasses (a new OrderedDict schema per instance,
+# filled with empty strings) with the Record classes in spiders/tehnomanija.py:
+#   - create + fill + serialise to a CSV row (what save_product/CSVPipeline do)
+#   - memory of N live items, measured with tracemalloc
+#
+# Usage (from Scraping_Project):
+#     python benchmarks/bench_items.py
+#     python benchmarks/bench_items.py --count 500000
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy'))
+
+from project_nonproxy.spiders.tehnomanija import MediaItem, ProductItem, SpecItem
+
+
+# The item classes as they were before records.py
+class LegacyProductItem(dict):
+    def __init__(self):
+        super().__init__()
+        self.fields = OrderedDict([(field, '') for field in ProductItem.fields])
+        for field in self.fields:
+            self[field] = ""
+
+
+class LegacySpecItem(dict):
+    def __init__(self):
+        super().__init__()
+        self.fields = OrderedDict([(field, '') for field in SpecItem.fields])
+        for field in self.fields:
+            self[field] = ""
+
+
+class LegacyMediaItem(dict):
+    def __init__(self):
+        super().__init__()
+        self.fields = OrderedDict([(field, '') for field in MediaItem.fields])
+        for field in self.fields:
+            self[field] = ""
+
+
+def legacy_row(item):
+    return [item.get(field, "") for field in item.fields.keys()]
+
+
+def record_row(item):
+    return item.to_row()
+
+
+KEYS = [f"Specifikacija {i}" for i in range(787)]
+VALUES = ["Da", "Ne", "Samsung", "LG", "Crna", "Bela"]
+
+
+def make_specs(spec_class, count):
+    items = []
+    for i in range(count):
+        item = spec_class()
+        item['providerKey'] = '8806094934126'
+        item['SpecificationKey'] = KEYS[i % len(KEYS)]
+        item['SpecificationValue'] = VALUES[i % len(VALUES)]
+        items.append(item)
+    return items
+
+
+def make_products(product_class, count):
+    items = []
+    for i in range(count):
+        item = product_class()
+        item['providerkey'] = item['gtin'] = '8806094934126'
+        item['brand'] = 'Samsung'
+        item['title'] = 'Samsung televizor QE65Q80CATXXH'
+        item['price'] = '99.999'
+        items.append(item)
+    return items
+
+
+def make_media(media_class, count):
+    items = []
+    for i in range(count):
+        item = media_class()
+        item['providerKey'] = item['gtin'] = '8806094934126'
+        for n in range(1, 6):
+            item[f'imageurl_{n}'] = 'https://www.tehnomanija.rs/media/catalog/product/q/e/qe65.jpg'
+        items.append(item)
+    return items
+
+
+def run(label, make, item_class, to_row, count):
+    start = time.perf_counter()
+    for item in make(item_class, count):
+        to_row(item)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    items = make(item_class, count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    print(f"{label:<16} {count / elapsed:>14,.0f} {size / count:>12.0f}")
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Item allocation/serialisation cost and memory')
+    parser.add_argument('--count', type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'items':<16} {'items/s':>14} {'bytes/item':>12}")
+    for kind, make, legacy, record in (
+        ('spec', make_specs, LegacySpecItem, SpecItem),
+        ('product', make_products, LegacyProductItem, ProductItem),
+        ('media', make_media, LegacyMediaItem, MediaItem),
+    ):
+        legacy_time, legacy_size = run(f'{kind} (dict)', make, legacy, legacy_row, args.count)
+        record_time, record_size = run(f'{kind} (record)', make, record, record_row, args.count)
+        print(f"{'':<16} {legacy_time / record_time:>13.1f}x {legacy_size / record_size:>11.1f}x smaller\n")
+
+
+if __name__ == '__main__':
+    main()
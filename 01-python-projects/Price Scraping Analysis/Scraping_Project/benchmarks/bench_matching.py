@@ -0,0 +1,86 @@
+# Benchmark for the cross-retailer matching engine (project_nonproxy.matching).
+#
+# Usage (from Scraping_Project):
+#     python benchmarks/bench_matching.py
+#     python benchmarks/bench_matching.py --sizes 10000 100000 200000
+#
+# Both catalogues are synthetic. Half of the products are sold by both
+# retailers: 60% of those share a valid GTIN, the rest only have a URL-tail
+# "GTIN" on the Tehnomanija side and a reworded title, like the real data.
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy'))
+
+from project_nonproxy.matching import HAS_NUMPY, match_products
+
+BRANDS = ["Samsung", "LG", "Sony", "Gorenje", "Bosch", "Apple", "Xiaomi", "Lenovo", "Tesla", "Philips"]
+TYPES = ["televizor", "frizider", "ves masina", "laptop", "mobilni telefon", "usisivac", "mikrotalasna"]
+EXTRAS = ["crni", "beli", "4K", "Smart", "Wi-Fi", "A++", "inverter", "128GB", "OLED", "No Frost"]
+
+
+def gtin13(number):
+    digits = str(number).zfill(12)[-12:]
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(digits)))
+    return digits + str((10 - total % 10) % 10)
+
+
+def generate(count, seed=42):
+    rnd = random.Random(seed)
+    gigatron, tehnomanija, expected = [], [], 0
+    for i in range(count):
+        brand = rnd.choice(BRANDS)
+        model = f"{brand[:2].upper()}{rnd.randrange(10, 99)}{''.join(rnd.choices('ABCDEFGHKLMNPRSTX', k=3))}{i}"
+        product_type = rnd.choice(TYPES)
+        extras = rnd.sample(EXTRAS, 3)
+        gtin = gtin13(880000000000 + i)
+        gigatron.append({
+            'providerkey': gtin, 'gtin': gtin, 'brand': brand, 'manufacturerkey': model,
+            'title': f"{brand} {product_type} {model} {' '.join(extras)}", 'price': str(rnd.randrange(5000, 300000)),
+        })
+        if rnd.random() < 0.5:
+            continue  # Gigatron only
+        expected += 1
+        shared = rnd.random() < 0.6
+        tehnomanija.append({
+            'providerkey': gtin if shared else f"{rnd.randrange(100000, 999999)}",
+            'gtin': gtin if shared else f"{rnd.randrange(100000, 999999)}",
+            'brand': brand,
+            'title': f"{product_type.capitalize()} {brand} {model}, {', '.join(reversed(extras))}",
+            'price': str(rnd.randrange(5000, 300000)),
+        })
+    rnd.shuffle(tehnomanija)
+    return gigatron, tehnomanija, expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Matching engine throughput and quality')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 100_000])
+    parser.add_argument('--threshold', type=float, default=0.6)
+    args = parser.parse_args()
+
+    print(f"MinHash backend: {'numpy' if HAS_NUMPY else 'pure Python'}")
+    print(f"{'products':>10} {'seconds':>9} {'products/s':>12} {'gtin':>8} {'fuzzy':>8} {'recall':>8} {'precision':>10}")
+    for size in args.sizes:
+        gigatron, tehnomanija, expected = generate(size)
+        start = time.perf_counter()
+        matches = match_products(gigatron, tehnomanija, threshold=args.threshold)
+        elapsed = time.perf_counter() - start
+        # Synthetic products have the same manufacturer key, the title suffix is unique
+        correct = sum(1 for match in matches if match['a_title'].split()[-4] in match['b_title'])
+        by_gtin = sum(1 for match in matches if match['method'] == 'gtin')
+        total = len(gigatron) + len(tehnomanija)
+        print(f"{size:>10} {elapsed:>9.2f} {total / elapsed:>12,.0f} {by_gtin:>8} {len(matches) - by_gtin:>8} "
+              f"{correct / expected:>8.1%} {correct / max(len(matches), 1):>10.1%}")
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS: {peak_mb:.1f} MB (includes the generated catalogues)")
+
+
+if __name__ == '__main__':
+    main()
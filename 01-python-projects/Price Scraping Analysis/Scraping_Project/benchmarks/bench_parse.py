@@ -0,0 +1,188 @@
+# Offline parse benchmark: replays saved product pages through the extraction
+# code without touching the live sites.
+#
+#   - gigatron: fixtures/gigatron/*.html through GigatronSpider.parse, plus the
+#     per-stage time of parse_product (DOM, JSON-LD, specs, description, images)
+#     the extraction plan cache hit rates and the throughput with
+#     GIGATRON_JSON_LD_ONLY (no DOM at all)
+#   - tehnomanija: fixtures/tehnomanija/*.html through extract_product_html
+#     (the HTTP fast path), split into DOM parsing and extraction
+#
+# Reports pages/s, pages/min and per-page Python allocations (tracemalloc
+# peak and blocks still alive afterwards, libxml2's own memory is not traced).
+# With --min-pages-per-minute the script exits with 1 if any site is slower,
+# so it can be used as a regression check.
+#
+# Usage (from Scraping_Project):
+#     python benchmarks/bench_parse.py
+#     python benchmarks/bench_parse.py --site gigatron --rounds 200 --min-pages-per-minute 200
+
+import argparse
+import glob
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'project_nonproxy'))
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from project_nonproxy.spiders.gigatron import GigatronSpider
+from project_nonproxy.tehnomanija_extract import extract_product_html, lxml_html
+
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+
+GIGATRON_STAGES = ('extract_json_ld', 'extract_specs', 'extract_description', 'extract_images')
+
+
+def load_fixtures(site, base_url):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, site, '*.html'))):
+        slug = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            pages.append((base_url + slug, f.read()))
+    return pages
+
+
+def make_response(url, body):
+    return HtmlResponse(url=url, body=body, encoding='utf-8', request=Request(url))
+
+
+def new_gigatron_spider(json_ld_only=False):
+    crawler = get_crawler(GigatronSpider, {'GIGATRON_JSON_LD_ONLY': json_ld_only})
+    spider = GigatronSpider.from_crawler(crawler)
+    spider.logger.logger.setLevel(logging.CRITICAL)  # no per-page log lines in the timings
+    return spider
+
+
+def gigatron_page(spider, url, body):
+    return sum(1 for _ in spider.parse(make_response(url, body)))
+
+
+def gigatron_stages(spider, url, body, totals):
+    response = make_response(url, body)
+    start = time.perf_counter()
+    response.selector  # parsel builds the lxml tree lazily, on first use
+    totals['dom'] += time.perf_counter() - start
+    for stage in GIGATRON_STAGES:
+        start = time.perf_counter()
+        getattr(spider, stage)(response)
+        totals[stage] += time.perf_counter() - start
+
+
+def tehnomanija_page(url, body):
+    return 1 if extract_product_html(body) else 0
+
+
+def tehnomanija_stages(url, body, totals):
+    start = time.perf_counter()
+    lxml_html.fromstring(body)
+    dom = time.perf_counter() - start
+    start = time.perf_counter()
+    extract_product_html(body)
+    total = time.perf_counter() - start
+    totals['dom'] += dom
+    totals['extract'] += max(0.0, total - dom)
+
+
+def measure_throughput(pages, parse_page, rounds):
+    timings = []
+    items = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for url, body in pages:
+            items += parse_page(url, body)
+        timings.append(time.perf_counter() - start)
+    # Median round, so one slow round (GC, other processes) does not skew it
+    return len(pages) / statistics.median(timings), items // rounds
+
+
+def measure_allocations(pages, parse_page):
+    parse_page(*pages[0])  # warm up imports and caches outside the trace
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peaks = []
+        for url, body in pages:
+            tracemalloc.reset_peak()
+            start_size = tracemalloc.get_traced_memory()[0]
+            parse_page(url, body)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start_size)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Blocks that outlive the parse (caches, leaks)
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return statistics.mean(peaks) / 1024, retained / len(pages)
+
+
+def measure_stages(pages, stage_page, stage_names, rounds):
+    totals = dict.fromkeys(stage_names, 0.0)
+    for _ in range(rounds):
+        for url, body in pages:
+            stage_page(url, body, totals)
+    return {stage: total / (rounds * len(pages)) for stage, total in totals.items()}
+
+
+def report(site, pages, parse_page, stage_page, stage_names, rounds):
+    pages_per_sec, items_per_round = measure_throughput(pages, parse_page, rounds)
+    peak_kib, retained_blocks = measure_allocations(pages, parse_page)
+    stages = measure_stages(pages, stage_page, stage_names, rounds)
+
+    print(f"\n== {site}: {len(pages)} fixture pages x {rounds} rounds, {items_per_round} items per round")
+    print(f"throughput:   {pages_per_sec:10.1f} pages/s  ({pages_per_sec * 60:,.0f} pages/min)")
+    print(f"allocations:  {peak_kib:10.1f} KiB/page peak, {retained_blocks:.0f} blocks/page retained")
+    stage_total = sum(stages.values())
+    for stage, seconds in stages.items():
+        share = seconds / stage_total * 100 if stage_total else 0
+        print(f"  {stage:<22} {seconds * 1e6:10.1f} us/page  {share:5.1f}%")
+    return pages_per_sec * 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline parse benchmark over saved product pages')
+    parser.add_argument('--site', choices=['gigatron', 'tehnomanija', 'all'], default='all')
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--min-pages-per-minute', type=float, default=None,
+                        help='exit with status 1 if a site parses slower than this')
+    args = parser.parse_args()
+
+    results = {}
+    if args.site in ('gigatron', 'all'):
+        pages = load_fixtures('gigatron', 'https://gigatron.rs/proizvod/')
+        spider = new_gigatron_spider()
+        results['gigatron'] = report(
+            'gigatron', pages,
+            lambda url, body: gigatron_page(spider, url, body),
+            lambda url, body, totals: gigatron_stages(spider, url, body, totals),
+            ('dom',) + GIGATRON_STAGES, args.rounds,
+        )
+        for plans in (spider.description_plans, spider.image_plans):
+            print(f"plan cache:   {plans.name} {plans.hit_rate:.1%} hit rate")
+        json_ld_spider = new_gigatron_spider(json_ld_only=True)
+        pages_per_sec, _ = measure_throughput(
+            pages, lambda url, body: gigatron_page(json_ld_spider, url, body), args.rounds,
+        )
+        print(f"json-ld only: {pages_per_sec:10.1f} pages/s  ({pages_per_sec * 60:,.0f} pages/min)")
+    if args.site in ('tehnomanija', 'all'):
+        pages = load_fixtures('tehnomanija', 'https://www.tehnomanija.rs/')
+        results['tehnomanija'] = report(
+            'tehnomanija', pages, tehnomanija_page, tehnomanija_stages,
+            ('dom', 'extract'), args.rounds,
+        )
+
+    if args.min_pages_per_minute is not None:
+        slow = {site: rate for site, rate in results.items() if rate < args.min_pages_per_minute}
+        for site, rate in slow.items():
+            print(f"REGRESSION: {site} parses {rate:,.0f} pages/min, below {args.min_pages_per_minute:,.0f}")
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
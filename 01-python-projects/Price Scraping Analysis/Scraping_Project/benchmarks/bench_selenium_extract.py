@@ -0,0 +1,123 @@
+# Micro-benchmark: per-product WebDriver extraction cost on a Tehnomanija page.
+#
+# Serves benchmarks/fixtures/tehnomanija locally, loads the product page in
+# headless Chrome once and then times
+#   - legacy: one find_element / .text / get_attribute round-trip per field,
+#     script, spec <li>/<span> and fotorama frame (the old extraction code)
+#   - script: the single execute_script(PRODUCT_PAYLOAD_SCRIPT) call
+# Navigation is the same for both, so only extraction time is compared.
+#
+# Usage (from Scraping_Project, needs Chrome):
+#     python benchmarks/bench_selenium_extract.py --runs 20
+
+import argparse
+import functools
+import http.server
+import os
+import statistics
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'project_nonproxy'))
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+from webdriver_manager.chrome import ChromeDriverManager
+
+from project_nonproxy.tehnomanija_extract import PRODUCT_PAYLOAD_SCRIPT, payload_from_script
+
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures', 'tehnomanija')
+FIXTURE_PAGE = 'samsung-televizor-qe65q80catxxh-8806094934126.html'
+
+
+def serve_fixtures():
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=FIXTURE_DIR)
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_extract(driver):
+    def safe_find_element(selector, attribute=None):
+        try:
+            element = driver.find_element(By.CSS_SELECTOR, selector)
+            return element.get_attribute(attribute) if attribute else element.text.strip()
+        except NoSuchElementException:
+            return None
+
+    payload = {'specs': [], 'images': []}
+    payload['gtin'] = safe_find_element('div.loadbeeTabContent', 'data-loadbee-gtin')
+    payload['title'] = safe_find_element('h1.page-title span') or safe_find_element('h1.page-title')
+    for script in driver.find_elements(By.TAG_NAME, 'script'):
+        content = script.get_attribute('innerHTML') or ""
+        if '"brand":"' in content:
+            start = content.find('"brand":"') + len('"brand":"')
+            payload['brand'] = content[start:content.find('"', start)]
+            break
+    price_elements = driver.find_elements(By.CSS_SELECTOR, 'span[data-price-type="finalPrice"] > span')
+    payload['price'] = price_elements[0].text.replace('RSD', '').strip() if price_elements else None
+    payload['longdescription'] = safe_find_element('meta[property="og:description"]', 'content')
+    for row in driver.find_elements(By.CSS_SELECTOR, '#product-attribute-specs-table tbody tr td ul li'):
+        spans = row.find_elements(By.TAG_NAME, 'span')
+        if len(spans) >= 2:
+            key, value = spans[0].text.strip(), spans[-1].text.strip()
+            if key and value and key != value:
+                payload['specs'].append((key, value))
+    for frame in driver.find_elements(By.CSS_SELECTOR, '.fotorama__stage__frame[href]')[:10]:
+        url = frame.get_attribute('href')
+        if url and 'data:' not in url:
+            payload['images'].append(url.strip())
+    return payload
+
+
+def script_extract(driver):
+    return payload_from_script(driver.execute_script(PRODUCT_PAYLOAD_SCRIPT))
+
+
+def time_runs(func, driver, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(driver)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Selenium extraction round-trip benchmark')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    server = serve_fixtures()
+    options = Options()
+    for argument in ('--headless=new', '--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage'):
+        options.add_argument(argument)
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    try:
+        driver.get(f'http://127.0.0.1:{server.server_port}/{FIXTURE_PAGE}')
+        legacy_times, legacy_payload = time_runs(legacy_extract, driver, args.runs)
+        script_times, script_payload = time_runs(script_extract, driver, args.runs)
+    finally:
+        driver.quit()
+        server.shutdown()
+
+    for field in ('gtin', 'title', 'brand', 'price', 'specs', 'images'):
+        if legacy_payload.get(field) != script_payload.get(field):
+            print(f"WARNING: '{field}' differs between legacy and script extraction")
+
+    legacy_ms = statistics.median(legacy_times) * 1000
+    script_ms = statistics.median(script_times) * 1000
+    print(f"specs: {len(script_payload['specs'])}, images: {len(script_payload['images'])}, runs: {args.runs}")
+    print(f"legacy (per-element round-trips): {legacy_ms:8.1f} ms/product (median)")
+    print(f"single execute_script:            {script_ms:8.1f} ms/product (median)")
+    print(f"speed-up: {legacy_ms / script_ms:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Checkpoint journal for resumable Selenium runs.
+#
+# Append-only JSON lines file. After the sitemaps are collected a "frontier"
+# record says the frontier file is complete. Every `every` finished products
+# (or `interval` seconds) the output files are flushed and fsynced and a
+# "checkpoint" record stores the URLs finished since the last checkpoint plus
+# the byte size of every output file at that moment.
+#
+# On --resume the outputs are truncated back to the last checkpoint (rows
+# written after it belong to products that are not in the journal), the
+# pipelines rebuild their seen keys from the rows that are left, and finished
+# URLs are skipped. At most one checkpoint interval of work is redone.
+
+import json
+import os
+import time
+
+
+class CheckpointJournal:
+    def __init__(self, path, every=25, interval=60):
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.pending = []
+        self.last_checkpoint = time.monotonic()
+        # Filled by load()
+        self.completed = set()
+        self.offsets = {}
+        self.frontier_path = None
+
+    def load(self):
+        """Read the journal, return the set of finished URLs"""
+        self.completed = set()
+        self.offsets = {}
+        self.frontier_path = None
+        if not os.path.exists(self.path):
+            return self.completed
+        good_end = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash mid-write
+                good_end += len(line)
+                if record.get('event') == 'frontier':
+                    self.frontier_path = record.get('path')
+                elif record.get('event') == 'checkpoint':
+                    self.completed.update(record.get('done', []))
+                    self.offsets = record.get('offsets', {})
+        if good_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+        return self.completed
+
+    def reset(self):
+        """Start a new run: forget everything in the journal"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.completed = set()
+        self.offsets = {}
+        self.frontier_path = None
+        self.pending = []
+
+    def _append(self, record):
+        # Opened per record, checkpoints are rare and the file may be written
+        # by the pool writer process after the main process is done with it
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def mark_frontier_complete(self, frontier_path, count):
+        self.frontier_path = frontier_path
+        self._append({'event': 'frontier', 'path': frontier_path, 'urls': count, 'time': time.time()})
+
+    def mark_done(self, url):
+        """Record a finished URL, return True if a checkpoint is due"""
+        self.pending.append(url)
+        return len(self.pending) >= self.every or time.monotonic() - self.last_checkpoint >= self.interval
+
+    def checkpoint(self, pipelines):
+        """Make the pipeline outputs durable, then journal the finished URLs and file sizes"""
+        offsets = {pipeline.filename: pipeline.checkpoint() for pipeline in pipelines}
+        self._append({'event': 'checkpoint', 'done': self.pending, 'offsets': offsets, 'time': time.time()})
+        self.completed.update(self.pending)
+        self.offsets = offsets
+        self.pending = []
+        self.last_checkpoint = time.monotonic()
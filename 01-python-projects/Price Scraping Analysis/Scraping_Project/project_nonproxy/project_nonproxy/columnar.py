@@ -0,0 +1,76 @@
+# Columnar Parquet output for the pipelines.
+#
+# Rows are buffered and written as Parquet row groups as items arrive.
+# Text columns are dictionary-encoded (brand, productType, spec keys/values
+# repeat a lot) and numeric columns are typed, so Power BI can load the
+# files without re-parsing and re-typing the ';'-delimited CSVs.
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Columns stored as float64, everything else is a dictionary-encoded string
+FLOAT_FIELDS = {'price'}
+
+
+def to_float(value):
+    """Parse prices like 12999, "12999.00", "12.999,00" or "12.999" (RSD)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace('RSD', '').replace(' ', '').replace('\xa0', '').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    elif text.count('.') > 1 or (text.count('.') == 1 and len(text.split('.')[1]) == 3):
+        text = text.replace('.', '')  # thousands separator
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class ParquetSink:
+    def __init__(self, filename, field_names, row_group_size=50000, compression='zstd'):
+        if not HAS_PYARROW:
+            raise ImportError("pyarrow is required for parquet output")
+        self.filename = filename
+        self.field_names = list(field_names)
+        self.row_group_size = row_group_size
+        self.schema = pa.schema([
+            pa.field(name, pa.float64() if name in FLOAT_FIELDS else pa.string())
+            for name in self.field_names
+        ])
+        self.columns = [[] for _ in self.field_names]
+        self.buffered = 0
+        self.count = 0
+        self.writer = pq.ParquetWriter(
+            filename, self.schema, compression=compression, use_dictionary=True
+        )
+
+    def write(self, row):
+        for column, name, value in zip(self.columns, self.field_names, row):
+            if name in FLOAT_FIELDS:
+                column.append(to_float(value))
+            else:
+                column.append(None if value is None or value == '' else str(value))
+        self.buffered += 1
+        self.count += 1
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as one row group"""
+        if not self.buffered:
+            return
+        table = pa.Table.from_arrays(self.columns, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.columns = [[] for _ in self.field_names]
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
@@ -0,0 +1,197 @@
+# Streaming gzip/zstd compression for the CSV writers.
+#
+# StreamWriter is a text sink for csv.writer: rows are encoded and handed to
+# the compressor as they are written, nothing is staged in a plain file.
+# end_frame() closes the current gzip member / zstd frame and returns the
+# compressed file size. Concatenated members/frames are still one valid .gz
+# or .zst file, so a file truncated back to such an offset can be appended to
+# (that is how the Selenium spider's checkpoints and --resume work).
+#
+# open_text() reads plain, .gz and .zst files (all members/frames) as text.
+# read_all() also reports whether the last member/frame is complete (a crash
+# mid-write leaves an unfinished one that must not be appended to), and
+# complete_size() tells where the complete part of such a file ends.
+
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+FAST_LEVELS = {'gzip': 1, 'zstd': 1}  # Temporary files: speed over ratio
+READ_CHUNK = 1 << 20
+
+
+def resolve_compression(compression):
+    """Normalised codec name ('gzip', 'zstd' or None)"""
+    compression = (compression or '').lower() or None
+    if compression in ('gz', 'gzip'):
+        return 'gzip'
+    if compression in ('zst', 'zstd', 'zstandard'):
+        if not HAS_ZSTD:
+            # Not silently gzip: the file would get a different format and suffix than configured
+            raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+        return 'zstd'
+    if compression in (None, 'none', 'off'):
+        return None
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def compressed_filename(filename, compression):
+    return filename + SUFFIXES.get(compression, '')
+
+
+def compression_from_filename(filename):
+    for compression, suffix in SUFFIXES.items():
+        if filename.endswith(suffix):
+            return compression
+    return None
+
+
+class StreamWriter:
+    def __init__(self, path, compression=None, level=None, append=False):
+        self.path = path
+        self.compression = compression
+        self.level = DEFAULT_LEVELS.get(compression) if level is None else level
+        self.raw = open(path, 'ab' if append else 'wb')
+        self.stream = None  # Started by the first write, so the file ends on a frame boundary until then
+
+    def _start_frame(self):
+        if self.compression == 'gzip':
+            self.stream = gzip.GzipFile(filename='', fileobj=self.raw, mode='wb', compresslevel=self.level, mtime=0)
+        elif self.compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=self.level).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+    def write(self, text):
+        if self.stream is None:
+            self._start_frame()
+        return self.stream.write(text.encode('utf-8'))
+
+    def flush(self):
+        """Hand everything written so far to the OS (compressed data the codec has produced)"""
+        if self.compression == 'zstd' and self.stream is not None:
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+
+    def end_frame(self):
+        """End the current member/frame and flush, return the file size in bytes"""
+        if self.stream is not None and self.stream is not self.raw:
+            self.stream.close()  # Writes the trailer, the raw file stays open
+            self.stream = None
+        self.raw.flush()
+        return self.raw.tell()
+
+    def fileno(self):
+        return self.raw.fileno()
+
+    def close(self):
+        if self.stream is not None and self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_text(path, compression=None):
+    """Text reader for plain, gzip or zstd files, compression defaults to the file suffix"""
+    compression = compression or compression_from_filename(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if compression == 'zstd':
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8', newline='')
+    return open(path, newline='', encoding='utf-8')
+
+
+def _decompressor(compression):
+    if compression == 'gzip':
+        return zlib.decompressobj(wbits=31)  # One gzip member
+    return zstandard.ZstdDecompressor().decompressobj()  # One zstd frame
+
+
+def read_all(path, compression=None):
+    """(contents as bytes, whether the file ends on a complete member/frame)"""
+    compression = compression or compression_from_filename(path)
+    with open(path, 'rb') as f:
+        if compression is None:
+            return f.read(), True
+        out = []
+        decompressor = None
+        pending = b''
+        while True:
+            data = pending or f.read(READ_CHUNK)
+            pending = b''
+            if not data:
+                break
+            if decompressor is None:
+                decompressor = _decompressor(compression)
+            try:
+                out.append(decompressor.decompress(data))
+            except (zlib.error, zstandard.ZstdError if HAS_ZSTD else zlib.error):
+                return b''.join(out), False  # Garbage after the last good member/frame
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                decompressor = None
+        return b''.join(out), decompressor is None
+
+
+def complete_size(path, compression=None, limit=None):
+    """Size of the longest prefix (at most limit bytes) that ends on a complete member/frame, or CSV row for plain files"""
+    compression = compression or compression_from_filename(path)
+    if compression is None:
+        return _complete_rows_size(path, limit)
+    boundary = 0  # Raw offset after the last complete member/frame
+    position = 0  # Raw offset of the start of data
+    decompressor = None
+    data = b''
+    with open(path, 'rb') as f:
+        while True:
+            if not data:
+                size = READ_CHUNK if limit is None else min(READ_CHUNK, limit - f.tell())
+                data = f.read(size) if size > 0 else b''
+                if not data:
+                    break
+            if decompressor is None:
+                decompressor = _decompressor(compression)
+            try:
+                decompressor.decompress(data)
+            except (zlib.error, zstandard.ZstdError if HAS_ZSTD else zlib.error):
+                break
+            if decompressor.eof:
+                unused = decompressor.unused_data
+                position += len(data) - len(unused)
+                boundary = position
+                data = unused
+                decompressor = None
+            else:
+                position += len(data)
+                data = b''
+    return boundary
+
+
+def _complete_rows_size(path, limit=None):
+    with open(path, 'rb') as f:
+        data = f.read() if limit is None else f.read(limit)
+    # A newline ends a row unless it is inside a quoted field (odd number of quotes before it)
+    end = start = quotes = 0
+    while True:
+        newline = data.find(b'\n', start)
+        if newline < 0:
+            return end
+        quotes += data.count(b'"', start, newline)
+        if quotes % 2 == 0:
+            end = newline + 1
+        start = newline + 1
@@ -0,0 +1,145 @@
+# Persistent crawl state for incremental sitemap crawling.
+#
+# For every (spider, url) the SQLite store keeps the <lastmod> seen in the
+# sitemap, the <lastmod> that was current when the page was last crawled and
+# the crawl time. A URL only needs to be fetched again if it is new, its
+# sitemap <lastmod> changed, or (optionally) the last crawl is too old.
+# Entries without a <lastmod> can't be compared: they are fetched every run,
+# or once per max_age if one is set.
+#
+# The output files of an incremental run only hold the products fetched (or
+# replayed) in that run, i.e. the changes since the previous run.
+#
+# ValidatorStore keeps the HTTP validators used by the conditional-GET
+# downloader middleware. It should use its own database file, since both
+# stores keep a write transaction open between batched commits.
+
+import json
+import sqlite3
+import time
+
+COMMIT_EVERY = 1000
+
+
+class CrawlStateStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                spider TEXT NOT NULL,
+                url TEXT NOT NULL,
+                sitemap_lastmod TEXT,
+                crawled_lastmod TEXT,
+                last_crawled REAL,
+                PRIMARY KEY (spider, url)
+            )
+        """)
+        self.conn.commit()
+        self._pending = 0
+
+    def needs_crawl(self, spider, url, lastmod=None, max_age=None):
+        """Record the sitemap lastmod for url and tell if it has to be fetched"""
+        row = self.conn.execute(
+            "SELECT crawled_lastmod, last_crawled FROM crawl_state WHERE spider = ? AND url = ?",
+            (spider, url),
+        ).fetchone()
+        self.conn.execute(
+            """INSERT INTO crawl_state (spider, url, sitemap_lastmod) VALUES (?, ?, ?)
+               ON CONFLICT (spider, url) DO UPDATE SET sitemap_lastmod = excluded.sitemap_lastmod""",
+            (spider, url, lastmod),
+        )
+        self._maybe_commit()
+
+        if row is None or row[1] is None:
+            return True  # New URL or never crawled successfully
+        crawled_lastmod, last_crawled = row
+        if lastmod and lastmod != crawled_lastmod:
+            return True  # Changed since the last crawl
+        if max_age is not None:
+            return time.time() - last_crawled > max_age  # Too old, refresh anyway
+        return not lastmod  # Without a lastmod there is no way to tell it is unchanged
+
+    def mark_crawled(self, spider, url):
+        """Remember that url was crawled now, at its current sitemap lastmod"""
+        self.conn.execute(
+            """INSERT INTO crawl_state (spider, url, last_crawled) VALUES (?, ?, ?)
+               ON CONFLICT (spider, url) DO UPDATE SET
+                   crawled_lastmod = sitemap_lastmod,
+                   last_crawled = excluded.last_crawled""",
+            (spider, url, time.time()),
+        )
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class ValidatorStore:
+    """HTTP validators (ETag, Last-Modified, body hash) and last items per URL"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                items TEXT
+            )
+        """)
+        self.conn.commit()
+        self._pending = 0
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, items FROM http_validators WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_hash': row[2],
+            'items': json.loads(row[3]) if row[3] is not None else None,
+        }
+
+    def save_validators(self, url, etag, last_modified, content_hash):
+        """Store new validators, cached items are dropped until save_items is called"""
+        self.conn.execute(
+            """INSERT OR REPLACE INTO http_validators (url, etag, last_modified, content_hash, items)
+               VALUES (?, ?, ?, ?, NULL)""",
+            (url, etag, last_modified, content_hash),
+        )
+        self._maybe_commit()
+
+    def update_validators(self, url, etag, last_modified):
+        """New validators for an unchanged page, the cached items stay"""
+        self.conn.execute("UPDATE http_validators SET etag = ?, last_modified = ? WHERE url = ?", (etag, last_modified, url))
+        self._maybe_commit()
+
+    def save_items(self, url, items):
+        """Cache the items parsed from url as [[item class name, fields], ...]"""
+        payload = json.dumps([[type(item).__name__, dict(item)] for item in items], ensure_ascii=False)
+        self.conn.execute("UPDATE http_validators SET items = ? WHERE url = ?", (payload, url))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
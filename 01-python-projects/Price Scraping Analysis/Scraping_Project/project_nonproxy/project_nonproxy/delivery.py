@@ -0,0 +1,384 @@
+# SFTP delivery of the crawl outputs.
+#
+# The SFTPDelivery extension runs on spider_closed, after the pipelines have
+# written their files, and uploads every output file of the run to
+# SFTP_REMOTE_DIR. The crawl process waits for it, no manual copy step.
+#
+# - One SSH connection (paramiko Transport) is shared. Every upload worker
+#   takes an SFTP channel from a pool on that connection, so files go up in
+#   parallel without a handshake per file.
+# - CSV files are gzip-compressed on the fly, one gzip member per chunk of
+#   SFTP_DELIVERY_CHUNK_MB input. Concatenated members are a normal .gz file.
+#   Parquet and already compressed files are sent as they are.
+# - Uploads go to "<name>.part" and are renamed when complete. The state file
+#   records how many chunks of which local file (size + mtime) are on the
+#   server, so a failed or interrupted upload continues after the last
+#   complete chunk, also from the next run or the CLI:
+#       python -m project_nonproxy.delivery tehnomanija_master.csv tehnomanija_spec.csv
+#
+# Credentials come from the environment (or a .env file): SFTP_HOST,
+# SFTP_PORT, SFTP_USERNAME, SFTP_PASSWORD and/or SFTP_KEY_FILE.
+# The server key has to be in SFTP_KNOWN_HOSTS (default ~/.ssh/known_hosts,
+# add it with ssh-keyscan), unknown or changed keys are refused before any
+# credentials are sent. SFTP_SKIP_HOST_KEY_CHECK=1 turns the check off.
+
+import glob
+import gzip
+import json
+import logging
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+from paramiko import SFTPClient, Transport
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.threads import deferToThread
+
+try:
+    from dotenv import load_dotenv
+    HAS_DOTENV = True
+except ImportError:
+    HAS_DOTENV = False
+
+logger = logging.getLogger(__name__)
+
+UNCOMPRESSED_SUFFIXES = ('.gz', '.zst', '.parquet')
+DEFAULT_KNOWN_HOSTS = '~/.ssh/known_hosts'
+
+
+class HostKeyError(paramiko.SSHException):
+    """The server key is not in known_hosts or does not match it"""
+
+
+def sftp_config_from_env():
+    """Connection settings from the environment, None if SFTP_HOST is not set"""
+    if HAS_DOTENV:
+        load_dotenv()
+    host = os.environ.get('SFTP_HOST')
+    if not host:
+        return None
+    return {
+        'host': host,
+        'port': int(os.environ.get('SFTP_PORT', 22)),
+        'username': os.environ.get('SFTP_USERNAME'),
+        'password': os.environ.get('SFTP_PASSWORD'),
+        'key_file': os.environ.get('SFTP_KEY_FILE'),
+        'known_hosts': os.environ.get('SFTP_KNOWN_HOSTS') or DEFAULT_KNOWN_HOSTS,
+        'verify_host_key': os.environ.get('SFTP_SKIP_HOST_KEY_CHECK', '').lower() not in ('1', 'true', 'yes'),
+    }
+
+
+class SFTPPool:
+    """SFTP channels on one shared SSH connection, reconnects when it drops"""
+
+    def __init__(self, host, port=22, username=None, password=None, key_file=None, known_hosts=DEFAULT_KNOWN_HOSTS,
+                 verify_host_key=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.key_file = key_file
+        self.known_hosts = os.path.expanduser(known_hosts or DEFAULT_KNOWN_HOSTS)
+        self.verify_host_key = verify_host_key
+        self.timeout = timeout
+        self.transport = None
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        transport = Transport((self.host, self.port))
+        transport.start_client(timeout=self.timeout)
+        if self.verify_host_key:
+            try:
+                self._check_host_key(transport.get_remote_server_key())
+            except HostKeyError:
+                transport.close()
+                raise
+        if self.key_file:
+            transport.auth_publickey(self.username, paramiko.PKey.from_path(self.key_file, self.password))
+        else:
+            transport.auth_password(self.username, self.password)
+        transport.set_keepalive(30)
+        self.transport = transport
+
+    def _check_host_key(self, server_key):
+        name = self.host if self.port == 22 else f'[{self.host}]:{self.port}'
+        host_keys = paramiko.HostKeys()
+        if os.path.exists(self.known_hosts):
+            host_keys.load(self.known_hosts)
+        known = (host_keys.lookup(name) or {}).get(server_key.get_name())
+        if known is None:
+            raise HostKeyError(f"Unknown host key for {name}, it is not in {self.known_hosts} (ssh-keyscan)")
+        if known != server_key:
+            raise HostKeyError(f"Host key for {name} does not match {self.known_hosts}")
+
+    def acquire(self):
+        with self.lock:
+            if self.transport is None or not self.transport.is_active():
+                self.idle = []
+                self._connect()
+            if self.idle:
+                return self.idle.pop()
+            return SFTPClient.from_transport(self.transport)
+
+    def release(self, sftp):
+        with self.lock:
+            self.idle.append(sftp)
+
+    def discard(self, sftp):
+        try:
+            sftp.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self.lock:
+            for sftp in self.idle:
+                self.discard(sftp)
+            self.idle = []
+            if self.transport:
+                self.transport.close()
+                self.transport = None
+
+
+class DeliveryState:
+    """JSON file: local path -> upload progress, written after every chunk"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                self.entries = {}
+
+    def get(self, local_path):
+        with self.lock:
+            return dict(self.entries.get(os.path.abspath(local_path), {}))
+
+    def save(self, local_path, entry):
+        with self.lock:
+            self.entries[os.path.abspath(local_path)] = entry
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+class Uploader:
+    def __init__(self, pool, state, remote_dir='.', compress=True, compression_level=6, chunk_mb=8, retries=3):
+        self.pool = pool
+        self.state = state
+        self.remote_dir = remote_dir
+        self.compress = compress
+        self.compression_level = compression_level
+        self.chunk_size = int(chunk_mb * 1024 * 1024)
+        self.retries = retries
+        self.bytes_sent = 0
+        self.bytes_read = 0
+        self.lock = threading.Lock()
+
+    def upload_all(self, paths, workers=3):
+        """Upload files in parallel, return {path: 'uploaded' | 'unchanged' | 'failed'}"""
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for path, result in zip(paths, executor.map(self.upload_with_retries, paths)):
+                results[path] = result
+        return results
+
+    def upload_with_retries(self, path):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return self.upload(path)
+            except HostKeyError as e:
+                logger.error(f"SFTP upload of {path} refused: {e}")
+                return 'failed'  # Retrying won't change the key
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                logger.warning(f"SFTP upload of {path} failed (attempt {attempt}/{self.retries}): {e}")
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, 30))
+        return 'failed'
+
+    def remote_path(self, path):
+        name = os.path.basename(path)
+        if self.compress and not name.endswith(UNCOMPRESSED_SUFFIXES):
+            name += '.gz'
+        return posixpath.join(self.remote_dir, name)
+
+    def upload(self, path):
+        stat = os.stat(path)
+        remote_path = self.remote_path(path)
+        part_path = remote_path + '.part'
+        compress = remote_path.endswith('.gz') and not path.endswith('.gz')
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        entry = self.state.get(path)
+        if entry.get('signature') != signature or entry.get('remote') != remote_path or entry.get('chunk_size') != self.chunk_size:
+            entry = {'signature': signature, 'remote': remote_path, 'chunk_size': self.chunk_size,
+                     'chunks': 0, 'offset': 0, 'done': False}
+        elif entry['done']:
+            return 'unchanged'
+
+        sftp = self.pool.acquire()
+        try:
+            if entry['offset']:
+                try:
+                    remote_size = sftp.stat(part_path).st_size
+                except IOError:
+                    remote_size = -1
+                if remote_size < entry['offset']:
+                    entry.update(chunks=0, offset=0)  # .part is gone or shorter, start over
+                else:
+                    try:
+                        sftp.truncate(part_path, entry['offset'])
+                        logger.info(f"Resuming {remote_path} after {entry['chunks']} chunks ({entry['offset']} bytes)")
+                    except IOError:
+                        entry.update(chunks=0, offset=0)  # Server can't truncate, start over
+
+            with open(path, 'rb') as f:
+                f.seek(entry['chunks'] * self.chunk_size)
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    data = gzip.compress(chunk, self.compression_level, mtime=0) if compress else chunk
+                    # Closing a pipelined file waits for all write acks, so the chunk is on the server
+                    with sftp.open(part_path, 'r+b' if entry['offset'] else 'wb') as remote:
+                        remote.seek(entry['offset'])
+                        remote.set_pipelined(True)
+                        remote.write(data)
+                    entry['chunks'] += 1
+                    entry['offset'] += len(data)
+                    self.state.save(path, entry)
+                    with self.lock:
+                        self.bytes_read += len(chunk)
+                        self.bytes_sent += len(data)
+
+            if entry['offset'] == 0:
+                with sftp.open(part_path, 'wb') as remote:  # empty file
+                    remote.write(gzip.compress(b'', mtime=0) if compress else b'')
+            try:
+                sftp.posix_rename(part_path, remote_path)
+            except IOError:
+                # Server without the posix-rename extension: plain rename does not overwrite
+                try:
+                    sftp.remove(remote_path)
+                except IOError:
+                    pass
+                sftp.rename(part_path, remote_path)
+            entry['done'] = True
+            self.state.save(path, entry)
+        except BaseException:
+            self.pool.discard(sftp)
+            raise
+        self.pool.release(sftp)
+        logger.info(f"Uploaded {path} -> {remote_path} ({entry['offset']} bytes)")
+        return 'uploaded'
+
+
+class SFTPDelivery:
+    """Scrapy extension: upload the run's output files when the spider closes"""
+
+    def __init__(self, settings, stats, config):
+        self.settings = settings
+        self.stats = stats
+        self.config = config
+        self.patterns = settings.getlist('SFTP_DELIVERY_PATTERNS')
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SFTP_DELIVERY_ENABLED'):
+            raise NotConfigured
+        config = sftp_config_from_env()
+        if not config:
+            raise NotConfigured("SFTP_HOST is not set")
+        extension = cls(crawler.settings, crawler.stats, config)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.time()
+
+    def output_files(self, spider):
+        """Files matching SFTP_DELIVERY_PATTERNS that were written during this run"""
+        files = set()
+        for pattern in self.patterns:
+            for path in glob.glob(pattern.format(spider=spider.name)):
+                if os.path.isfile(path) and os.path.getmtime(path) >= self.started - 1:
+                    files.add(path)
+        return sorted(files)
+
+    async def spider_closed(self, spider, reason):
+        files = self.output_files(spider)
+        if not files:
+            spider.logger.info("SFTP: nema fajlova za slanje.")
+            return
+        # Runs in a thread, the crawl stays open until it is done
+        await maybe_deferred_to_future(deferToThread(self.deliver, files, spider))
+
+    def deliver(self, files, spider):
+        pool = SFTPPool(**self.config)
+        uploader = Uploader(
+            pool,
+            DeliveryState(self.settings.get('SFTP_DELIVERY_STATE', 'sftp_delivery.json')),
+            remote_dir=self.settings.get('SFTP_REMOTE_DIR', '.'),
+            compress=self.settings.getbool('SFTP_DELIVERY_COMPRESS', True),
+            compression_level=self.settings.getint('SFTP_DELIVERY_COMPRESSION_LEVEL', 6),
+            chunk_mb=self.settings.getfloat('SFTP_DELIVERY_CHUNK_MB', 8),
+            retries=self.settings.getint('SFTP_DELIVERY_RETRIES', 3),
+        )
+        start = time.perf_counter()
+        try:
+            results = uploader.upload_all(files, workers=self.settings.getint('SFTP_DELIVERY_WORKERS', 3))
+        finally:
+            pool.close()
+        failed = [path for path, result in results.items() if result == 'failed']
+        self.stats.set_value('delivery/files', len(results))
+        self.stats.set_value('delivery/failed', len(failed))
+        self.stats.set_value('delivery/bytes_read', uploader.bytes_read)
+        self.stats.set_value('delivery/bytes_sent', uploader.bytes_sent)
+        spider.logger.info(
+            f"SFTP: {len(results) - len(failed)}/{len(results)} fajlova poslato za {time.perf_counter() - start:.1f}s "
+            f"({uploader.bytes_read} -> {uploader.bytes_sent} bytes)."
+        )
+        if failed:
+            spider.logger.error(f"SFTP: slanje nije uspelo za {failed}, nastavlja se pri sledećem pokretanju.")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upload output files over SFTP (credentials from the environment)")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--remote-dir', default='.')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--no-compress', action='store_true', help="upload files as they are")
+    parser.add_argument('--level', type=int, default=6, help="gzip level")
+    parser.add_argument('--chunk-mb', type=float, default=8, help="resume granularity")
+    parser.add_argument('--state', default='sftp_delivery.json')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('paramiko').setLevel(logging.WARNING)
+
+    config = sftp_config_from_env()
+    if not config:
+        parser.error("SFTP_HOST is not set")
+    pool = SFTPPool(**config)
+    uploader = Uploader(pool, DeliveryState(args.state), args.remote_dir, not args.no_compress, args.level, args.chunk_mb)
+    try:
+        results = uploader.upload_all(args.files, workers=args.workers)
+    finally:
+        pool.close()
+    for path, result in results.items():
+        print(f"{result:<10} {path}")
+    print(f"{uploader.bytes_read} bytes read, {uploader.bytes_sent} bytes sent")
@@ -0,0 +1,101 @@
+# Bounded-memory external sort used by the pipelines' close_spider.
+#
+# Rows are buffered until the memory budget is reached, then the buffer is
+# sorted and spilled to a temporary run file. At the end all runs are k-way
+# merged with heapq.merge, so only one row per run is in memory at a time.
+# Run files can be compressed (fast gzip/zstd level), which trades a little
+# CPU for much less temp disk space and I/O on large crawls.
+
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+
+from project_nonproxy.compression import FAST_LEVELS, StreamWriter, compressed_filename, open_text
+
+ROW_OVERHEAD = 56   # list object
+VALUE_OVERHEAD = 49  # str object header
+MAX_MERGE_FANIN = 128  # max run files open at once during a merge
+
+# longdescription can be larger than the default 128 KB csv field limit
+csv.field_size_limit(2**31 - 1)
+
+
+def estimate_row_size(row):
+    """Rough in-memory size of a row of strings in bytes"""
+    return ROW_OVERHEAD + sum(VALUE_OVERHEAD + len(value) for value in row)
+
+
+class ExternalSorter:
+    def __init__(self, key, memory_budget, temp_dir=None, compression=None):
+        self.key = key
+        self.memory_budget = memory_budget
+        self.temp_dir = temp_dir
+        self.compression = compression
+        self.buffer = []
+        self.buffer_size = 0
+        self.run_files = []
+        self.count = 0
+        self._run_dir = None
+        self._next_run = 0
+
+    def add(self, row):
+        row = ['' if value is None else str(value) for value in row]
+        self.buffer.append(row)
+        self.buffer_size += estimate_row_size(row)
+        self.count += 1
+        if self.buffer_size >= self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        if not self.buffer:
+            return
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix='extsort_', dir=self.temp_dir)
+        # list.sort is stable, and heapq.merge prefers earlier runs on ties,
+        # so the merged order matches a single in-memory sort
+        self.buffer.sort(key=self.key)
+        self.run_files.append(self._write_run(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
+
+    def _write_run(self, rows):
+        path = compressed_filename(os.path.join(self._run_dir, f'run_{self._next_run:05d}.csv'), self.compression)
+        self._next_run += 1
+        with StreamWriter(path, self.compression, FAST_LEVELS.get(self.compression)) as f:
+            csv.writer(f, delimiter=";").writerows(rows)
+        return path
+
+    def _read_run(self, path):
+        with open_text(path, self.compression) as f:
+            yield from csv.reader(f, delimiter=";")
+
+    def sorted_rows(self):
+        """Yield all rows in sorted order"""
+        if not self.run_files:
+            # Everything fits into the budget, no need to touch the disk
+            self.buffer.sort(key=self.key)
+            yield from self.buffer
+            return
+        self._spill()
+        # Merge in several passes if there are too many runs to open at once
+        while len(self.run_files) > MAX_MERGE_FANIN:
+            merged = []
+            for i in range(0, len(self.run_files), MAX_MERGE_FANIN):
+                group = self.run_files[i:i + MAX_MERGE_FANIN]
+                merged.append(self._write_run(
+                    heapq.merge(*(self._read_run(path) for path in group), key=self.key)
+                ))
+                for path in group:
+                    os.remove(path)
+            self.run_files = merged
+        yield from heapq.merge(*(self._read_run(path) for path in self.run_files), key=self.key)
+
+    def cleanup(self):
+        self.buffer = []
+        self.buffer_size = 0
+        if self._run_dir:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+        self.run_files = []
@@ -0,0 +1,106 @@
+# URL frontier for sitemap URL collection.
+#
+# Keeps URLs in insertion order with O(1) membership on the canonical form
+# of each URL (set, or a Bloom filter for very large crawls). Optionally
+# every accepted URL is appended to a file, so a frontier can be reloaded
+# by a later run (e.g. when resuming).
+
+import hashlib
+import math
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid')
+
+
+def canonicalize_url(url):
+    """Normalise a URL so that trivially different spellings dedupe together"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith(TRACKING_PARAMS)
+    ))
+    # Fragment is never sent to the server
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter, memory does not grow with the number of URLs"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class URLFrontier:
+    def __init__(self, path=None, bloom_capacity=None, error_rate=0.001):
+        self.urls = []
+        # A Bloom filter can (rarely) report an unseen URL as seen, the set cannot
+        self._seen = BloomFilter(bloom_capacity, error_rate) if bloom_capacity else set()
+        self.path = path
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        self._add_canonical(line.rstrip('\n'))
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def _add_canonical(self, url):
+        if not url or url in self._seen:
+            return False
+        self._seen.add(url)
+        self.urls.append(url)
+        return True
+
+    def add(self, url):
+        """Add url, return True if it was not in the frontier yet"""
+        canonical = canonicalize_url(url)
+        if not self._add_canonical(canonical):
+            return False
+        if self._file:
+            self._file.write(canonical + '\n')
+        return True
+
+    def extend(self, urls):
+        """Add all urls, return how many were new"""
+        return sum(1 for url in urls if self.add(url))
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self._seen
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __iter__(self):
+        return iter(self.urls)
+
+    def flush(self):
+        """Make the URLs written so far durable (e.g. before a checkpoint refers to them)"""
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,200 @@
+# Extraction engine for Gigatron product pages.
+#
+# All XPath expressions are compiled once at import time and evaluated
+# directly on the lxml tree behind response.selector (no Selector objects per
+# node, no CSS -> XPath translation per call). The spec table is walked once,
+# row by row. Description and image fallbacks are separate named methods, so
+# the spider can try the one that works for a page template first.
+#
+# The output is the same as the old response.css()/response.xpath() code,
+# except for the srcSet image fallback, which now actually finds the srcset
+# attribute (see images.py for the URL unwrapping and width selection).
+#
+# The Product JSON-LD block (GTIN, name, price, category) is located with a
+# regex on the raw response bytes and decoded with orjson when installed,
+# so it does not need the DOM at all.
+
+import json
+import re
+
+from lxml import etree
+
+from project_nonproxy.images import normalize_image_url, select_srcset
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+JSON_LD_BLOCK = re.compile(
+    rb'<script\b[^>]*\btype\s*=\s*["\']application/ld\+json["\'][^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+JSON_LD_SCRIPTS = etree.XPath('//script[@type="application/ld+json"]/text()')
+
+SPEC_ROWS = etree.XPath('//table//tbody//tr')
+ROW_CELLS = etree.XPath('descendant-or-self::td')
+HAS_COLSPAN = etree.XPath('boolean(descendant-or-self::*[@colspan])')
+FIRST_TEXT = etree.XPath('descendant-or-self::text()')
+SPAN_TEXT = etree.XPath('descendant-or-self::span/text()')
+
+DESCRIPTION_SELECTED = etree.XPath(
+    '//div[@role="tabpanel"][@data-headlessui-state="selected"]//text()[normalize-space()]'
+)
+DESCRIPTION_ANY_PANEL = etree.XPath('//div[@role="tabpanel"]//li/text()[normalize-space()]')
+DESCRIPTION_SELECTED_LI = etree.XPath(
+    '//div[@role="tabpanel"][@data-headlessui-state="selected"]//li/text()'
+)
+
+GALLERY_IMAGES = etree.XPath('//button[contains(@aria-label, "Slika proizvoda")]//img')
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def _loads(raw):
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # orjson is stricter (e.g. lone surrogates), let json decide
+    return json.loads(raw)
+
+
+def find_product_json_ld(body, encoding='utf-8'):
+    """Product JSON-LD object straight from the raw response bytes, or None"""
+    utf8 = encoding.lower().replace('_', '-') in ('utf-8', 'utf8')
+    for match in JSON_LD_BLOCK.finditer(body):
+        raw = match.group(1)
+        if b'Product' not in raw:
+            continue  # Organization, BreadcrumbList, ... are not decoded at all
+        try:
+            data = _loads(raw if utf8 else raw.decode(encoding))
+        except ValueError:
+            continue
+        if isinstance(data, dict) and data.get('@type') == 'Product':
+            return data
+    return None
+
+
+def extract_json_ld(root):
+    """Product JSON-LD object of the page, or None"""
+    for script in JSON_LD_SCRIPTS(root):
+        try:
+            data = json.loads(script)
+            if isinstance(data, dict) and data.get('@type') == 'Product':
+                return data
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def extract_specs(root):
+    """Specification table as {key: value}, group header rows are skipped"""
+    specs_data = {}
+    for row in SPEC_ROWS(root):
+        cells = ROW_CELLS(row)
+        if len(cells) < 2:
+            continue
+        key_cell = cells[0]
+        if HAS_COLSPAN(key_cell):
+            continue
+        key = FIRST_TEXT(key_cell)
+        value = SPAN_TEXT(cells[1])
+        if key and value and key[0] and value[0]:
+            specs_data[key[0].strip()] = value[0].strip()
+    return specs_data
+
+
+def description_selected(root):
+    """Method 1: texts of the active tab panel"""
+    return [text.strip() for text in DESCRIPTION_SELECTED(root) if len(text.strip()) > 3]
+
+
+def description_any_panel(root):
+    """Method 2: list items of any tab panel, very short ones skipped"""
+    return [text.strip() for text in DESCRIPTION_ANY_PANEL(root) if len(text.strip()) > 10]
+
+
+def description_selected_li(root):
+    """Method 3: list items of the active tab panel, short ones included"""
+    return [text.strip() for text in DESCRIPTION_SELECTED_LI(root) if text.strip()]
+
+
+# In fallback order, see plan_cache.py for how the spider reorders them
+DESCRIPTION_METHODS = {
+    'selected': description_selected,
+    'any_panel': description_any_panel,
+    'selected_li': description_selected_li,
+}
+
+
+def join_description(description_parts):
+    """Description text from the parts found by one of the methods, or None"""
+    if description_parts:
+        return WHITESPACE.sub(' ', ' '.join(description_parts)).strip() or None
+    return None
+
+
+def extract_description(root):
+    """Description text from the tab panels, or None"""
+    for method in DESCRIPTION_METHODS.values():
+        description_parts = method(root)
+        if description_parts:
+            return join_description(description_parts)
+    return None
+
+
+def images_src(root, logger=None):
+    """Method 1: src attribute of the gallery images"""
+    image_urls = []
+    for img in GALLERY_IMAGES(root):
+        src = img.get('src')
+        if src:
+            try:
+                actual_url = normalize_image_url(src)
+            except ValueError as e:
+                if logger:
+                    logger.warning(f"Failed to parse image URL {src}: {e}")
+                continue
+            if actual_url:
+                image_urls.append(actual_url)
+    return image_urls
+
+
+def images_srcset(root, logger=None):
+    """Method 2: widest srcset candidate of the gallery images"""
+    image_urls = []
+    for img in GALLERY_IMAGES(root):
+        # lxml lowercases attribute names, srcSet in the markup is 'srcset' here
+        srcset = img.get('srcset')
+        if not srcset:
+            continue
+        src_url = select_srcset(srcset)
+        if not src_url:
+            continue
+        try:
+            actual_url = normalize_image_url(src_url)
+        except ValueError as e:
+            if logger:
+                logger.warning(f"Failed to parse srcset URL {src_url}: {e}")
+            continue
+        if actual_url:
+            image_urls.append(actual_url)
+    return image_urls
+
+
+IMAGE_METHODS = {
+    'src': images_src,
+    'srcset': images_srcset,
+}
+
+
+def extract_images(root, logger=None):
+    """Full-size product image URLs from the gallery"""
+    for method in IMAGE_METHODS.values():
+        image_urls = method(root, logger)
+        if image_urls:
+            return image_urls
+    return []
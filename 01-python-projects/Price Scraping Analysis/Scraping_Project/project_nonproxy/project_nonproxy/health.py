@@ -0,0 +1,121 @@
+# Background connectivity monitor with a circuit breaker.
+#
+# Instead of probing several endpoints before every product, a daemon thread
+# checks connectivity on an interval (and immediately after a run of
+# consecutive failures reported by the workers). Workers read the cached
+# status and only block in wait_until_up() while the network is down.
+# requests.Session is not thread-safe, so every thread that probes (the
+# monitor thread, or a worker calling check_now()) gets its own session.
+
+import threading
+import time
+
+import requests
+
+DEFAULT_ENDPOINTS = (
+    "https://www.tehnomanija.rs",
+    "https://google.com",
+    "https://www.cloudflare.com",
+)
+
+
+class ConnectivityMonitor:
+    def __init__(self, endpoints=DEFAULT_ENDPOINTS, interval=60, retry_interval=10, timeout=5, failure_threshold=3):
+        self.endpoints = list(endpoints)
+        self.interval = interval                  # between checks while the network is up
+        self.retry_interval = retry_interval      # between checks while the circuit is open
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = 0
+        self.last_check = None
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._up = threading.Event()
+        self._up.set()  # assume the network is up until a check says otherwise
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def session(self):
+        """requests.Session of the calling thread"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    @property
+    def is_up(self):
+        return self._up.is_set()
+
+    def check_now(self):
+        """Probe the endpoints, update the cached status and return it"""
+        ok = False
+        for endpoint in self.endpoints:
+            try:
+                response = self.session.get(endpoint, timeout=self.timeout, stream=True)
+                response.close()
+                if response.status_code in [200, 301, 302]:
+                    ok = True
+                    break
+            except requests.RequestException:
+                continue
+        self.last_check = time.time()
+        self._set_status(ok)
+        return ok
+
+    def _set_status(self, ok):
+        with self._lock:
+            if ok:
+                if not self._up.is_set():
+                    print("Connection restored, resuming workers")
+                self.consecutive_failures = 0
+                self._up.set()
+            else:
+                if self._up.is_set():
+                    print("All connection tests failed, pausing workers until the network is back")
+                self._up.clear()
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        """Called by workers on network errors, enough of them trigger a check right away"""
+        with self._lock:
+            self.consecutive_failures += 1
+            trip = self.consecutive_failures >= self.failure_threshold
+        if trip:
+            self._wake.set()
+
+    def wait_until_up(self, timeout=None):
+        """Block while the circuit is open, return False if it is still open after timeout"""
+        return self._up.wait(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval if self.is_up else self.retry_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.check_now()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="connectivity-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout * len(self.endpoints) + 1)
+            self._thread = None
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
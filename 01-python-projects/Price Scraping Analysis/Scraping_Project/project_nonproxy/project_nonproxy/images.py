@@ -0,0 +1,80 @@
+# Image URL normalisation for product galleries.
+#
+# Gigatron serves every gallery image through the Next.js image optimizer
+# (/_next/image?url=<original>&w=...&q=...), once in src and once per width
+# in srcSet. The same CDN assets come back for product variants and across
+# brands, so unwrapping is memoised in a bounded LRU cache.
+
+import re
+from functools import lru_cache
+from urllib.parse import parse_qs, unquote, urlparse
+
+NEXT_IMAGE_MARKER = '/_next/image?'
+URL_CACHE_SIZE = 8192
+
+DESCRIPTOR = re.compile(r'^(\d+(?:\.\d+)?)([wx])$')
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def normalize_image_url(src):
+    """Original image URL for a gallery src/srcset URL, or None if it has none
+
+    Raises ValueError for URLs urlparse cannot handle.
+    """
+    src = src.strip()
+    if NEXT_IMAGE_MARKER not in src:
+        return src or None
+    query_params = parse_qs(urlparse(src).query)
+    if 'url' in query_params:
+        return unquote(query_params['url'][0])
+    return None
+
+
+def parse_srcset(srcset):
+    """[(url, width or None, density or None), ...] from a srcset attribute"""
+    candidates = []
+    position, length = 0, len(srcset)
+    while position < length:
+        # Candidates are separated by commas and whitespace
+        while position < length and (srcset[position].isspace() or srcset[position] == ','):
+            position += 1
+        if position >= length:
+            break
+        start = position
+        while position < length and not srcset[position].isspace():
+            position += 1
+        url = srcset[start:position]
+        if url.endswith(','):
+            # "url," has no descriptors
+            candidates.append((url.rstrip(','), None, None))
+            continue
+        start = position
+        while position < length and srcset[position] != ',':
+            position += 1
+        width = density = None
+        for descriptor in srcset[start:position].split():
+            match = DESCRIPTOR.match(descriptor)
+            if match and match.group(2) == 'w':
+                width = int(float(match.group(1)))
+            elif match:
+                density = float(match.group(1))
+        candidates.append((url, width, density))
+    return candidates
+
+
+def select_srcset(srcset, target_width=None):
+    """URL of the widest srcset candidate, or of the narrowest one >= target_width"""
+    candidates = parse_srcset(srcset)
+    if not candidates:
+        return None
+    # Candidates without descriptors count as 1x (the spec default)
+    ranked = sorted(candidates, key=lambda candidate: (candidate[1] or 0, candidate[2] or 1.0))
+    if target_width:
+        for url, width, density in ranked:
+            if width and width >= target_width:
+                return url
+    return ranked[-1][0]
+
+
+def cache_info():
+    return normalize_image_url.cache_info()
@@ -0,0 +1,287 @@
+# Cross-retailer product matching on the *_master.csv outputs.
+#
+# 1. Exact: GTINs are normalised to GTIN-14 (digits only, check digit
+#    verified) and looked up in a hash index of the other retailer. Tehnomanija
+#    GTINs that fell back to a URL tail fail the check digit and go to step 2.
+# 2. Fuzzy: the rest is blocked by brand. Candidates come from a model-number
+#    index (manufacturerkey and model-like title tokens) and from MinHash/LSH
+#    buckets over the title tokens, and are scored by token Jaccard similarity
+#    (plus a bonus for a shared model number). Pairs above the threshold are
+#    assigned greedily, best score first, one-to-one.
+#
+# Every product is hashed into a fixed number of buckets and only bucket
+# neighbours are compared, so the run time grows ~linearly with the catalogue.
+#
+# Usage (from Scraping_Project/project_nonproxy):
+#     python -m project_nonproxy.matching gigatron_scrapy_master.csv tehnomanija_master.csv -o matches.csv
+
+import csv
+import os
+import re
+import unicodedata
+import zlib
+import random
+from collections import Counter, defaultdict
+
+from project_nonproxy.compression import open_text
+
+try:
+    import numpy as np  # Comes with pandas, vectorises the MinHash signatures
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+QUANTITY_PATTERN = re.compile(r'^\d+[a-z]{1,4}$')  # 128gb, 5000mah, 2000w: not model numbers
+STOPWORDS = {'i', 'sa', 'za', 'u', 'na', 'od', 'do', 'the', 'and', 'with'}
+MERSENNE_PRIME = (1 << 31) - 1
+MAX_BUCKET_SIZE = 50  # Bigger blocks are generic titles/tokens (e.g. "128gb"), not useful candidates
+MODEL_BONUS = 0.3
+MAX_CANDIDATES = 25  # LSH candidates scored per product, keeps the fuzzy step linear
+TOKEN_CACHE_SIZE = 1 << 14
+
+MATCH_FIELDS = ['method', 'score', 'a_providerkey', 'b_providerkey', 'a_gtin', 'b_gtin',
+                'brand', 'a_title', 'b_title', 'a_price', 'b_price']
+
+
+def normalize_gtin(value):
+    """GTIN-14 string for a valid GTIN-8/12/13/14, None otherwise"""
+    digits = re.sub(r'\D', '', str(value or ''))
+    if len(digits) not in GTIN_LENGTHS:
+        return None
+    digits = digits.zfill(14)
+    if set(digits) == {'0'}:
+        return None
+    # Check digit: weights 3,1,3,1... from the right, excluding the check digit
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(digits[:-1])))
+    if (10 - total % 10) % 10 != int(digits[-1]):
+        return None
+    return digits
+
+
+def normalize_text(value):
+    text = unicodedata.normalize('NFKD', str(value or '').replace('đ', 'dj').replace('Đ', 'Dj'))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def title_tokens(title):
+    return {token for token in TOKEN_PATTERN.findall(normalize_text(title)) if token not in STOPWORDS}
+
+
+def model_keys(tokens, manufacturerkey=None):
+    """Model numbers: the manufacturerkey and title tokens with letters and digits"""
+    keys = {
+        token for token in tokens
+        if len(token) >= 5 and not token.isdigit() and not token.isalpha() and not QUANTITY_PATTERN.match(token)
+    }
+    manufacturerkey = ''.join(TOKEN_PATTERN.findall(normalize_text(manufacturerkey)))
+    if len(manufacturerkey) >= 4:
+        keys.add(manufacturerkey)
+    return keys
+
+
+class Product:
+    __slots__ = ('row', 'providerkey', 'gtin', 'brand', 'tokens', 'models')
+
+    def __init__(self, row):
+        self.row = row
+        self.providerkey = row.get('providerkey') or row.get('providerKey') or ''
+        self.gtin = normalize_gtin(row.get('gtin') or self.providerkey)
+        self.tokens = title_tokens(row.get('title'))
+        brand_tokens = TOKEN_PATTERN.findall(normalize_text(row.get('brand')))
+        if not brand_tokens:
+            # Same fallback as the Gigatron spider: first word of the title
+            brand_tokens = TOKEN_PATTERN.findall(normalize_text(row.get('title')))[:1]
+        self.brand = ''.join(brand_tokens)
+        self.models = model_keys(self.tokens, row.get('manufacturerkey'))
+
+
+class MinHasher:
+    """MinHash signatures with num_perm universal hash functions (a*x + b) mod p"""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(num_perm)]
+        if HAS_NUMPY:
+            self.a = np.array([a for a, _ in self.params], dtype=np.uint64)[:, None]
+            self.b = np.array([b for _, b in self.params], dtype=np.uint64)[:, None]
+
+        self.token_cache = {}
+
+    def _token_values(self, token):
+        # Titles reuse a small vocabulary (brands, types, colours), so the
+        # per-token hash vectors are cached; the cache is bounded by clearing
+        values = self.token_cache.get(token)
+        if values is None:
+            x = zlib.crc32(token.encode()) % MERSENNE_PRIME
+            values = tuple([(a * x + b) % MERSENNE_PRIME for a, b in self.params])
+            if len(self.token_cache) >= TOKEN_CACHE_SIZE:
+                self.token_cache.clear()
+            self.token_cache[token] = values
+        return values
+
+    def signature(self, tokens):
+        """Tuple of num_perm minimum hash values"""
+        if HAS_NUMPY:
+            values = np.array([zlib.crc32(token.encode()) % MERSENNE_PRIME for token in tokens], dtype=np.uint64)
+            return tuple(((self.a * values + self.b) % MERSENNE_PRIME).min(axis=1).tolist())
+        return tuple(map(min, zip(*[self._token_values(token) for token in tokens])))
+
+
+class LSHIndex:
+    """Banded MinHash index, buckets are blocked by brand"""
+
+    def __init__(self, hasher, bands=16):
+        if hasher.num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.hasher = hasher
+        self.bands = bands
+        self.rows = hasher.num_perm // bands
+        self.buckets = defaultdict(list)
+
+    def _keys(self, brand, tokens):
+        if not tokens:
+            return []
+        signature = self.hasher.signature(tokens)
+        return [
+            (brand, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def add(self, key, brand, tokens):
+        for bucket in self._keys(brand, tokens):
+            self.buckets[bucket].append(key)
+
+    def candidates(self, brand, tokens, limit=None):
+        """Keys sharing a bucket, the `limit` ones sharing the most bands"""
+        collisions = Counter()
+        for bucket in self._keys(brand, tokens):
+            members = self.buckets.get(bucket, ())
+            if len(members) <= MAX_BUCKET_SIZE:
+                collisions.update(members)
+        return {key for key, _ in collisions.most_common(limit)}
+
+
+def similarity(a, b):
+    if not a.tokens or not b.tokens:
+        return 0.0
+    score = len(a.tokens & b.tokens) / len(a.tokens | b.tokens)
+    if a.models & b.models:
+        score += MODEL_BONUS
+    return min(score, 1.0)
+
+
+def match_products(rows_a, rows_b, threshold=0.6, num_perm=64, bands=16):
+    """Match table between two retailers' master rows, as a list of dicts (MATCH_FIELDS)"""
+    products_a = [Product(row) for row in rows_a]
+    products_b = [Product(row) for row in rows_b]
+    matches = []
+    used_b = set()
+
+    # 1. Exact GTIN join through a hash index
+    gtin_index = {}
+    for i, product in enumerate(products_b):
+        if product.gtin:
+            gtin_index.setdefault(product.gtin, i)
+    unmatched_a = []
+    for product in products_a:
+        j = gtin_index.get(product.gtin) if product.gtin else None
+        if j is not None and j not in used_b:
+            used_b.add(j)
+            matches.append(_match('gtin', 1.0, product, products_b[j]))
+        else:
+            unmatched_a.append(product)
+
+    # 2. Fuzzy fallback, blocked by brand
+    lsh = LSHIndex(MinHasher(num_perm), bands)
+    model_index = defaultdict(list)
+    for j, product in enumerate(products_b):
+        if j in used_b:
+            continue
+        lsh.add(j, product.brand, product.tokens)
+        for model in product.models:
+            model_index[(product.brand, model)].append(j)
+
+    pairs = []
+    for product in unmatched_a:
+        candidates = lsh.candidates(product.brand, product.tokens, MAX_CANDIDATES)
+        for model in product.models:
+            members = model_index.get((product.brand, model), ())
+            if len(members) <= MAX_BUCKET_SIZE:
+                candidates.update(members)
+        for j in candidates:
+            score = similarity(product, products_b[j])
+            if score >= threshold:
+                pairs.append((score, product, j))
+
+    pairs.sort(key=lambda pair: pair[0], reverse=True)
+    matched_a = set()
+    for score, product, j in pairs:
+        if j in used_b or id(product) in matched_a:
+            continue
+        used_b.add(j)
+        matched_a.add(id(product))
+        matches.append(_match('fuzzy', round(score, 4), product, products_b[j]))
+    return matches
+
+
+def _match(method, score, a, b):
+    return {
+        'method': method,
+        'score': score,
+        'a_providerkey': a.providerkey,
+        'b_providerkey': b.providerkey,
+        'a_gtin': a.row.get('gtin', ''),
+        'b_gtin': b.row.get('gtin', ''),
+        'brand': a.row.get('brand') or b.row.get('brand') or '',
+        'a_title': a.row.get('title', ''),
+        'b_title': b.row.get('title', ''),
+        'a_price': a.row.get('price', ''),
+        'b_price': b.row.get('price', ''),
+    }
+
+
+def read_master_csv(path):
+    """Rows of a master CSV, .csv.gz/.csv.zst files are decompressed while reading"""
+    with open_text(path) as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def write_matches(path, matches, name_a='a', name_b='b'):
+    """Match table in the same ';'-delimited format as the master files"""
+    header = [field.replace('a_', f'{name_a}_', 1) if field.startswith('a_') else
+              field.replace('b_', f'{name_b}_', 1) if field.startswith('b_') else field
+              for field in MATCH_FIELDS]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';', quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        for match in matches:
+            writer.writerow([match[field] for field in MATCH_FIELDS])
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Match products of two retailers by GTIN, then by title/brand/model")
+    parser.add_argument('master_a', help="e.g. gigatron_scrapy_master.csv")
+    parser.add_argument('master_b', help="e.g. tehnomanija_master.csv")
+    parser.add_argument('-o', '--output', default='matches.csv')
+    parser.add_argument('--threshold', type=float, default=0.6, help="minimum fuzzy score (0-1)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows_a = read_master_csv(args.master_a)
+    rows_b = read_master_csv(args.master_b)
+    matches = match_products(rows_a, rows_b, threshold=args.threshold)
+    name_a = os.path.basename(args.master_a).split('_')[0]
+    name_b = os.path.basename(args.master_b).split('_')[0]
+    write_matches(args.output, matches, name_a, name_b)
+
+    by_method = defaultdict(int)
+    for match in matches:
+        by_method[match['method']] += 1
+    print(f"{len(rows_a)} x {len(rows_b)} products: {len(matches)} matches "
+          f"({by_method['gtin']} by GTIN, {by_method['fuzzy']} fuzzy) in {time.perf_counter() - start:.1f}s -> {args.output}")
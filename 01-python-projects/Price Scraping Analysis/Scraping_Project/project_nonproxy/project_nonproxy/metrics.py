@@ -0,0 +1,169 @@
+# Crawl metrics: counters and latency histograms for the Scrapy spiders.
+#
+# Filled by DgNonproxySpiderMiddleware (middlewares.py) while the crawl runs
+# and written every METRICS_DUMP_INTERVAL seconds as
+#   - JSON: count, sum, mean, min, max and p50/p90/p99 per series
+#   - OpenMetrics text (Prometheus): cumulative histogram buckets, so it can be
+#     scraped by node_exporter's textfile collector or read with promtool
+#
+# Histograms use fixed log-spaced buckets (10 per decade, 10 µs to ~5 min).
+# Recording a value is a bisect and two additions, memory does not grow with
+# the number of pages, and percentiles are interpolated inside a bucket.
+
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+PREFIX = 'scrapy'
+BUCKETS = tuple(float(f'{10 ** (exponent / 10):.3g}') for exponent in range(-50, 26))
+PERCENTILES = (50, 90, 99)
+
+# OpenMetrics HELP text per metric family
+HELP = {
+    'parse_seconds': 'Time spent in the spider callback per response',
+    'download_latency_seconds': 'Download latency per response (request sent to headers received)',
+    'pipeline_seconds': 'Item pipeline process_item latency per pipeline',
+    'items': 'Items yielded by the spider per item type',
+    'requests': 'Requests yielded by the spider per callback',
+    'responses': 'Responses passed to the spider per domain and status',
+    'spider_exceptions': 'Exceptions raised by spider callbacks',
+    'pipeline_exceptions': 'Exceptions raised by item pipeline process_item per pipeline',
+}
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Estimated value below which `percent` % of the observations fall"""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                # Interpolate inside the bucket, narrowed to the observed range
+                lower = max(BUCKETS[i - 1] if i else 0.0, self.min)
+                upper = min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        summary = {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': round(self.min, 6) if self.count else None,
+            'max': round(self.max, 6) if self.count else None,
+        }
+        for percent in PERCENTILES:
+            value = self.percentile(percent)
+            summary[f'p{percent}'] = None if value is None else round(value, 6)
+        return summary
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self, spider_name=''):
+        self.spider_name = spider_name
+        self.started = time.time()
+        self.counters = {}    # name -> {labels: value}
+        self.histograms = {}  # name -> {labels: Histogram}
+
+    def inc(self, name, labels=None, value=1):
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def histogram(self, name, labels=None):
+        return self.histograms.get(name, {}).get(_labels(labels))
+
+    def to_json(self):
+        return {
+            'spider': self.spider_name,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'counters': {
+                name: [{'labels': dict(labels), 'value': value} for labels, value in sorted(series.items())]
+                for name, series in sorted(self.counters.items())
+            },
+            'histograms': {
+                name: [{'labels': dict(labels), **histogram.summary()} for labels, histogram in sorted(series.items())]
+                for name, series in sorted(self.histograms.items())
+            },
+        }
+
+    def to_openmetrics(self):
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            family = f'{PREFIX}_{name}'
+            lines.append(f'# TYPE {family} counter')
+            lines.append(f'# HELP {family} {HELP.get(name, name)}')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{family}_total{_format_labels(labels)} {value}')
+        for name, series in sorted(self.histograms.items()):
+            family = f'{PREFIX}_{name}'
+            lines.append(f'# TYPE {family} histogram')
+            lines.append(f'# HELP {family} {HELP.get(name, name)}')
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{family}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{family}_count{_format_labels(labels)} {histogram.count}')
+                lines.append(f'{family}_sum{_format_labels(labels)} {histogram.sum:.6f}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, json_path=None, openmetrics_path=None):
+        """Write the metrics files, replaced atomically so readers never see a partial file"""
+        if json_path:
+            self._write(json_path, json.dumps(self.to_json(), indent=1, ensure_ascii=False))
+        if openmetrics_path:
+            self._write(openmetrics_path, self.to_openmetrics())
+
+    @staticmethod
+    def _write(path, text):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
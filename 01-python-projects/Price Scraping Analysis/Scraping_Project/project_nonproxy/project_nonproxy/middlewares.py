@@ -5,41 +5,107 @@
 
 import csv
 import os
+import re
 import json
+import time
+import hashlib
 from datetime import datetime
+from urllib.parse import urlparse
 from scrapy import signals
 from scrapy.http import HtmlResponse
 from scrapy.exceptions import NotConfigured
+from twisted.internet import task
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
+from project_nonproxy.items import ProductItem, SpecItem, MediaItem
+from project_nonproxy.crawlstate import ValidatorStore
+from project_nonproxy.metrics import Metrics
+
+ITEM_TYPES = {cls.__name__: cls for cls in (ProductItem, SpecItem, MediaItem)}
 
 class DgNonproxySpiderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    # Instrumentation layer, see metrics.py. Records per response the time
+    # spent in the spider callback and the download latency (per domain),
+    # and counts the items per type and requests the callbacks yield. Each
+    # item pipeline's process_item is timed by BasePipeline (pipelines.py)
+    # through spider.metrics. The metrics are written as JSON and OpenMetrics text
+    # every METRICS_DUMP_INTERVAL seconds and at the end.
+    # It sits closest to the spider (SPIDER_MIDDLEWARES), so parse time does
+    # not include the other spider middlewares.
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.settings = crawler.settings
+        self.metrics = Metrics()
+        self.dump_task = None
+        self.json_path = self.openmetrics_path = None
+
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
+
     def process_spider_input(self, response, spider):
         # Called for each response that goes through the spider
         # middleware and into the spider.
-        # Should return None or raise an exception.
+        domain = urlparse(response.url).hostname or ''
+        self.metrics.inc('responses', {'domain': domain, 'status': response.status})
+        latency = response.meta.get('download_latency')
+        if latency is not None:
+            self.metrics.observe('download_latency_seconds', latency, {'domain': domain})
         return None
+
     def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
-        # Must return an iterable of Request, or item objects.
-        for i in result:
-            yield i
+        # Callbacks are generators, so the callback runs while the result is
+        # iterated: only the time spent inside next() is parse time, not the
+        # time the engine and pipelines spend on what we already yielded.
+        callback = self.callback_name(response)
+        elapsed = 0.0
+        iterator = iter(result)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    obj = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                self.count_output(obj, callback)
+                yield obj
+        finally:
+            self.metrics.observe('parse_seconds', elapsed, {'callback': callback})
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same for async callbacks (wall time, including awaits)
+        callback = self.callback_name(response)
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    obj = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                self.count_output(obj, callback)
+                yield obj
+        finally:
+            self.metrics.observe('parse_seconds', elapsed, {'callback': callback})
+
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
         # (from other spider middleware) raises an exception.
-        # Should return either None or an iterable of Request or item objects.
-        pass
+        self.metrics.inc('spider_exceptions', {'callback': self.callback_name(response), 'exception': type(exception).__name__})
+        return None
+
     def process_start_requests(self, start_requests, spider):
         # Called with the start requests of the spider, and works
         # similarly to the process_spider_output() method, except
@@ -47,46 +113,114 @@ class DgNonproxySpiderMiddleware:
         # Must return only requests (not items).
         for r in start_requests:
             yield r
+
+    @staticmethod
+    def callback_name(response):
+        callback = response.request.callback if response.request is not None else None
+        return getattr(callback, '__name__', None) or 'parse'
+
+    def count_output(self, obj, callback):
+        if is_item(obj):
+            self.metrics.inc('items', {'type': type(obj).__name__})
+        else:
+            self.metrics.inc('requests', {'callback': callback})
+
+    def dump(self):
+        try:
+            self.metrics.dump(self.json_path, self.openmetrics_path)
+        except OSError as e:
+            self.crawler.spider.logger.warning(f"Metrike nisu upisane: {e}")
+
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+        self.metrics.spider_name = spider.name
+        # The pipelines record their process_item latency through this
+        spider.metrics = self.metrics
+        self.json_path = (self.settings.get('METRICS_JSON_FILE') or '').format(spider=spider.name) or None
+        self.openmetrics_path = (self.settings.get('METRICS_OPENMETRICS_FILE') or '').format(spider=spider.name) or None
+        interval = self.settings.getfloat('METRICS_DUMP_INTERVAL', 30)
+        if interval > 0:
+            self.dump_task = task.LoopingCall(self.dump)
+            self.dump_task.start(interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.dump_task and self.dump_task.running:
+            self.dump_task.stop()
+        self.dump()
+        spider.logger.info(f"Metrike upisane u {', '.join(p for p in (self.json_path, self.openmetrics_path) if p)}")
 
 class DgNonproxyDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # Conditional-GET layer: remembers ETag / Last-Modified / body hash per
+    # product URL and sends If-None-Match / If-Modified-Since on recrawls.
+    # If the page did not change (304, or 200 with the same body hash) the
+    # items cached from the previous crawl are passed to the spider in
+    # response.meta['cached_items'], so it can re-emit them without parsing.
+    def __init__(self, store, url_pattern, stats):
+        self.store = store
+        self.url_pattern = re.compile(url_pattern)
+        self.stats = stats
+
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool('CONDITIONAL_REQUESTS_ENABLED'):
+            raise NotConfigured
+        s = cls(
+            ValidatorStore(crawler.settings.get('CONDITIONAL_STATE_DB', 'http_validators.sqlite3')),
+            crawler.settings.get('CONDITIONAL_URL_PATTERN', r'/proizvod/'),
+            crawler.stats,
+        )
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if request.method != 'GET' or request.meta.get('dont_conditional') or not self.url_pattern.search(request.url):
+            return None
+        validators = self.store.get(request.url)
+        # Only worth asking if we can replay the items of the cached version
+        if not validators or validators['items'] is None:
+            return None
+        if validators['etag']:
+            request.headers.setdefault('If-None-Match', validators['etag'])
+        if validators['last_modified']:
+            request.headers.setdefault('If-Modified-Since', validators['last_modified'])
+        request.meta['handle_httpstatus_list'] = list(request.meta.get('handle_httpstatus_list', [])) + [304]
         return None
+
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if not self.url_pattern.search(request.url):
+            return response
+        
+        if response.status == 304:
+            validators = self.store.get(request.url)
+            if validators and validators['items'] is not None:
+                request.meta['cached_items'] = self.restore_items(validators['items'])
+                self.stats.inc_value('conditional/not_modified')
+            return response
+        
+        if response.status == 200:
+            content_hash = hashlib.sha1(response.body).hexdigest()
+            etag = response.headers.get('ETag', b'').decode('latin-1') or None
+            last_modified = response.headers.get('Last-Modified', b'').decode('latin-1') or None
+            validators = self.store.get(request.url)
+            if validators and validators['content_hash'] == content_hash and validators['items'] is not None:
+                # Server does not support validators (or changed them), but the page is identical
+                request.meta['cached_items'] = self.restore_items(validators['items'])
+                self.stats.inc_value('conditional/same_content')
+                if (etag, last_modified) != (validators['etag'], validators['last_modified']):
+                    self.store.update_validators(request.url, etag, last_modified)
+            else:
+                self.store.save_validators(request.url, etag, last_modified, content_hash)
         return response
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+
+    def restore_items(self, cached):
+        return [ITEM_TYPES[name](fields) for name, fields in cached if name in ITEM_TYPES]
+
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+        # The spider stores its parsed items through this after a full parse
+        spider.http_validators = self.store
 
-
-    
\ No newline at end of file
+    def spider_closed(self, spider):
+        self.store.close()
@@ -1,98 +1,180 @@
 from itemadapter import ItemAdapter
 from project_nonproxy.items import ProductItem, SpecItem, MediaItem
-import paramiko
-from paramiko import Transport, SFTPClient
+from project_nonproxy.dedup import FingerprintSet
+from project_nonproxy.extsort import ExternalSorter
+from project_nonproxy.columnar import ParquetSink, HAS_PYARROW
+from project_nonproxy.pricehistory import PriceHistoryStore
+from project_nonproxy.speccatalog import SpecCatalog
+from project_nonproxy.compression import StreamWriter, compressed_filename, resolve_compression
 import csv
 import os
+import time
+import functools
+
+
+def timed_process_item(process_item):
+    """Record process_item latency in spider.metrics (see metrics.py), labelled by pipeline class"""
+    @functools.wraps(process_item)
+    def wrapper(self, item, spider):
+        metrics = getattr(spider, 'metrics', None)
+        if metrics is None:  # METRICS_ENABLED off
+            return process_item(self, item, spider)
+        labels = {'pipeline': type(self).__name__}
+        start = time.perf_counter()
+        try:
+            return process_item(self, item, spider)
+        except Exception as e:
+            metrics.inc('pipeline_exceptions', {**labels, 'exception': type(e).__name__})
+            raise
+        finally:
+            metrics.observe('pipeline_seconds', time.perf_counter() - start, labels)
+    return wrapper
+
 
 class BasePipeline:
     def __init__(self, settings):
         self.settings = settings
         self.item_class = None
     
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every pipeline's own process_item is timed, DgNonproxySpiderMiddleware
+        # puts the metrics on the spider
+        if 'process_item' in cls.__dict__:
+            cls.process_item = timed_process_item(cls.__dict__['process_item'])
+    
     @classmethod
     def from_crawler(cls, crawler):
         return cls(crawler.settings)
+
+    def open_output(self, spider, suffix):
+        brand_segment = f"_{getattr(spider, 'brandName', '')}" if getattr(spider, 'brandName', '') else ""
+        self.basename = f'{spider.name}{brand_segment}_scrapy_{suffix}'
+        # Optional gzip/zstd output, rows are compressed as they are written
+        self.compression = resolve_compression(self.settings.get('OUTPUT_COMPRESSION'))
+        self.compression_level = self.settings.get('OUTPUT_COMPRESSION_LEVEL')
+        if self.compression_level is not None:
+            self.compression_level = int(self.compression_level)
+        self.filename = compressed_filename(f'{self.basename}.csv', self.compression)
+        self.seen_rows = FingerprintSet()
+        self.sorter = None
+        self.parquet_sink = None
+        
+        formats = self.settings.getdict('PIPELINE_OUTPUT_FORMATS').get(suffix, ['csv'])
+        
+        if 'csv' in formats:
+            # Track non-empty columns while rows stream in, so close_spider needs only one pass
+            self.empty_columns = set(range(len(self.item_class.fields)))
+            
+            # Rows are kept up to the memory budget, then spilled to disk as sorted runs
+            memory_budget = self.settings.getint('PIPELINE_SORT_MEMORY_MB', 64) * 1024 * 1024
+            self.sorter = ExternalSorter(
+                key=lambda row: row[0],
+                memory_budget=memory_budget,
+                temp_dir=self.settings.get('PIPELINE_SORT_TEMP_DIR'),
+                compression=self.compression,  # Spilled runs stay compressed on disk too
+            )
+        
+        if 'parquet' in formats:
+            if HAS_PYARROW:
+                self.parquet_sink = ParquetSink(
+                    f'{self.basename}.parquet',
+                    self.item_class.fields.keys(),
+                    row_group_size=self.settings.getint('PARQUET_ROW_GROUP_SIZE', 50000),
+                    compression=self.settings.get('PARQUET_COMPRESSION', 'zstd'),
+                )
+            else:
+                spider.logger.warning(f"pyarrow nije instaliran, parquet izlaz za {self.basename} se preskače.")
+
+    def write_row(self, item):
+        row = [item.get(key, "") for key in self.item_class.fields.keys()]
+        # Rows without providerkey are never written
+        if row[0] is None:
+            return False
+        if not self.seen_rows.add(row):  # Duplikate vermeiden
+            return False
+        if self.sorter:
+            if self.empty_columns:
+                self.empty_columns.difference_update([i for i in self.empty_columns if row[i]])
+            self.sorter.add(row)
+        if self.parquet_sink:
+            self.parquet_sink.write(row)
+        return True
     
     def close_spider(self, spider):
-        # Filter out rows with None values in the first column (providerkey)
-        filtered_data = [row for row in self.data if row[0] is not None]
-        
-        if not filtered_data:
+        if self.parquet_sink:
+            self.parquet_sink.close()
+            spider.logger.info(f"Fajl {self.parquet_sink.filename} je uspešno kreiran sa {self.parquet_sink.count} records.")
+        if self.sorter:
+            self.write_csv(spider)
+
+    def write_csv(self, spider):
+        if not self.sorter.count:
             spider.logger.info(f"Nema validnih podataka za {self.filename}. Fajl se neće kreirati.")
-            self.file.close()
+            self.sorter.cleanup()
             if os.path.exists(self.filename):
                 os.remove(self.filename)
             return
         
-        # Get the original header row
+        # Keep only non-empty columns, the first column (providerKey) is always kept
         header_keys = list(self.item_class.fields.keys())
-        
-        # Determine which columns contain data
-        non_empty_columns = []
-        for col_idx, key in enumerate(header_keys):
-            # Check if any row has a non-empty value in this column
-            has_data = any(row[col_idx] for row in filtered_data if len(row) > col_idx)
-            if has_data or col_idx == 0:  # Always keep the first column (providerKey)
-                non_empty_columns.append(col_idx)
-        
-        # Create a new header with only non-empty columns
+        non_empty_columns = [i for i in range(len(header_keys)) if i == 0 or i not in self.empty_columns]
         new_header = [header_keys[i] for i in non_empty_columns]
         
-        # Rewrite the file with only non-empty columns
-        self.file.close()
-        self.file = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.file, delimiter=";", quoting=csv.QUOTE_ALL)
-        
-        # Write the new header
-        self.writer.writerow(new_header)
+        try:
+            with StreamWriter(self.filename, self.compression, self.compression_level) as f:
+                writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+                writer.writerow(new_header)
+                
+                # Rows come out of the k-way merge sorted by providerkey
+                for row in self.sorter.sorted_rows():
+                    writer.writerow([row[i] for i in non_empty_columns])
+        finally:
+            self.sorter.cleanup()
         
-        # Sort the filtered data
-        filtered_data.sort(key=lambda x: str(x[0]))
-        
-        # Write only the non-empty columns of each row
-        for row in filtered_data:
-            new_row = [row[i] for i in non_empty_columns if i < len(row)]
-            self.writer.writerow(new_row)
-        
-        self.file.close()
-        spider.logger.info(f"Fajl {self.filename} je uspešno kreiran sa {len(filtered_data)} records.")
+        spider.logger.info(f"Fajl {self.filename} je uspešno kreiran sa {self.sorter.count} records.")
 
 
 
 class SpecPipeline(BasePipeline):
     def open_spider(self, spider):
         self.item_class = SpecItem
-        self.data = []
-        brand_segment = f"_{getattr(spider, 'brandName', '')}" if getattr(spider, 'brandName', '') else ""
-        self.filename = f'{spider.name}{brand_segment}_scrapy_spec.csv'
+        self.open_output(spider, 'spec')
         
-        self.file = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.file, delimiter=";")
-        headerkeys = list(SpecItem.fields.keys())
-        self.writer.writerow(headerkeys)
+        # Keys and values interned to integer IDs (see speccatalog.py)
+        self.catalog = None
+        if 'catalog' in self.settings.getdict('PIPELINE_OUTPUT_FORMATS').get('spec', []):
+            self.catalog = SpecCatalog(self.basename, self.compression, self.compression_level)
+            self.catalog.open_spider(spider)
 
     def process_item(self, item, spider):
         if isinstance(item, SpecItem):
-            row = [item.get(key, "") for key in item.fields.keys()]
-            if row not in self.data:  # Duplikate vermeiden
-                self.data.append(row)
+            # Fingerprint of (providerKey, SpecificationKey, SpecificationValue)
+            if self.write_row(item) and self.catalog:
+                # The item itself is passed on unchanged
+                self.catalog.add(item.get('providerKey'), item.get('SpecificationKey'), item.get('SpecificationValue'))
         return item
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+        if self.catalog:
+            self.catalog.close_spider(spider)
     
 
 
 class ProductPipeline(BasePipeline):
     def open_spider(self, spider):
         self.item_class = ProductItem
-        self.data = []
         self.seen_providerkeys = set() # Track seen providerkeys to avoid duplicates
-        brand_segment = f"_{getattr(spider, 'brandName', '')}" if getattr(spider, 'brandName', '') else ""
-        self.filename = f'{spider.name}{brand_segment}_scrapy_master.csv'
+        self.open_output(spider, 'master')
         
-        self.file = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.file, delimiter=";", quoting=csv.QUOTE_ALL)
-        headerkeys = list(ProductItem.fields.keys())
-        self.writer.writerow(headerkeys)
+        # Prices of every run go into the local price history (see pricehistory.py)
+        self.price_history = None
+        history_db = self.settings.get('PRICE_HISTORY_DB')
+        if history_db:
+            self.price_history = PriceHistoryStore(history_db)
+            self.run_id = self.price_history.start_run(spider.name)
+            self.price_changes = 0
 
     def process_item(self, item, spider):
         if isinstance(item, ProductItem):
@@ -105,24 +187,34 @@ class ProductPipeline(BasePipeline):
             
             # Add to seen set and process the item
             self.seen_providerkeys.add(providerkey)
-            row = [item.get(key, "") for key in item.fields.keys()]
-            if row not in self.data:  # Duplikate vermeiden
-                self.data.append(row)
+            self.write_row(item)
+            
+            if self.price_history:
+                delta = self.price_history.record(
+                    self.run_id, spider.name, item.get('gtin') or providerkey, item.get('price'),
+                    brand=item.get('brand'), category=item.get('productType'),
+                )
+                if delta is not None:
+                    self.price_changes += 1
         return item
 
+    def close_spider(self, spider):
+        super().close_spider(spider)
+        if self.price_history:
+            self.price_history.finish_run(self.run_id)
+            self.price_history.close()
+            spider.logger.info(f"Istorija cena: {self.price_changes} promena cena u ovom pokretanju (run {self.run_id}).")
+
 
 class MediaPipeline(BasePipeline):
     def open_spider(self, spider):
         self.item_class = MediaItem
-        self.data = []
         self.seen_providerkeys = set()  # Track seen providerkeys to avoid duplicates
-        brand_segment = f"_{getattr(spider, 'brandName', '')}" if getattr(spider, 'brandName', '') else ""
-        self.filename = f'{spider.name}{brand_segment}_scrapy_media.csv'
-        
-        self.file = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.file, delimiter=";", quoting=csv.QUOTE_ALL)
-        headerkeys = list(MediaItem.fields.keys())
-        self.writer.writerow(headerkeys)
+        # Optionally drop images that were already written for another product
+        self.dedupe_images = self.settings.getbool('MEDIA_DEDUPE_IMAGES')
+        self.seen_images = FingerprintSet()
+        self.dropped_images = 0
+        self.open_output(spider, 'media')
 
     def process_item(self, item, spider):
         if isinstance(item, MediaItem):
@@ -133,21 +225,47 @@ class MediaPipeline(BasePipeline):
                 spider.logger.info(f"Skipping duplicate media providerKey: {providerkey}")
                 return item
             
-            # Check if the item has any non-empty image or datasheet URLs
+            # Image dedupe only changes the row written here, the item is passed on as it is
+            row = item
+            if self.dedupe_images:
+                row, new_images = self.drop_seen_images(item)
+            
+            # Check if the row has any non-empty image or datasheet URLs
             has_content = any(
-                item.get(field) 
-                for field in item.fields.keys() 
+                row.get(field) 
+                for field in self.item_class.fields.keys() 
                 if field.startswith(('imageurl_', 'datasheeturl_'))
             )
             
             if has_content:
                 self.seen_providerkeys.add(providerkey)
+                if self.dedupe_images:
+                    for url in new_images:
+                        self.seen_images.add([url])
                 # Process valid MediaItem
-                row = [item.get(key, "") for key in item.fields.keys()]
-                if row not in self.data:  # Avoid duplicates
-                    self.data.append(row)
+                self.write_row(row)
             else:
-                spider.logger.info(f"Dropping MediaItem with only providerKey: {item.get('providerKey')}")
+                spider.logger.info(f"Skipping media row with only providerKey: {item.get('providerKey')}")
         
         return item
-    
+
+    def drop_seen_images(self, item):
+        """Copy of the item's fields without image URLs already written for another product, the rest move up"""
+        image_fields = [field for field in self.item_class.fields.keys() if field.startswith('imageurl_')]
+        new_images = []
+        for field in image_fields:
+            url = item.get(field)
+            if not url:
+                continue
+            if [url] in self.seen_images or url in new_images:
+                self.dropped_images += 1
+            else:
+                new_images.append(url)
+        row = {field: value for field, value in ItemAdapter(item).items() if field not in image_fields}
+        row.update(zip(image_fields, new_images))
+        return row, new_images
+
+    def close_spider(self, spider):
+        if self.dedupe_images:
+            spider.logger.info(f"Uklonjeno {self.dropped_images} slika koje se ponavljaju kod drugih proizvoda.")
+        super().close_spider(spider)
@@ -0,0 +1,62 @@
+# Learned extraction plans for fallback chains.
+#
+# Extraction methods are tried in a fixed fallback order (Method 1, 2, 3...).
+# Pages of the same template (e.g. the same product-type path) almost always
+# end up using the same method, so the cache remembers the winning method per
+# template and runs it first. If it finds nothing the full fallback order runs
+# again and the plan is updated. Every revalidate_every pages of a template
+# the full order is run anyway, so a template that goes back to an earlier
+# method is picked up.
+
+
+class ExtractionPlanCache:
+    def __init__(self, name, methods, revalidate_every=100):
+        self.name = name
+        self.methods = methods  # {method name: callable}, in fallback order
+        self.revalidate_every = revalidate_every
+        self.plans = {}  # template key -> winning method name
+        self.pages = {}  # template key -> pages seen
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def run(self, template, *args):
+        """Result of the first method (learned plan first) that finds something"""
+        plan = self.plans.get(template)
+        pages = self.pages[template] = self.pages.get(template, 0) + 1
+        revalidate = plan is not None and self.revalidate_every and pages % self.revalidate_every == 0
+
+        if plan is not None and not revalidate:
+            result = self.methods[plan](*args)
+            if result:
+                self.hits += 1
+                return result
+
+        if revalidate:
+            self.revalidations += 1
+        else:
+            self.misses += 1
+        result = None
+        for method_name, method in self.methods.items():
+            if method_name == plan and not revalidate:
+                continue  # already tried above
+            result = method(*args)
+            if result:
+                self.plans[template] = method_name
+                return result
+        # Nothing found, the page has no such data: keep the plan
+        return result
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses + self.revalidations
+        return self.hits / total if total else 0.0
+
+    def record_stats(self, stats):
+        """Put the counters into the Scrapy crawl stats"""
+        prefix = f'plan_cache/{self.name}'
+        stats.set_value(f'{prefix}/hits', self.hits)
+        stats.set_value(f'{prefix}/misses', self.misses)
+        stats.set_value(f'{prefix}/revalidations', self.revalidations)
+        stats.set_value(f'{prefix}/templates', len(self.plans))
+        stats.set_value(f'{prefix}/hit_rate', round(self.hit_rate, 4))
@@ -0,0 +1,248 @@
+# Local price history for the dashboard's price change metrics.
+#
+# Every run appends its product prices to a monthly partition table
+# (prices_YYYY_MM) indexed by (retailer, gtin). Deltas are computed while
+# prices are recorded: the `latest` table holds the last known price per
+# (retailer, gtin), and a price that differs from it is written to
+# price_changes. Per-product deltas and per-brand/category aggregates are
+# queries over price_changes only, no snapshot has to be reloaded or diffed.
+#
+# Old partitions can be dropped with drop_partitions_before().
+
+import re
+import sqlite3
+import time
+
+from project_nonproxy.columnar import to_float
+
+COMMIT_EVERY = 1000
+PARTITION_PATTERN = re.compile(r'^prices_(\d{4})_(\d{2})$')
+
+
+class PriceHistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                retailer TEXT NOT NULL,
+                started REAL NOT NULL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS latest (
+                retailer TEXT NOT NULL,
+                gtin TEXT NOT NULL,
+                price REAL,
+                previous_price REAL,
+                brand TEXT,
+                category TEXT,
+                run_id INTEGER,
+                last_seen REAL,
+                PRIMARY KEY (retailer, gtin)
+            );
+            CREATE TABLE IF NOT EXISTS price_changes (
+                run_id INTEGER NOT NULL,
+                retailer TEXT NOT NULL,
+                gtin TEXT NOT NULL,
+                old_price REAL NOT NULL,
+                new_price REAL NOT NULL,
+                delta REAL NOT NULL,
+                brand TEXT,
+                category TEXT,
+                changed_at REAL,
+                PRIMARY KEY (run_id, retailer, gtin)
+            );
+            CREATE INDEX IF NOT EXISTS price_changes_product ON price_changes (retailer, gtin);
+        """)
+        self.conn.commit()
+        self._partitions = set(self.partitions())
+        self._pending = 0
+
+    # Runs
+
+    def start_run(self, retailer, resume=False):
+        """New run id for retailer, or with resume=True the last unfinished one"""
+        if resume:
+            row = self.conn.execute(
+                "SELECT run_id FROM runs WHERE retailer = ? AND finished IS NULL ORDER BY run_id DESC LIMIT 1",
+                (retailer,),
+            ).fetchone()
+            if row:
+                return row[0]
+        cursor = self.conn.execute("INSERT INTO runs (retailer, started) VALUES (?, ?)", (retailer, time.time()))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        self.conn.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), run_id))
+        self.conn.commit()
+        self._pending = 0
+
+    # Recording
+
+    def partitions(self):
+        rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'prices_%'")
+        return sorted(name for (name,) in rows if PARTITION_PATTERN.match(name))
+
+    def _partition(self, timestamp):
+        name = time.strftime('prices_%Y_%m', time.localtime(timestamp))
+        if name not in self._partitions:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} (
+                    run_id INTEGER NOT NULL,
+                    retailer TEXT NOT NULL,
+                    gtin TEXT NOT NULL,
+                    price REAL,
+                    scraped_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, retailer, gtin)
+                )
+            """)
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_product ON {name} (retailer, gtin)")
+            self._partitions.add(name)
+        return name
+
+    def record(self, run_id, retailer, gtin, price, brand=None, category=None, timestamp=None):
+        """Append a price for (retailer, gtin) and update its delta, return the delta or None"""
+        price = to_float(price)
+        if not gtin or price is None:
+            return None
+        timestamp = timestamp or time.time()
+        partition = self._partition(timestamp)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {partition} (run_id, retailer, gtin, price, scraped_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, retailer, gtin, price, timestamp),
+        )
+
+        row = self.conn.execute(
+            "SELECT price, previous_price, run_id FROM latest WHERE retailer = ? AND gtin = ?",
+            (retailer, gtin),
+        ).fetchone()
+        if row is None:
+            old_price = None
+        elif row[2] == run_id:
+            old_price = row[1]  # Recorded again in the same run (e.g. resumed): compare with the run before
+        else:
+            old_price = row[0]
+
+        self.conn.execute(
+            """INSERT OR REPLACE INTO latest (retailer, gtin, price, previous_price, brand, category, run_id, last_seen)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (retailer, gtin, price, old_price, brand, category, run_id, timestamp),
+        )
+        delta = None
+        if old_price is not None and old_price != price:
+            delta = price - old_price
+            self.conn.execute(
+                """INSERT OR REPLACE INTO price_changes
+                   (run_id, retailer, gtin, old_price, new_price, delta, brand, category, changed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (run_id, retailer, gtin, old_price, price, delta, brand, category, timestamp),
+            )
+        else:
+            self.conn.execute(
+                "DELETE FROM price_changes WHERE run_id = ? AND retailer = ? AND gtin = ?",
+                (run_id, retailer, gtin),
+            )
+        self._maybe_commit()
+        return delta
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    # Queries
+
+    def _filters(self, retailer=None, run_id=None, since=None):
+        clauses, params = [], []
+        if retailer:
+            clauses.append("retailer = ?")
+            params.append(retailer)
+        if run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if since is not None:
+            clauses.append("changed_at >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def deltas(self, retailer=None, run_id=None, since=None):
+        """Per-product price changes as dicts, biggest absolute change first"""
+        self.conn.commit()
+        where, params = self._filters(retailer, run_id, since)
+        rows = self.conn.execute(
+            f"""SELECT run_id, retailer, gtin, old_price, new_price, delta, brand, category, changed_at
+                FROM price_changes{where} ORDER BY ABS(delta) DESC""",
+            params,
+        )
+        columns = ('run_id', 'retailer', 'gtin', 'old_price', 'new_price', 'delta', 'brand', 'category', 'changed_at')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def aggregates(self, by='brand', retailer=None, run_id=None, since=None):
+        """Price change stats per brand or category: changed products, average/min/max delta, ups and downs"""
+        if by not in ('brand', 'category', 'retailer'):
+            raise ValueError(f"Unknown aggregate column: {by}")
+        self.conn.commit()
+        where, params = self._filters(retailer, run_id, since)
+        rows = self.conn.execute(
+            f"""SELECT {by}, COUNT(*), AVG(delta), MIN(delta), MAX(delta),
+                       SUM(delta > 0), SUM(delta < 0)
+                FROM price_changes{where} GROUP BY {by} ORDER BY COUNT(*) DESC""",
+            params,
+        )
+        columns = (by, 'changed', 'avg_delta', 'min_delta', 'max_delta', 'increases', 'decreases')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def history(self, retailer, gtin):
+        """[(scraped_at, price), ...] for one product across all partitions"""
+        self.conn.commit()
+        partitions = sorted(self._partitions)
+        if not partitions:
+            return []
+        query = " UNION ALL ".join(
+            f"SELECT scraped_at, price FROM {name} WHERE retailer = ? AND gtin = ?" for name in partitions
+        )
+        return self.conn.execute(query + " ORDER BY scraped_at", [retailer, gtin] * len(partitions)).fetchall()
+
+    def drop_partitions_before(self, year, month):
+        """Drop raw price partitions older than year-month, deltas and latest prices are kept"""
+        dropped = []
+        for name in self.partitions():
+            partition_year, partition_month = map(int, PARTITION_PATTERN.match(name).groups())
+            if (partition_year, partition_month) < (year, month):
+                self.conn.execute(f"DROP TABLE {name}")
+                self._partitions.discard(name)
+                dropped.append(name)
+        self.conn.commit()
+        return dropped
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Price changes from the local price history")
+    parser.add_argument('db', nargs='?', default='price_history.sqlite3')
+    parser.add_argument('--retailer', default=None)
+    parser.add_argument('--run-id', type=int, default=None, help="only changes found in this run")
+    parser.add_argument('--by', choices=['brand', 'category', 'retailer'], default=None, help="aggregate instead of listing products")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    store = PriceHistoryStore(args.db)
+    try:
+        if args.by:
+            for row in store.aggregates(args.by, args.retailer, args.run_id):
+                print(f"{row[args.by] or '-':<40} {row['changed']:6d} changed  avg {row['avg_delta']:+10.2f} RSD  "
+                      f"(+{row['increases']} / -{row['decreases']})")
+        else:
+            for row in store.deltas(args.retailer, args.run_id)[:args.top]:
+                print(f"{row['retailer']:<12} {row['gtin']:<14} {row['old_price']:>12.2f} -> {row['new_price']:>12.2f}  "
+                      f"{row['delta']:+10.2f}  {row['brand'] or ''}")
+    finally:
+        store.close()
@@ -0,0 +1,73 @@
+# Compact fixed-schema records for the Selenium spider's items.
+#
+# The schema (field names, in CSV column order) lives on the class. An
+# instance is a single slot holding a list of values, so creating a record is
+# one list allocation and serialising it is a list copy. The dict-like methods
+# the pipelines use (item['x'], get, update, keys, items) still work.
+# Subclasses must declare __slots__ = () to stay slotted.
+
+
+class Record:
+    __slots__ = ('values',)
+    fields = ()  # Field names in CSV column order, set by subclasses
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Without it every instance gets a __dict__ (and accepts any attribute)
+        if '__slots__' not in cls.__dict__:
+            raise TypeError(f"{cls.__name__} must define __slots__ = ()")
+        cls.index = {field: i for i, field in enumerate(cls.fields)}
+        cls.empty_row = [''] * len(cls.fields)
+
+    def __init__(self, **values):
+        self.values = self.empty_row.copy()
+        if values:
+            self.update(values)
+
+    @classmethod
+    def from_row(cls, row):
+        """Record from a CSV row / to_row() list in field order"""
+        record = cls.__new__(cls)
+        record.values = list(row)
+        return record
+
+    def to_row(self):
+        return self.values.copy()
+
+    def __getitem__(self, field):
+        return self.values[self.index[field]]
+
+    def __setitem__(self, field, value):
+        self.values[self.index[field]] = value
+
+    def __contains__(self, field):
+        return field in self.index
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def get(self, field, default=None):
+        i = self.index.get(field)
+        return default if i is None else self.values[i]
+
+    def keys(self):
+        return self.fields
+
+    def items(self):
+        return zip(self.fields, self.values)
+
+    def update(self, values=(), **kwargs):
+        pairs = values.items() if hasattr(values, 'items') else values
+        for field, value in pairs:
+            self[field] = value
+        for field, value in kwargs.items():
+            self[field] = value
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values == other.values
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
@@ -52,26 +52,59 @@ CONCURRENT_REQUESTS = 5
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "project_nonproxy.middlewares.DgNonproxySpiderMiddleware": 543,
-#}
-
 SPIDER_MIDDLEWARES = {
     "scrapy.spidermiddlewares.httperror.HttpErrorMiddleware": 543,
 #    "project_nonproxy.middlewares.ScrapingLoggerMiddleware": 544,
+    # Highest order = closest to the spider, so parse time is the callback only
+    "project_nonproxy.middlewares.DgNonproxySpiderMiddleware": 950,
 }
 
+# Crawl metrics (see metrics.py): parse time per callback, items per type,
+# process_item latency per item pipeline and download latency per domain.
+# Written every METRICS_DUMP_INTERVAL seconds (0 = only at the end) and on
+# close, as JSON and as OpenMetrics text (None disables a file)
+METRICS_ENABLED = True
+METRICS_DUMP_INTERVAL = 30
+METRICS_JSON_FILE = "{spider}_metrics.json"
+METRICS_OPENMETRICS_FILE = "{spider}_metrics.prom"
+
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+    "project_nonproxy.middlewares.DgNonproxyDownloaderMiddleware": 543,
 }
 
+# Conditional GET (If-None-Match / If-Modified-Since) for product pages.
+# Unchanged pages re-emit the items cached from the previous crawl.
+CONDITIONAL_REQUESTS_ENABLED = False
+CONDITIONAL_STATE_DB = "http_validators.sqlite3"
+CONDITIONAL_URL_PATTERN = r"/proizvod/"
+
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 EXTENSIONS = {
+    "project_nonproxy.delivery.SFTPDelivery": 500,
 }
 
+# Upload the output files over SFTP when the spider closes (see delivery.py).
+# Credentials come from the environment / .env: SFTP_HOST, SFTP_PORT,
+# SFTP_USERNAME, SFTP_PASSWORD, SFTP_KEY_FILE. The server key must be in
+# SFTP_KNOWN_HOSTS (default ~/.ssh/known_hosts), SFTP_SKIP_HOST_KEY_CHECK=1
+# in the environment turns the check off
+SFTP_DELIVERY_ENABLED = False
+SFTP_REMOTE_DIR = "."
+# Output files of this run to upload, {spider} is the spider name
+SFTP_DELIVERY_PATTERNS = ["{spider}*_scrapy_*.csv", "{spider}*_scrapy_*.csv.gz", "{spider}*_scrapy_*.csv.zst", "{spider}*_scrapy_*.parquet"]
+SFTP_DELIVERY_WORKERS = 3
+# gzip CSV files on the fly (uploaded as .csv.gz), .gz/.zst outputs are sent as they are
+SFTP_DELIVERY_COMPRESS = True
+SFTP_DELIVERY_COMPRESSION_LEVEL = 6
+# Interrupted uploads resume after the last complete chunk (state in SFTP_DELIVERY_STATE)
+SFTP_DELIVERY_CHUNK_MB = 8
+SFTP_DELIVERY_STATE = "sftp_delivery.json"
+SFTP_DELIVERY_RETRIES = 3
+
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 #ITEM_PIPELINES = {
@@ -83,6 +116,63 @@ ITEM_PIPELINES = {
     "project_nonproxy.pipelines.MediaPipeline": 302,
 }
 
+# Output formats per pipeline: "csv" (';'-delimited) and/or "parquet"
+# (typed, dictionary-encoded columns, needs pyarrow). "catalog" (spec only,
+# opt-in) writes the spec keys/values as integer-keyed dictionary files plus
+# a providerKey;key_id;value_id codes file, see speccatalog.py
+PIPELINE_OUTPUT_FORMATS = {
+    "master": ["csv"],
+    "spec": ["csv"],
+    "media": ["csv"],
+}
+# Rows per Parquet row group, written as items arrive
+PARQUET_ROW_GROUP_SIZE = 50000
+PARQUET_COMPRESSION = "zstd"
+
+# Local price history (opt-in): ProductPipeline appends every run's prices
+# to this SQLite file and computes price changes per product. Query with
+#     python -m project_nonproxy.pricehistory price_history.sqlite3 --by brand
+PRICE_HISTORY_DB = None
+#PRICE_HISTORY_DB = "price_history.sqlite3"
+
+# Leave image URLs out of a media CSV row that were already written for another
+# product (shared placeholder/brand images), remaining images move up. The
+# MediaItem itself reaches later pipelines and feed exports unchanged
+MEDIA_DEDUPE_IMAGES = False
+
+# Compress the CSV outputs while they are written: "gzip" (.csv.gz), "zstd"
+# (.csv.zst, needs zstandard, the crawl stops without it) or None. Also used for the
+# sort runs and the Selenium spider's CSVPipeline (see compression.py)
+OUTPUT_COMPRESSION = None
+# Codec level, None = default (gzip 6, zstd 3)
+OUTPUT_COMPRESSION_LEVEL = None
+
+# Memory budget per pipeline for sorting rows in close_spider. Above it rows
+# are spilled to sorted temp files and merged into the final CSV.
+PIPELINE_SORT_MEMORY_MB = 64
+# Directory for the spilled runs (default: system temp dir)
+#PIPELINE_SORT_TEMP_DIR = "tmp"
+
+# Incremental sitemap crawling: only fetch products that are new or whose
+# sitemap <lastmod> changed since the last run (state kept in CRAWL_STATE_DB).
+# Products without a <lastmod> are fetched every run (or per the max age).
+# The output CSVs of such a run only contain the fetched products, i.e. the
+# changes since the previous run, they do not replace a full export.
+INCREMENTAL_CRAWL = False
+CRAWL_STATE_DB = "crawl_state.sqlite3"
+# Re-fetch unchanged products anyway after this many days (0 = never)
+INCREMENTAL_MAX_AGE_DAYS = 0
+
+# Price refresh crawls: Gigatron only emits ProductItems built from the JSON-LD
+# block (GTIN, title, price, category, brand), no specs/description/images.
+# The page DOM is never built, so this is much cheaper per response.
+GIGATRON_JSON_LD_ONLY = False
+
+# Remember which description/image fallback method works per product type
+# and try it first; the full fallback order is re-checked every N pages
+EXTRACTION_PLAN_CACHE = True
+EXTRACTION_PLAN_REVALIDATE = 100
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 AUTOTHROTTLE_ENABLED = True
@@ -0,0 +1,157 @@
+# Dictionary-encoded specification catalogue.
+#
+# Spec rows repeat the same few hundred SpecificationKey strings and a small
+# set of values ("Da", "Ne", brand names) for every product. The catalogue
+# interns them to integer IDs while the crawl runs and writes three files:
+#
+#   {basename}_keys.csv    key_id;SpecificationKey      (dimension table)
+#   {basename}_values.csv  value_id;SpecificationValue  (dimension table)
+#   {basename}_codes.csv   providerKey;key_id;value_id  (fact table)
+#
+# IDs are stable across runs: existing dictionary files are loaded first and
+# new strings are appended to them. Delete the dictionaries to renumber.
+# Dictionaries are flushed before the codes file at every checkpoint, so the
+# codes never reference an ID that is not on disk (see checkpoint.py).
+#
+# With compression (OUTPUT_COMPRESSION / --compression) all three files get
+# the .gz/.zst suffix. Checkpoints end a gzip member / zstd frame like
+# CSVPipeline does, so appending and --resume work on compressed files too.
+
+import csv
+import io
+import os
+
+from project_nonproxy.compression import StreamWriter, complete_size, compressed_filename, read_all
+
+CODES_HEADER = ['providerKey', 'key_id', 'value_id']
+KEYS_HEADER = ['key_id', 'SpecificationKey']
+VALUES_HEADER = ['value_id', 'SpecificationValue']
+
+
+class SpecCatalog:
+    def __init__(self, basename, compression=None, compression_level=None):
+        self.basename = basename
+        self.compression = compression
+        self.compression_level = compression_level
+        # Checkpoint offsets are keyed by the codes filename
+        self.filename = compressed_filename(f'{basename}_codes.csv', compression)
+        self.keys_filename = compressed_filename(f'{basename}_keys.csv', compression)
+        self.values_filename = compressed_filename(f'{basename}_values.csv', compression)
+        self.key_ids = {}
+        self.value_ids = {}
+        self.keys = []  # key_id -> SpecificationKey
+        self.values = []  # value_id -> SpecificationValue
+        self.count = 0
+        self.file = self.writer = None
+        self.keys_file = self.keys_writer = None
+        self.values_file = self.values_writer = None
+
+    def open_spider(self, spider=None, resume_offset=None):
+        self.keys_file, self.keys_writer = self._open_dictionary(self.keys_filename, KEYS_HEADER, self.keys, self.key_ids)
+        self.values_file, self.values_writer = self._open_dictionary(self.values_filename, VALUES_HEADER, self.values, self.value_ids)
+
+        # Codes written after the last checkpoint are redone by the resumed run. Without fsync
+        # the checkpoint may not have reached the disk, so only the complete part is kept.
+        size = 0
+        if resume_offset is not None and os.path.exists(self.filename):
+            size = complete_size(self.filename, self.compression, limit=resume_offset)
+        if size:
+            with open(self.filename, 'r+b') as f:
+                f.truncate(size)
+            text, _ = self._read_text(self.filename)
+            self.count = max(text.count('\n') - 1, 0)
+            self.file = self._writer(self.filename, append=True)
+            self.writer = csv.writer(self.file, delimiter=";")
+        else:
+            self.file = self._writer(self.filename)
+            # Only providerKey can contain text, so the codes are not quoted (smaller file)
+            self.writer = csv.writer(self.file, delimiter=";")
+            self.writer.writerow(CODES_HEADER)
+
+    def _writer(self, path, append=False):
+        return StreamWriter(path, self.compression, self.compression_level, append=append)
+
+    def _read_text(self, path):
+        """Decoded contents of a (compressed) file and whether its last member/frame is complete"""
+        data, complete = read_all(path, self.compression)
+        return data.decode('utf-8', errors='replace'), complete
+
+    def _open_dictionary(self, path, header, strings, ids):
+        """Load an existing dictionary file, return it opened for appending"""
+        if os.path.exists(path):
+            text, complete = self._read_text(path)
+            rows = list(csv.reader(io.StringIO(text, newline=''), delimiter=";"))[1:]
+            torn = bool(text) and not text.endswith('\n')
+            if torn:
+                rows = rows[:-1]  # Torn last row from a crash mid-write
+            for row in rows:
+                if len(row) != 2 or row[0] != str(len(strings)):
+                    break
+                ids[row[1]] = len(strings)
+                strings.append(row[1])
+            # Rewrite it from the rows that were loaded: drops a torn tail row or an
+            # unfinished gzip member / zstd frame, so appending after it is safe
+            if len(rows) != len(strings) or torn or not complete:
+                self._write_dictionary(path, header, strings)
+        else:
+            self._write_dictionary(path, header, strings)
+        f = self._writer(path, append=True)
+        return f, csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+
+    def _write_dictionary(self, path, header, strings):
+        with self._writer(path) as f:
+            writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+            writer.writerows(enumerate(strings))
+
+    def key_id(self, key):
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.keys_writer.writerow([key_id, key])
+        return key_id
+
+    def value_id(self, value):
+        value_id = self.value_ids.get(value)
+        if value_id is None:
+            value_id = self.value_ids[value] = len(self.values)
+            self.values.append(value)
+            self.values_writer.writerow([value_id, value])
+        return value_id
+
+    def encode(self, key, value):
+        """(key_id, value_id), new strings get the next free ID"""
+        return self.key_id(key or ''), self.value_id(value or '')
+
+    def decode(self, key_id, value_id):
+        """Interned (SpecificationKey, SpecificationValue) strings for the IDs"""
+        return self.keys[key_id], self.values[value_id]
+
+    def write(self, provider_key, key_id, value_id):
+        self.writer.writerow([provider_key, key_id, value_id])
+        self.count += 1
+
+    def add(self, provider_key, key, value):
+        """Encode and write one spec row, return its (key_id, value_id)"""
+        key_id, value_id = self.encode(key, value)
+        self.write(provider_key, key_id, value_id)
+        return key_id, value_id
+
+    def checkpoint(self):
+        """Flush and fsync the dictionaries, then the codes, return the codes size in bytes"""
+        for f in (self.keys_file, self.values_file, self.file):
+            size = f.end_frame()
+            os.fsync(f.fileno())
+        return size
+
+    def close_spider(self, spider=None):
+        for f in (self.keys_file, self.values_file, self.file):
+            if f:
+                f.close()
+        message = (f"Spec katalog {self.basename}: {len(self.keys)} ključeva, {len(self.values)} vrednosti, "
+                   f"{self.count} redova u {self.filename}")
+        if spider is not None and hasattr(spider, 'logger'):
+            spider.logger.info(message)
+        else:
+            print(message)
@@ -1,9 +1,11 @@
 import scrapy
-import json
-import re
-from urllib.parse import unquote, urlparse, parse_qs
+from scrapy import signals
 from scrapy.spiders import SitemapSpider
+from project_nonproxy import gigatron_extract
 from project_nonproxy.items import ProductItem, SpecItem, MediaItem
+from project_nonproxy.crawlstate import CrawlStateStore
+from project_nonproxy.frontier import URLFrontier
+from project_nonproxy.plan_cache import ExtractionPlanCache
 
 class GigatronSpider(SitemapSpider):
     name = 'gigatron'
@@ -17,135 +19,133 @@ class GigatronSpider(SitemapSpider):
         (r'/proizvod/', 'parse')  # Products only
     ]
     
+    # Set by DgNonproxyDownloaderMiddleware when conditional requests are enabled
+    http_validators = None
+    # GIGATRON_JSON_LD_ONLY: only ProductItems from JSON-LD, the DOM is never built
+    json_ld_only = False
+    # Learned description/image fallback order per product type (see plan_cache.py)
+    description_plans = None
+    image_plans = None
+
     custom_settings = {
         'DOWNLOAD_DELAY': 2,
         'CONCURRENT_REQUESTS': 3,
         'ROBOTSTXT_OBEY': False,
     }
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.crawl_state = None
+        spider.max_age = None
+        spider.skipped_unchanged = 0
+        # Products listed in both samsung.xml and proizvodi.xml are scheduled once
+        spider.frontier = URLFrontier()
+        spider.json_ld_only = crawler.settings.getbool('GIGATRON_JSON_LD_ONLY')
+        if crawler.settings.getbool('EXTRACTION_PLAN_CACHE', True):
+            revalidate_every = crawler.settings.getint('EXTRACTION_PLAN_REVALIDATE', 100)
+            spider.description_plans = ExtractionPlanCache('description', gigatron_extract.DESCRIPTION_METHODS, revalidate_every)
+            spider.image_plans = ExtractionPlanCache('images', gigatron_extract.IMAGE_METHODS, revalidate_every)
+        if crawler.settings.getbool('INCREMENTAL_CRAWL'):
+            spider.crawl_state = CrawlStateStore(crawler.settings.get('CRAWL_STATE_DB', 'crawl_state.sqlite3'))
+            max_age_days = crawler.settings.getfloat('INCREMENTAL_MAX_AGE_DAYS', 0)
+            spider.max_age = max_age_days * 86400 if max_age_days else None
+            # A page counts as crawled once the pipelines took all of its items
+            spider.pending_pages = {}  # url -> items not scraped yet
+            crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
+            crawler.signals.connect(spider.item_failed, signal=signals.item_dropped)
+            crawler.signals.connect(spider.item_failed, signal=signals.item_error)
+        return spider
+
+    def sitemap_filter(self, entries):
+        # Drop duplicate products, and in incremental mode unchanged ones
+        for entry in entries:
+            url = entry.get('loc', '')
+            if '/proizvod/' in url:
+                if not self.frontier.add(url):
+                    continue
+                if self.crawl_state is not None and not self.crawl_state.needs_crawl(self.name, url, entry.get('lastmod'), self.max_age):
+                    self.skipped_unchanged += 1
+                    continue
+            yield entry
+
+    def closed(self, reason):
+        for plans in (self.description_plans, self.image_plans):
+            if plans is not None:
+                plans.record_stats(self.crawler.stats)
+                self.logger.info(f"Extraction plan cache ({plans.name}): {plans.hit_rate:.1%} hit rate, {len(plans.plans)} templates")
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+            self.logger.info(f"Incremental crawl: skipped {self.skipped_unchanged} unchanged products")
+            self.crawler.stats.set_value('incremental/skipped_unchanged', self.skipped_unchanged)
+
     def parse(self, response):
+        # Page not modified since the last crawl: re-emit the cached items
+        cached_items = response.meta.get('cached_items')
+        if cached_items is not None:
+            self.logger.info(f"Not modified, replaying {len(cached_items)} cached items: {response.url}")
+            self.track_page(response.url, cached_items)
+            yield from cached_items
+            return
+        
+        items = list(self.parse_product(response))
+        # JSON-LD-only items lack specs and media, replaying them on a 304 would lose those
+        if self.http_validators is not None and items and not self.json_ld_only:
+            self.http_validators.save_items(response.url, items)
+        # Not marked as crawled after a JSON-LD-only parse, the next full crawl still has to visit the page
+        if not self.json_ld_only:
+            self.track_page(response.url, items)
+        yield from items
+
+    def track_page(self, url, items):
+        if self.crawl_state is not None and items:
+            self.pending_pages[url] = len(items)
+
+    def item_scraped(self, item, response):
+        remaining = self.pending_pages.get(response.url)
+        if remaining is None:
+            return
+        if remaining > 1:
+            self.pending_pages[response.url] = remaining - 1
+        else:
+            del self.pending_pages[response.url]
+            self.crawl_state.mark_crawled(self.name, response.url)
+
+    def item_failed(self, item, response):
+        # Dropped or failed in a pipeline: fetch the page again next run
+        self.pending_pages.pop(response.url, None)
+
+    def parse_product(self, response):
         self.logger.info(f"Parsing URL: {response.url}")
         
         # Extract GTIN and other data from JSON-LD script
-        gtin = None
-        json_ld_data = None
-        json_ld_scripts = response.xpath('//script[@type="application/ld+json"]/text()').getall()
-        
-        for script in json_ld_scripts:
-            try:
-                data = json.loads(script)
-                if data.get('@type') == 'Product':
-                    json_ld_data = data
-                    gtin = json_ld_data.get('sku', '').strip()
-                    break
-            except json.JSONDecodeError:
-                continue
+        json_ld_data = self.extract_json_ld(response)
+        gtin = json_ld_data.get('sku', '').strip() if json_ld_data else None
         
         if not gtin:
             self.logger.error(f"GTIN not found for {response.url}")
             return
         
-        # Create ProductItem object
-        product = ProductItem()
+        if self.json_ld_only:
+            # Price refresh: no specs, description or images, so no DOM either
+            brand = json_ld_data.get('brand')
+            if isinstance(brand, dict):
+                brand = brand.get('name')
+            yield self.product_from_json_ld(json_ld_data, gtin, brand if isinstance(brand, str) else None)
+            return
         
         # Pre-extract specifications to get brand and other data
-        specs_data = {}
-        spec_rows = response.css('table tbody tr')
-        brand_from_specs = None
-        
-        for row in spec_rows:
-            cells = row.css('td')
-            if len(cells) >= 2:
-                key_cell = cells[0]
-                value_cell = cells[1]
-                
-                # Skip headers (colspan=2)
-                if key_cell.css('[colspan]'):
-                    continue
-                
-                key = key_cell.css('::text').get()
-                value = value_cell.css('span::text').get()
-                
-                if key and value:
-                    key_clean = key.strip()
-                    value_clean = value.strip()
-                    specs_data[key_clean] = value_clean
-                    
-                    # Check for brand
-                    if key_clean == 'Brend':
-                        brand_from_specs = value_clean
-        
-        product['providerkey'] = gtin
-        product['gtin'] = gtin
-        
-        # Extract basic product information from JSON-LD
-        title = ""
-        if json_ld_data:
-            title = json_ld_data.get('name', '').strip()
-            product['title'] = title
-            
-            # Extract price from JSON-LD offers section
-            offers = json_ld_data.get('offers', {})
-            if offers and offers.get('price'):
-                product['price'] = offers['price']
-            
-            # Extract category path from JSON-LD
-            category_data = json_ld_data.get('category', {})
-            if category_data and category_data.get('itemListElement'):
-                category_items = category_data['itemListElement']
-                # Get category names, skip first one if too generic
-                category_names = [item.get('name', '') for item in category_items if item.get('name')]
-                if len(category_names) > 1:
-                    # Use last categories for more specific classification
-                    product['productType'] = ' > '.join(category_names[-3:])
-                elif category_names:
-                    product['productType'] = category_names[-1]
-        
-        # Extract brand - priority: specifications > first word from title
-        if brand_from_specs:
-            product['brand'] = brand_from_specs
-        elif title:
-            # Use first word from title as fallback brand
-            first_word = title.split()[0] if title.split() else ""
-            if first_word:
-                product['brand'] = first_word
-        
-        # Extract description using XPath
-        description_parts = []
+        specs_data = self.extract_specs(response)
         
-        # Method 1: Try to find active tab panel with description
-        description_xpath = '//div[@role="tabpanel"][@data-headlessui-state="selected"]//text()[normalize-space()]'
-        description_texts = response.xpath(description_xpath).getall()
+        # Create ProductItem object
+        product = self.product_from_json_ld(json_ld_data, gtin, specs_data.get('Brend'))
         
-        if description_texts:
-            # Clean and join all text parts
-            for text in description_texts:
-                cleaned_text = text.strip()
-                if cleaned_text and len(cleaned_text) > 3:  # Skip very short texts
-                    description_parts.append(cleaned_text)
+        # Pages with the same category path share a template
+        template = product.get('productType', '')
         
-        # Method 2: Fallback - search for description in any tab panel with content
-        if not description_parts:
-            fallback_xpath = '//div[@role="tabpanel"]//li/text()[normalize-space()]'
-            fallback_texts = response.xpath(fallback_xpath).getall()
-            
-            for text in fallback_texts:
-                cleaned_text = text.strip()
-                if cleaned_text and len(cleaned_text) > 10:  # Skip very short texts
-                    description_parts.append(cleaned_text)
-        
-        # Method 3: CSS selector as last resort
-        if not description_parts:
-            css_description = response.css('div[role="tabpanel"][data-headlessui-state="selected"] li::text').getall()
-            description_parts = [text.strip() for text in css_description if text.strip()]
-        
-        if description_parts:
-            # Join all description parts with spaces
-            full_description = ' '.join(description_parts)
-            # Clean multiple whitespaces
-            full_description = re.sub(r'\s+', ' ', full_description).strip()
-            if full_description:
-                product['longdescription'] = full_description
+        full_description = self.extract_description(response, template)
+        if full_description:
+            product['longdescription'] = full_description
         
         # Extract manufacturer code (model) from specifications
         model = specs_data.get('Model')
@@ -167,47 +167,7 @@ class GigatronSpider(SitemapSpider):
             spec_item['SpecificationValue'] = value
             yield spec_item
         
-        # Extract images
-        image_urls = []
-        
-        # Method 1: Extract from img src attributes
-        img_elements = response.css('button[aria-label*="Slika proizvoda"] img')
-        for img in img_elements:
-            src = img.css('::attr(src)').get()
-            if src:
-                # Extract actual image URL from Next.js image URL
-                if '/_next/image?url=' in src:
-                    try:
-                        parsed_url = urlparse(src)
-                        query_params = parse_qs(parsed_url.query)
-                        if 'url' in query_params:
-                            actual_url = unquote(query_params['url'][0])
-                            image_urls.append(actual_url)
-                    except Exception as e:
-                        self.logger.warning(f"Failed to parse image URL {src}: {e}")
-                else:
-                    image_urls.append(src)
-        
-        # Method 2: Extract from srcSet attribute (fallback option)
-        if not image_urls:
-            for img in img_elements:
-                srcset = img.css('::attr(srcSet)').get()
-                if srcset:
-                    # Extract highest resolution image from srcset
-                    srcset_parts = srcset.split(',')
-                    if srcset_parts:
-                        # Get last (highest resolution) image
-                        last_part = srcset_parts[-1].strip()
-                        src_url = last_part.split(' ')[0]
-                        if '/_next/image?url=' in src_url:
-                            try:
-                                parsed_url = urlparse(src_url)
-                                query_params = parse_qs(parsed_url.query)
-                                if 'url' in query_params:
-                                    actual_url = unquote(query_params['url'][0])
-                                    image_urls.append(actual_url)
-                            except Exception as e:
-                                self.logger.warning(f"Failed to parse srcset URL {src_url}: {e}")
+        image_urls = self.extract_images(response, template)
         
         # Create MediaItem object if we have images
         if image_urls:
@@ -220,3 +180,69 @@ class GigatronSpider(SitemapSpider):
                     media_item[f'imageurl_{i}'] = url
             
             yield media_item
+
+    def product_from_json_ld(self, json_ld_data, gtin, brand=None):
+        """ProductItem with the fields that come from JSON-LD"""
+        product = ProductItem()
+        product['providerkey'] = gtin
+        product['gtin'] = gtin
+        
+        # Extract basic product information from JSON-LD
+        title = json_ld_data.get('name', '').strip()
+        product['title'] = title
+        
+        # Extract price from JSON-LD offers section
+        offers = json_ld_data.get('offers', {})
+        if offers and offers.get('price'):
+            product['price'] = offers['price']
+        
+        # Extract category path from JSON-LD
+        category_data = json_ld_data.get('category', {})
+        if category_data and category_data.get('itemListElement'):
+            category_items = category_data['itemListElement']
+            # Get category names, skip first one if too generic
+            category_names = [item.get('name', '') for item in category_items if item.get('name')]
+            if len(category_names) > 1:
+                # Use last categories for more specific classification
+                product['productType'] = ' > '.join(category_names[-3:])
+            elif category_names:
+                product['productType'] = category_names[-1]
+        
+        # Extract brand - priority: given brand (specifications) > first word from title
+        if brand:
+            product['brand'] = brand
+        elif title:
+            # Use first word from title as fallback brand
+            first_word = title.split()[0] if title.split() else ""
+            if first_word:
+                product['brand'] = first_word
+        return product
+
+    # Extraction stages, kept separate so benchmarks/bench_parse.py can time each one.
+    # They run the precompiled XPaths from gigatron_extract on the lxml tree.
+
+    def extract_json_ld(self, response):
+        """Product JSON-LD object of the page, or None"""
+        # Raw-bytes fast path first, the DOM is only consulted if it finds nothing
+        json_ld_data = gigatron_extract.find_product_json_ld(response.body, response.encoding)
+        if json_ld_data is None:
+            json_ld_data = gigatron_extract.extract_json_ld(response.selector.root)
+        return json_ld_data
+
+    def extract_specs(self, response):
+        """Specification table as {key: value}"""
+        return gigatron_extract.extract_specs(response.selector.root)
+
+    def extract_description(self, response, template=None):
+        """Product description text from the tab panels, or None"""
+        root = response.selector.root
+        if self.description_plans is None or template is None:
+            return gigatron_extract.extract_description(root)
+        return gigatron_extract.join_description(self.description_plans.run(template, root))
+
+    def extract_images(self, response, template=None):
+        """Full-size product image URLs from the gallery"""
+        root = response.selector.root
+        if self.image_plans is None or template is None:
+            return gigatron_extract.extract_images(root, self.logger)
+        return self.image_plans.run(template, root, self.logger) or []
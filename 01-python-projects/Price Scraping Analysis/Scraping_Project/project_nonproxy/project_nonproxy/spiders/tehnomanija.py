@@ -11,12 +11,25 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
-import random
 from webdriver_manager.chrome import ChromeDriverManager
 import csv
-from collections import OrderedDict
 from urllib.parse import urljoin, urlparse
 import re
+import argparse
+import multiprocessing
+import queue
+from project_nonproxy.checkpoint import CheckpointJournal
+from project_nonproxy.compression import StreamWriter, complete_size, compressed_filename, open_text, resolve_compression
+from project_nonproxy.crawlstate import CrawlStateStore
+from project_nonproxy.frontier import URLFrontier, canonicalize_url
+from project_nonproxy.health import DEFAULT_ENDPOINTS, ConnectivityMonitor
+from project_nonproxy.pricehistory import PriceHistoryStore
+from project_nonproxy.records import Record
+from project_nonproxy.speccatalog import SpecCatalog
+from project_nonproxy.throttle import AdaptiveThrottle
+from project_nonproxy.tehnomanija_extract import (
+    PRODUCT_PAYLOAD_SCRIPT, REQUIRED_FIELDS, extract_product_html, is_complete, payload_from_script,
+)
 
 # Try importing alternative XML parsers
 try:
@@ -31,110 +44,259 @@ try:
 except ImportError:
     HAS_BS4 = False
 
-# Simple Item classes
-class ProductItem(dict):
-    def __init__(self):
-        super().__init__()
-        self.fields = OrderedDict([
-            ('providerkey', ''),
-            ('gtin', ''),
-            ('manufacturerkey', ''),
-            ('brand', ''),
-            ('productType', ''),
-            ('title', ''),
-            ('countryoforigin', ''),
-            ('longdescription', ''),
-            ('price', ''),
-        ])
-        for field in self.fields:
-            self[field] = ""
-
-class SpecItem(dict):
-    def __init__(self):
-        super().__init__()
-        self.fields = OrderedDict([
-            ('providerKey', ''),
-            ('SpecificationKey', ''),
-            ('SpecificationValue', ''),
-        ])
-        for field in self.fields:
-            self[field] = ""
-
-class MediaItem(dict):
-    def __init__(self):
-        super().__init__()
-        self.fields = OrderedDict([
-            ('providerKey', ''),
-            ('gtin', ''),
-            ('datasheeturl_1', ''),
-            ('datasheeturl_2', ''),
-            ('datasheeturl_3', ''),
-            ('safetydatasheet', ''),
-            ('energylabel', ''),
-            ('imageurl_1', ''),
-            ('imageurl_2', ''),
-            ('imageurl_3', ''),
-            ('imageurl_4', ''),
-            ('imageurl_5', ''),
-            ('imageurl_6', ''),
-            ('imageurl_7', ''),
-            ('imageurl_8', ''),
-            ('imageurl_9', ''),
-            ('imageurl_10', ''),
-        ])
-        for field in self.fields:
-            self[field] = ""
+# Simple Item classes: fixed schemas, one list of values per item (see records.py)
+class ProductItem(Record):
+    __slots__ = ()
+    fields = (
+        'providerkey',
+        'gtin',
+        'manufacturerkey',
+        'brand',
+        'productType',
+        'title',
+        'countryoforigin',
+        'longdescription',
+        'price',
+    )
+
+class SpecItem(Record):
+    __slots__ = ()
+    fields = (
+        'providerKey',
+        'SpecificationKey',
+        'SpecificationValue',
+    )
+
+class MediaItem(Record):
+    __slots__ = ()
+    fields = (
+        'providerKey',
+        'gtin',
+        'datasheeturl_1',
+        'datasheeturl_2',
+        'datasheeturl_3',
+        'safetydatasheet',
+        'energylabel',
+        'imageurl_1',
+        'imageurl_2',
+        'imageurl_3',
+        'imageurl_4',
+        'imageurl_5',
+        'imageurl_6',
+        'imageurl_7',
+        'imageurl_8',
+        'imageurl_9',
+        'imageurl_10',
+    )
 
 # Simple CSV Pipeline
+# Rows are buffered and written in batches (batch_size rows or every
+# flush_interval seconds). Checkpoints and close_spider always write the
+# buffer out, and with fsync=True checkpoints also fsync the file, so
+# everything up to the last checkpoint is durable. Rows still in the buffer
+# at a crash belong to products after the checkpoint and are redone by --resume.
+# With compression (gzip/zstd) every checkpoint ends a gzip member/zstd frame,
+# so the checkpoint offset is a valid end of the compressed file as well.
 class CSVPipeline:
-    def __init__(self, filename, item_class):
-        self.filename = filename
+    def __init__(self, filename, item_class, catalog=None, batch_size=500, flush_interval=5.0, fsync=True,
+                 compression=None, compression_level=None):
+        self.compression = compression
+        self.compression_level = compression_level
+        self.filename = compressed_filename(filename, compression)
         self.item_class = item_class
-        self.data = []
+        # Spec rows are also written as integer codes (see speccatalog.py)
+        self.catalog = catalog
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        # Counters only, rows are not kept in memory
+        self.count = 0
+        self.duplicates = 0
+        self.flushes = 0
         self.seen_keys = set()
         self.file = None
         self.writer = None
 
-    def open_spider(self, spider):
+    def open_spider(self, spider, resume_offset=None):
+        if resume_offset is not None and os.path.exists(self.filename) and self.resume(resume_offset):
+            return
         print(f"Opening {self.filename} for writing...")
-        self.file = open(self.filename, 'w', newline='', encoding='utf-8')
+        self.file = StreamWriter(self.filename, self.compression, self.compression_level)
         self.writer = csv.writer(self.file, delimiter=";", quoting=csv.QUOTE_ALL)
-        headers = list(self.item_class().fields.keys())
+        headers = list(self.item_class.fields)
         self.writer.writerow(headers)
         self.file.flush()
 
+    def resume(self, offset):
+        """Cut the file back to a checkpoint, reload its keys and append after it, False if nothing is left"""
+        # Without fsync a crash can lose data before the journaled offset: the file may be
+        # shorter or end in a torn row / gzip member / zstd frame. Keep only its complete part.
+        size = complete_size(self.filename, self.compression, limit=offset)
+        if size < offset:
+            print(f"{self.filename}: the last checkpoint did not reach the disk, resuming from byte {size} instead of {offset}")
+        with open(self.filename, 'r+b') as f:
+            f.truncate(size)
+        if not size:
+            return False
+        with open_text(self.filename, self.compression) as f:
+            reader = csv.reader(f, delimiter=";")
+            headers = next(reader, None)
+            for row in reader:
+                if headers == list(self.item_class.fields):
+                    item = self.item_class.from_row(row)
+                else:
+                    item = self.item_class()
+                    item.update(zip(headers, row))
+                self.seen_keys.add(self.item_key(item))
+                self.count += 1
+        print(f"Resuming {self.filename} with {self.count} items from the last checkpoint")
+        self.file = StreamWriter(self.filename, self.compression, self.compression_level, append=True)
+        self.writer = csv.writer(self.file, delimiter=";", quoting=csv.QUOTE_ALL)
+        return True
+
+    def item_key(self, item):
+        # For specifications, use combination of providerKey + SpecificationKey as unique key
+        if isinstance(item, SpecItem):
+            return f"{item.get('providerKey', '')}_{item.get('SpecificationKey', '')}"
+        return item.get('providerKey') or item.get('providerkey')
+
+    def flush(self):
+        """Write the buffered rows and flush them to the OS"""
+        if self.buffer:
+            self.writer.writerows(self.buffer)
+            self.buffer.clear()
+            self.flushes += 1
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def checkpoint(self):
+        """Write out the buffer (and fsync if enabled), return the file size in bytes"""
+        self.flush()
+        size = self.file.end_frame()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        return size
+
     def process_item(self, item, spider):
         if isinstance(item, self.item_class):
-            # For specifications, use combination of providerKey + SpecificationKey as unique key
-            if isinstance(item, SpecItem):
-                key = f"{item.get('providerKey', '')}_{item.get('SpecificationKey', '')}"
-            else:
-                key = item.get('providerKey') or item.get('providerkey')
+            key = self.item_key(item)
             
             if key and key not in self.seen_keys:
                 self.seen_keys.add(key)
-                row = [item.get(field, "") for field in item.fields.keys()]
-                self.writer.writerow(row)
-                self.file.flush()
-                self.data.append(row)
-                print(f"Saved item with key: {key}")
+                if self.catalog:
+                    self.catalog.add(item.get('providerKey'), item.get('SpecificationKey'), item.get('SpecificationValue'))
+                self.buffer.append(item.to_row())
+                self.count += 1
+                if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                    self.flush()
+            elif key:
+                self.duplicates += 1
         return item
 
     def close_spider(self, spider):
         if self.file:
+            self.flush()
             self.file.close()
-        print(f"Closed {self.filename}. Total saved items: {len(self.data)}")
+        print(f"Closed {self.filename}. Total saved items: {self.count} "
+              f"({self.duplicates} duplicates skipped, {self.flushes} batch writes)")
+
+# Pipeline used by pool workers: items are sent to the writer process
+class QueuePipeline:
+    def __init__(self, result_queue):
+        self.result_queue = result_queue
+
+    def process_item(self, item, spider):
+        self.result_queue.put(('item', type(item).__name__, item.to_row()))
+        return item
+
+# Appends product prices to the local price history (see pricehistory.py)
+class PriceHistoryPipeline:
+    def __init__(self, path, retailer, resume=False):
+        self.store = PriceHistoryStore(path)
+        self.retailer = retailer
+        # A resumed run continues the unfinished run instead of starting a new one
+        self.run_id = self.store.start_run(retailer, resume=resume)
+        self.changes = 0
+
+    def process_item(self, item, spider):
+        if isinstance(item, ProductItem):
+            delta = self.store.record(
+                self.run_id, self.retailer, item.get('gtin') or item.get('providerkey'), item.get('price'),
+                brand=item.get('brand'), category=item.get('productType'),
+            )
+            if delta is not None:
+                self.changes += 1
+        return item
+
+    def close_spider(self, spider, finished=True):
+        if finished:
+            self.store.finish_run(self.run_id)
+        self.store.close()
+        print(f"Price history: {self.changes} price changes in run {self.run_id}")
+
+ITEM_CLASSES = {cls.__name__: cls for cls in (ProductItem, SpecItem, MediaItem)}
 
 class TehnomanijaSeleniumSpider:
     name = "tehnomanija"
     
-    def __init__(self):
+    def __init__(self, incremental=False, state_db='crawl_state.sqlite3', max_age_days=None, fast_path=True,
+                 workers=1, result_queue=None, frontier_file=None, health_endpoints=DEFAULT_ENDPOINTS,
+                 network_wait=300, resume=False, checkpoint_file=None, checkpoint_every=25,
+                 price_history_db=None, spec_catalog=False, write_batch_size=500,
+                 flush_interval=5.0, fsync_checkpoints=True, compression=None, compression_level=None):
         self.driver = None
         self.session = None
+        # Connectivity is checked in the background instead of before every product
+        self.health = ConnectivityMonitor(health_endpoints).start()
+        self.network_wait = network_wait
+        # Per-domain delays sized from observed latency instead of fixed sleeps
+        self.throttle = AdaptiveThrottle()
+        self.resume = resume
+        self.journal = None
+        if result_queue is None:
+            # Checkpoint journal, see checkpoint.py. Pool workers only report to the writer.
+            self.journal = CheckpointJournal(checkpoint_file or f'{self.name}_checkpoint.jsonl', every=checkpoint_every)
+            if resume:
+                self.journal.load()
+                frontier_file = frontier_file or self.journal.frontier_path
+            else:
+                self.journal.reset()
+            if frontier_file is None:
+                # The collected URLs are needed to resume without the sitemaps
+                frontier_file = f'{self.name}_frontier.txt'
+                if not resume and os.path.exists(frontier_file):
+                    os.remove(frontier_file)
+        self.frontier_file = frontier_file
+        self.frontier = URLFrontier(path=frontier_file)
+        self.price_history_db = price_history_db
+        self.price_pipeline = None
+        self.spec_catalog = spec_catalog
+        self.catalog = None
+        # Batched (and optionally compressed) CSV writes, see CSVPipeline
+        self.writer_options = {'batch_size': write_batch_size, 'flush_interval': flush_interval, 'fsync': fsync_checkpoints,
+                               'compression': resolve_compression(compression), 'compression_level': compression_level}
+        # An interrupted run stays open in the price history, --resume continues it
+        self.interrupted = False
+        # Number of Chrome worker processes, 1 = process everything in this process
+        self.workers = workers
+        self.state_db = state_db
+        # Fast path: HTTP + lxml first, Selenium only as fallback
+        self.fast_path = fast_path
+        self.fast_path_count = 0
+        self.browser_path_count = 0
+        # Incremental mode: skip products whose sitemap <lastmod> did not change
+        self.crawl_state = CrawlStateStore(state_db) if incremental else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
         self.setup_chrome_options()
         self.setup_session()
         self.init_driver()
-        self.setup_pipelines()
+        if result_queue is not None:
+            # Pool worker: the writer process owns the CSV pipelines
+            self.product_pipeline = self.spec_pipeline = self.media_pipeline = QueuePipeline(result_queue)
+        elif workers == 1:
+            self.setup_pipelines()
 
     def setup_chrome_options(self):
         self.chrome_options = Options()
@@ -158,7 +320,7 @@ class TehnomanijaSeleniumSpider:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'application/xml,text/xml,application/xhtml+xml,text/html;q=0.9,*/*;q=0.8',
             'Accept-Language': 'sr-RS,sr;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Encoding': 'gzip, deflate',  # No br: requests can only decode it with brotli installed
             'DNT': '1',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
@@ -166,13 +328,47 @@ class TehnomanijaSeleniumSpider:
 
     def setup_pipelines(self):
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        self.product_pipeline = CSVPipeline(f'{self.name}_master.csv', ProductItem)
-        self.spec_pipeline = CSVPipeline(f'{self.name}_spec.csv', SpecItem)
-        self.media_pipeline = CSVPipeline(f'{self.name}_media.csv', MediaItem)
+        self.catalog = self.create_catalog(self.name, self.spec_catalog, self.writer_options)
+        self.product_pipeline = CSVPipeline(f'{self.name}_master.csv', ProductItem, **self.writer_options)
+        self.spec_pipeline = CSVPipeline(f'{self.name}_spec.csv', SpecItem, catalog=self.catalog, **self.writer_options)
+        self.media_pipeline = CSVPipeline(f'{self.name}_media.csv', MediaItem, **self.writer_options)
+        
+        # On --resume, outputs continue from the last checkpoint
+        offsets = self.journal.offsets if self.resume and self.journal else {}
+        for pipeline in self.pipelines():
+            pipeline.open_spider(self, resume_offset=offsets.get(pipeline.filename))
+        if self.price_history_db:
+            self.price_pipeline = PriceHistoryPipeline(self.price_history_db, self.name, resume=self.resume)
+
+    @staticmethod
+    def create_catalog(spider_name, spec_catalog, writer_options):
+        """Integer-coded spec catalogue (opt-in), compressed like the CSV files"""
+        if not spec_catalog:
+            return None
+        return SpecCatalog(f'{spider_name}_spec', writer_options.get('compression'), writer_options.get('compression_level'))
+
+    def pipelines(self):
+        """Everything that writes output and takes part in checkpoints"""
+        pipelines = [self.product_pipeline, self.spec_pipeline, self.media_pipeline]
+        if self.catalog:
+            pipelines.append(self.catalog)
+        return pipelines
+
+    def collect_product_urls(self):
+        """Product URLs still to process, the sitemaps are skipped when resuming"""
+        if self.resume and self.journal.frontier_path and len(self.frontier):
+            product_urls = list(self.frontier)
+            print(f"Resuming with {len(product_urls)} URLs from {self.frontier_file}")
+        else:
+            product_urls = self.get_all_product_urls(limit=50)  # Increased limit for testing
+            self.frontier.flush()
+            self.journal.mark_frontier_complete(self.frontier_file, len(product_urls))
         
-        self.product_pipeline.open_spider(self)
-        self.spec_pipeline.open_spider(self)
-        self.media_pipeline.open_spider(self)
+        if self.resume and self.journal.completed:
+            remaining = [url for url in product_urls if url not in self.journal.completed]
+            print(f"Skipping {len(product_urls) - len(remaining)} products finished before the last checkpoint")
+            product_urls = remaining
+        return product_urls
 
     def init_driver(self):
         """Initialize Chrome driver with stealth settings"""
@@ -198,8 +394,19 @@ class TehnomanijaSeleniumSpider:
         """Use Selenium to get sitemap content"""
         try:
             print(f"Fetching {sitemap_url} with Selenium...")
+            self.throttle.wait(sitemap_url)
+            start = time.monotonic()
             self.driver.get(sitemap_url)
-            time.sleep(3)
+            
+            # Wait until the XML is parsed instead of a fixed sleep. Only the ready
+            # state is polled, the (multi-MB) page source is read once below.
+            try:
+                WebDriverWait(self.driver, 20).until(
+                    lambda driver: driver.execute_script("return document.readyState") == "complete"
+                )
+            except TimeoutException:
+                print("Sitemap did not finish loading in 20s")
+            self.throttle.record(sitemap_url, time.monotonic() - start)
             
             # Get page source
             page_source = self.driver.page_source
@@ -304,9 +511,22 @@ class TehnomanijaSeleniumSpider:
 
         return urls
 
+    def parse_lastmods_from_xml(self, xml_content):
+        """Map each <loc> to its <lastmod> (only needed in incremental mode)"""
+        lastmods = {}
+        url_pattern = r'<url>(.*?)</url>'
+        for block in re.findall(url_pattern, xml_content, re.DOTALL):
+            loc = re.search(r'<loc>(.*?)</loc>', block, re.DOTALL)
+            lastmod = re.search(r'<lastmod>(.*?)</lastmod>', block, re.DOTALL)
+            if loc and lastmod:
+                lastmods[loc.group(1).strip()] = lastmod.group(1).strip()
+        return lastmods
+
     def get_all_product_urls(self, limit=None):
         """Get all product URLs from XML sitemaps using multiple methods"""
-        all_product_urls = []
+        # Ordered, set-backed frontier (optionally persisted with --frontier-file)
+        frontier = self.frontier
+        skipped_unchanged = 0
         
         # Known sitemap URLs
         sitemap_urls = [
@@ -316,7 +536,7 @@ class TehnomanijaSeleniumSpider:
         ]
         
         for sitemap_url in sitemap_urls:
-            if limit and len(all_product_urls) >= limit:
+            if limit and len(frontier) >= limit:
                 break
                 
             print(f"\n=== Processing {sitemap_url} ===")
@@ -328,52 +548,41 @@ class TehnomanijaSeleniumSpider:
             # Parse URLs from XML content
             if xml_content:
                 urls = self.parse_urls_from_xml_multiple_methods(xml_content)
+                lastmods = self.parse_lastmods_from_xml(xml_content) if self.crawl_state else {}
                 
                 # Add ALL URLs without aggressive filtering
+                added = 0
                 for url in urls:
-                    if limit and len(all_product_urls) >= limit:
+                    if limit and len(frontier) >= limit:
                         break
-                    # Only check that URL is not already in list
-                    if url not in all_product_urls:
-                        all_product_urls.append(url)
+                    canonical = canonicalize_url(url)
+                    # Only check that URL is not already in the frontier
+                    if canonical not in frontier:
+                        if self.crawl_state and not self.crawl_state.needs_crawl(self.name, canonical, lastmods.get(url), self.max_age):
+                            skipped_unchanged += 1
+                            continue
+                        frontier.add(canonical)
+                        added += 1
                 
-                print(f"Added {len([u for u in urls if u not in all_product_urls[:len(all_product_urls)-len(urls)]])} new URLs from this sitemap")
+                print(f"Added {added} new URLs from this sitemap")
             else:
                 print("Failed to get XML content")
-            
-            # Decent delay
-            time.sleep(random.uniform(2, 4))
 
+        all_product_urls = list(frontier)
+        
         # Print first few URLs for verification
         print(f"\nFirst 10 collected URLs:")
         for i, url in enumerate(all_product_urls[:10]):
             print(f"  {i+1}: {url}")
             
         print(f"\nTotal collected product URLs: {len(all_product_urls)}")
+        if self.crawl_state:
+            print(f"Skipped unchanged products (incremental): {skipped_unchanged}")
         return all_product_urls
 
     def check_connection(self):
-        try:
-            # Try multiple endpoints
-            endpoints = [
-                "https://www.tehnomanija.rs",
-                "https://google.com",
-                "https://www.cloudflare.com"
-            ]
-            
-            for endpoint in endpoints:
-                try:
-                    response = requests.get(endpoint, timeout=5)
-                    if response.status_code in [200, 301, 302]:
-                        print(f"Connection OK via {endpoint}")
-                        return True
-                except:
-                    continue
-            
-            print("All connection tests failed")
-            return False
-        except:
-            return False
+        """Probe connectivity right now (the monitor normally does this in the background)"""
+        return self.health.check_now()
 
     def ensure_driver_active(self):
         try:
@@ -395,194 +604,179 @@ class TehnomanijaSeleniumSpider:
         except NoSuchElementException:
             return None
 
-    def extract_product_details(self, product_url):
-        # Enhanced connection check
-        max_connection_retries = 3
-        for conn_attempt in range(max_connection_retries):
-            if self.check_connection():
-                break
-            else:
-                print(f"Connection attempt {conn_attempt + 1} failed, waiting 10 seconds...")
-                time.sleep(6)
+    def fetch_product_http(self, product_url):
+        """Fast path: extract the product from the served HTML without a browser"""
+        if not HAS_LXML:
+            return None
+        try:
+            self.throttle.wait(product_url)
+            start = time.monotonic()
+            response = self.session.get(product_url, timeout=15)
+            self.throttle.record(product_url, time.monotonic() - start, ok=response.status_code in (200, 404))
+            self.health.record_success()
+            if response.status_code != 200:
+                print(f"Fast path: HTTP {response.status_code}")
+                return None
+            return extract_product_html(response.content)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.throttle.record(product_url, 0, ok=False)
+            self.health.record_failure()
+            print(f"Fast path failed: {e}")
+            return None
+        except Exception as e:
+            print(f"Fast path failed: {e}")
+            return None
+
+    def extract_payload_selenium(self, product_url):
+        """Browser path: extract the product payload with Selenium"""
+        self.throttle.wait(product_url)
+        start = time.monotonic()
+        try:
+            self.driver.get(product_url)
+            
+            # Wait for page to load (the specification table is server-rendered)
+            WebDriverWait(self.driver, 20).until(
+                lambda driver: driver.execute_script("return document.readyState") == "complete"
+            )
+        except Exception:
+            self.throttle.record(product_url, time.monotonic() - start, ok=False)
+            raise
+        self.throttle.record(product_url, time.monotonic() - start)
+        
+        # Wait for the gallery frames, unless the page has no gallery at all
+        try:
+            WebDriverWait(self.driver, 5).until(
+                lambda driver: driver.execute_script(
+                    "return !!document.querySelector('.fotorama__stage__frame[href]')"
+                    " || !document.querySelector('[data-gallery-role=gallery-placeholder]')"
+                )
+            )
+        except TimeoutException:
+            print("Gallery not ready, continuing without waiting")
+        
+        # All product, spec and media fields in a single WebDriver round-trip
+        payload = payload_from_script(self.driver.execute_script(PRODUCT_PAYLOAD_SCRIPT))
+        print(f"Found {len(payload['specs'])} specification rows")
+        return payload
+
+    def save_product(self, product_url, payload):
+        """Turn an extracted payload into items and pass them to the pipelines"""
+        product = ProductItem()
+        
+        gtin = payload['gtin']
+        if not gtin:
+            # Fallback: extract from URL
+            gtin = product_url.split('/')[-1].split('-')[-1]
+            print(f"Using GTIN from URL: {gtin}")
         else:
-            print("No internet connection after multiple attempts, skipping...")
+            print(f"Found GTIN: {gtin}")
+        
+        product['providerkey'] = gtin
+        product['gtin'] = gtin
+        
+        # Extract product type from URL
+        try:
+            url_parts = product_url.replace('https://www.tehnomanija.rs/', '').split('/')
+            product_type = '/'.join(url_parts[:-1])
+            product['productType'] = product_type
+            print(f"Product type: {product_type}")
+        except:
+            pass
+        
+        if payload['title']:
+            product['title'] = payload['title']
+            print(f"Title: {payload['title'][:50]}...")
+        if payload['brand']:
+            product['brand'] = payload['brand']
+            print(f"Brand: {payload['brand']}")
+        if payload['price']:
+            product['price'] = payload['price']
+            print(f"Price: {payload['price']}")
+        if payload['longdescription']:
+            product['longdescription'] = payload['longdescription']
+            print(f"Description: {payload['longdescription'][:100]}...")
+        
+        # Save product
+        self.product_pipeline.process_item(product, self)
+        if self.price_pipeline:
+            self.price_pipeline.process_item(product, self)
+        
+        for key, value in payload['specs']:
+            spec_item = SpecItem()
+            spec_item['providerKey'] = gtin
+            spec_item['SpecificationKey'] = key
+            spec_item['SpecificationValue'] = value
+            self.spec_pipeline.process_item(spec_item, self)
+        print(f"Found {len(payload['specs'])} specs")
+        
+        print(f"Found {len(payload['images'])} images")
+        if payload['images']:
+            media_item = MediaItem()
+            media_item['providerKey'] = gtin
+            media_item['gtin'] = gtin
+            
+            for i, image_url in enumerate(payload['images'][:10], start=1):
+                media_item[f'imageurl_{i}'] = image_url
+                print(f'  Image {i}: {image_url[:60]}...')
+            
+            self.media_pipeline.process_item(media_item, self)
+            print(f"Saved {min(len(payload['images']), 10)} images")
+
+    def extract_product_details(self, product_url):
+        # Cached connectivity status, only blocks while the circuit breaker is open
+        if not self.health.wait_until_up(timeout=self.network_wait):
+            print(f"No internet connection for {self.network_wait}s, skipping...")
             return False
 
         print(f"Processing: {product_url}")
         
+        # Fast path: plain HTTP + lxml, the browser is only needed if required fields are missing
+        if self.fast_path:
+            payload = self.fetch_product_http(product_url)
+            if payload and is_complete(payload):
+                self.save_product(product_url, payload)
+                self.fast_path_count += 1
+                print("✓ Product successfully processed (fast path)")
+                return True
+            missing = [field for field in REQUIRED_FIELDS if not (payload or {}).get(field)]
+            print(f"Fast path incomplete (missing: {', '.join(missing)}), using browser...")
+        
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                self.driver.get(product_url)
-                
-                # Wait for page to load
-                WebDriverWait(self.driver, 20).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-                
-                # Additional wait for dynamic content
-                time.sleep(2)
-                
-                product = ProductItem()
-                gtin = None
-                
-                # Extract GTIN
-                gtin = self.safe_find_element('div.loadbeeTabContent', 'data-loadbee-gtin')
-                if not gtin:
-                    # Fallback: extract from URL
-                    gtin = product_url.split('/')[-1].split('-')[-1]
-                    print(f"Using GTIN from URL: {gtin}")
-                else:
-                    print(f"Found GTIN: {gtin}")
-                
-                product['providerkey'] = gtin
-                product['gtin'] = gtin
-                
-                # Extract product type from URL
-                try:
-                    url_parts = product_url.replace('https://www.tehnomanija.rs/', '').split('/')
-                    product_type = '/'.join(url_parts[:-1])
-                    product['productType'] = product_type
-                    print(f"Product type: {product_type}")
-                except:
-                    pass
-                
-                # Extract title
-                title = self.safe_find_element('h1.page-title span')
-                if not title:
-                    title = self.safe_find_element('h1.page-title')
-                if title:
-                    product['title'] = title
-                    print(f"Title: {title[:50]}...")
-                
-                # Extract brand from scripts
-                try:
-                    scripts = self.driver.find_elements(By.TAG_NAME, 'script')
-                    for script in scripts:
-                        script_content = script.get_attribute('innerHTML') or ""
-                        if '"brand":"' in script_content:
-                            brand_start = script_content.find('"brand":"') + len('"brand":"')
-                            brand_end = script_content.find('"', brand_start)
-                            if brand_end > brand_start:
-                                brand = script_content[brand_start:brand_end]
-                                product['brand'] = brand
-                                print(f"Brand: {brand}")
-                                break
-                except Exception as e:
-                    print(f"Error extracting brand: {e}")
-                
-                # PRICE FIX - new selector
-                try:
-                    price_elements = self.driver.find_elements(By.CSS_SELECTOR, 'span[data-price-type="finalPrice"] > span')
-                    if price_elements:
-                        # Take first element
-                        price_text = price_elements[0].text.strip()
-                        # Remove 'RSD' from string
-                        price = price_text.replace('RSD', '').strip()
-                        product['price'] = price
-                        print(f"Price: {price}")
-                    else:
-                        # Fallback to old selector
-                        price = self.safe_find_element('meta[property="product:price:amount"]', 'content')
-                        if price:
-                            product['price'] = price
-                            print(f"Price (fallback): {price}")
-                except Exception as e:
-                    print(f"Error extracting price: {e}")
-                
-                # DESCRIPTION FIX - existing selector is already good
-                description = self.safe_find_element('meta[property="og:description"]', 'content')
-                if description:
-                    product['longdescription'] = description
-                    print(f"Description: {description[:100]}...")
-                
-                # Save product
-                self.product_pipeline.process_item(product, self)
-                
-                # Extract specifications
-                try:
-                    WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, '#product-attribute-specs-table'))
-                    )
-                    
-                    spec_rows = self.driver.find_elements(By.CSS_SELECTOR, '#product-attribute-specs-table tbody tr td ul li')
-                    print(f"Found {len(spec_rows)} specification rows")
-                    
-                    for spec_row in spec_rows:
-                        try:
-                            spans = spec_row.find_elements(By.TAG_NAME, 'span')
-                            if len(spans) >= 2:
-                                key = spans[0].text.strip()
-                                value = spans[-1].text.strip()
-                                
-                                if key and value and key != value:
-                                    spec_item = SpecItem()
-                                    spec_item['providerKey'] = gtin
-                                    spec_item['SpecificationKey'] = key
-                                    spec_item['SpecificationValue'] = value
-                                    self.spec_pipeline.process_item(spec_item, self)
-                                    print(f'  Spec: {key} = {value}')
-                        except Exception as e:
-                            continue
-                            
-                except Exception as e:
-                    print(f"No specifications found: {e}")
-                
-                # Extract images - FIXED SELECTOR
-                try:
-                    time.sleep(1)  # Wait for images to load
-                    
-                    # New selector for href attributes from fotorama frames
-                    frame_elements = self.driver.find_elements(By.CSS_SELECTOR, '.fotorama__stage__frame[href]')
-                    print(f"Found {len(frame_elements)} images")
-                    
-                    if frame_elements:
-                        media_item = MediaItem()
-                        media_item['providerKey'] = gtin
-                        media_item['gtin'] = gtin
-                        
-                        image_count = 0
-                        for i, frame_element in enumerate(frame_elements[:10], start=1):
-                            try:
-                                # Get href attribute containing image URL
-                                image_url = frame_element.get_attribute('href')
-                                if image_url and 'data:' not in image_url:  # Skip base64 images
-                                    media_item[f'imageurl_{i}'] = image_url.strip()
-                                    image_count += 1
-                                    print(f'  Image {i}: {image_url[:60]}...')
-                            except Exception as e:
-                                continue
-                        
-                        if image_count > 0:
-                            self.media_pipeline.process_item(media_item, self)
-                            print(f"Saved {image_count} images")
-                            
-                except Exception as e:
-                    print(f"Error extracting images: {e}")
-                
+                payload = self.extract_payload_selenium(product_url)
+                self.health.record_success()
+                self.save_product(product_url, payload)
+                self.browser_path_count += 1
                 print("✓ Product successfully processed")
                 return True
                 
             except Exception as e:
+                if isinstance(e, (TimeoutException, WebDriverException)):
+                    self.health.record_failure()
                 print(f"Attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
                     print("Retrying...")
                     self.init_driver()
-                    time.sleep(5)
+                    self.health.wait_until_up(timeout=self.network_wait)
                 else:
                     print("Maximum attempts exceeded")
                     return False
 
     def run(self):
         try:
-            # Get product URLs from XML sitemaps
-            product_urls = self.get_all_product_urls(limit=50)  # Increased limit for testing
+            # Get product URLs from XML sitemaps (or the frontier file on --resume)
+            product_urls = self.collect_product_urls()
             print(f"Total products to process: {len(product_urls)}")
             
             if not product_urls:
                 print("No URLs found. Exiting.")
                 return
             
+            if self.workers > 1:
+                self.run_pool(product_urls)
+                return
+            
             successful_count = 0
             failed_count = 0
             
@@ -597,6 +791,10 @@ class TehnomanijaSeleniumSpider:
                     
                     if success:
                         successful_count += 1
+                        if self.crawl_state:
+                            self.crawl_state.mark_crawled(self.name, url)
+                        if self.journal.mark_done(url):
+                            self.journal.checkpoint(self.pipelines())
                     else:
                         failed_count += 1
                     
@@ -609,12 +807,12 @@ class TehnomanijaSeleniumSpider:
                         print(f"Successful: {successful_count}")
                         print(f"Failed: {failed_count}")
                         print(f"Success rate: {success_rate:.1f}%")
-                    
-                    # Delay between products
-                    time.sleep(random.uniform(2, 4))
+                        print(f"Fast path: {self.fast_path_count}, Browser path: {self.browser_path_count}")
+                        print(f"Time spent throttling: {self.throttle.total_wait:.1f}s")
                     
                 except KeyboardInterrupt:
                     print("\nInterrupted by user")
+                    self.interrupted = True
                     break
                 except Exception as e:
                     failed_count += 1
@@ -624,16 +822,81 @@ class TehnomanijaSeleniumSpider:
         except Exception as e:
             print(f"Error during execution: {e}")
         finally:
+            if self.workers == 1:
+                print(f"\nProducts via fast path: {self.fast_path_count}, via browser: {self.browser_path_count}")
+                print(f"Time spent throttling: {self.throttle.total_wait:.1f}s")
             self.cleanup()
 
+    def run_pool(self, product_urls, shard_size=10):
+        """Process product_urls with a pool of Chrome worker processes"""
+        print(f"Starting pool with {self.workers} Chrome workers...")
+        
+        # Sitemaps are done, the workers and the writer have their own browsers / state connections
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+        if self.crawl_state:
+            self.crawl_state.close()
+            self.crawl_state = None
+            state_db = self.state_db
+        else:
+            state_db = None
+        
+        ctx = multiprocessing.get_context('spawn')
+        url_queue = ctx.Queue()
+        result_queue = ctx.Queue()
+        
+        # Shards of URLs keep queue traffic low, idle workers just take the next shard
+        for start in range(0, len(product_urls), shard_size):
+            url_queue.put(product_urls[start:start + shard_size])
+        for _ in range(self.workers):
+            url_queue.put(None)
+        
+        offsets = self.journal.offsets if self.resume else {}
+        writer = ctx.Process(
+            target=pool_writer,
+            args=(result_queue, len(product_urls), self.workers, state_db, self.name, self.journal.path, self.journal.every, offsets,
+                  self.price_history_db, self.resume, self.spec_catalog, self.writer_options),
+        )
+        writer.start()
+        workers = [
+            ctx.Process(target=pool_worker, args=(worker_id, url_queue, result_queue, self.fast_path, self.health.endpoints))
+            for worker_id in range(self.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            print("\nInterrupted by user, stopping workers...")
+            for worker in workers:
+                worker.terminate()
+            result_queue.put(('abort',))
+        writer.join()
+
     def cleanup(self):
         print("\nCleaning up...")
         try:
-            self.product_pipeline.close_spider(self)
-            self.spec_pipeline.close_spider(self)
-            self.media_pipeline.close_spider(self)
+            if self.workers == 1:
+                # Last checkpoint, so an interrupted run resumes exactly here
+                if self.journal and self.journal.pending:
+                    self.journal.checkpoint(self.pipelines())
+                self.product_pipeline.close_spider(self)
+                self.spec_pipeline.close_spider(self)
+                self.media_pipeline.close_spider(self)
+                if self.catalog:
+                    self.catalog.close_spider(self)
+                if self.price_pipeline:
+                    self.price_pipeline.close_spider(self, finished=not self.interrupted)
         except Exception as e:
             print(f"Error closing pipelines: {e}")
+        
+        if self.crawl_state:
+            self.crawl_state.close()
+        self.frontier.close()
+        self.health.stop()
             
         try:
             if self.driver:
@@ -642,13 +905,169 @@ class TehnomanijaSeleniumSpider:
         except Exception as e:
             print(f"Error closing driver: {e}")
 
+def pool_worker(worker_id, url_queue, result_queue, fast_path, health_endpoints):
+    """Worker process: own headless Chrome, pulls URL shards until it gets None"""
+    spider = None
+    throttle_wait = 0.0
+    try:
+        spider = TehnomanijaSeleniumSpider(fast_path=fast_path, result_queue=result_queue, health_endpoints=health_endpoints)
+        while True:
+            shard = url_queue.get()
+            if shard is None:
+                break
+            for url in shard:
+                fast_before = spider.fast_path_count
+                try:
+                    if not spider.ensure_driver_active():
+                        print(f"[worker {worker_id}] Driver reinitialized")
+                    success = spider.extract_product_details(url)
+                except Exception as e:
+                    print(f"[worker {worker_id}] Error processing URL {url}: {e}")
+                    success = False
+                path = 'fast' if spider.fast_path_count > fast_before else 'browser'
+                result_queue.put(('done', worker_id, url, bool(success), path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if spider:
+            spider.health.stop()
+            throttle_wait = spider.throttle.total_wait
+        if spider and spider.driver:
+            try:
+                spider.driver.quit()
+            except Exception:
+                pass
+        result_queue.put(('exit', worker_id, throttle_wait))
+
+def pool_writer(result_queue, total, workers, state_db, spider_name, journal_path, checkpoint_every, offsets,
+                price_history_db, resume, spec_catalog=False, writer_options=None):
+    """Writer process: owns the CSV pipelines and aggregates progress of all workers"""
+    writer_options = writer_options or {}
+    catalog = TehnomanijaSeleniumSpider.create_catalog(spider_name, spec_catalog, writer_options)
+    product_pipeline = CSVPipeline(f'{spider_name}_master.csv', ProductItem, **writer_options)
+    spec_pipeline = CSVPipeline(f'{spider_name}_spec.csv', SpecItem, catalog=catalog, **writer_options)
+    media_pipeline = CSVPipeline(f'{spider_name}_media.csv', MediaItem, **writer_options)
+    pipelines = {
+        'ProductItem': product_pipeline,
+        'SpecItem': spec_pipeline,
+        'MediaItem': media_pipeline,
+    }
+    # Outputs that take part in checkpoints
+    outputs = list(pipelines.values()) + ([catalog] if catalog else [])
+    for pipeline in outputs:
+        pipeline.open_spider(None, resume_offset=offsets.get(pipeline.filename))
+    crawl_state = CrawlStateStore(state_db) if state_db else None
+    # Items of a URL always arrive before its 'done' message (same worker, same queue)
+    journal = CheckpointJournal(journal_path, every=checkpoint_every)
+    price_pipeline = PriceHistoryPipeline(price_history_db, spider_name, resume=resume) if price_history_db else None
+    aborted = False
+    
+    successful_count = 0
+    failed_count = 0
+    path_counts = {'fast': 0, 'browser': 0}
+    throttle_wait = 0.0
+    running = workers
+    try:
+        while running:
+            try:
+                message = result_queue.get(timeout=60)
+            except queue.Empty:
+                continue
+            
+            if message[0] == 'item':
+                _, kind, row = message
+                item = ITEM_CLASSES[kind].from_row(row)
+                pipelines[kind].process_item(item, None)
+                if price_pipeline and kind == 'ProductItem':
+                    price_pipeline.process_item(item, None)
+            elif message[0] == 'done':
+                _, worker_id, url, success, path = message
+                if success:
+                    successful_count += 1
+                    path_counts[path] += 1
+                    if crawl_state:
+                        crawl_state.mark_crawled(spider_name, url)
+                    if journal.mark_done(url):
+                        journal.checkpoint(outputs)
+                else:
+                    failed_count += 1
+                
+                # Progress report every 10 items
+                processed = successful_count + failed_count
+                if processed % 10 == 0:
+                    success_rate = (successful_count / processed) * 100
+                    print(f"\n=== Progress Report ===")
+                    print(f"Processed: {processed}/{total}")
+                    print(f"Successful: {successful_count}")
+                    print(f"Failed: {failed_count}")
+                    print(f"Success rate: {success_rate:.1f}%")
+                    print(f"Fast path: {path_counts['fast']}, Browser path: {path_counts['browser']}")
+            elif message[0] == 'exit':
+                running -= 1
+                throttle_wait += message[2]
+            elif message[0] == 'abort':
+                aborted = True
+                break
+    except KeyboardInterrupt:
+        aborted = True
+    finally:
+        print(f"\nPool finished. Successful: {successful_count}, Failed: {failed_count}")
+        print(f"Products via fast path: {path_counts['fast']}, via browser: {path_counts['browser']}")
+        print(f"Time spent throttling (all workers): {throttle_wait:.1f}s")
+        if journal.pending:
+            journal.checkpoint(outputs)
+        for pipeline in outputs:
+            pipeline.close_spider(None)
+        if price_pipeline:
+            price_pipeline.close_spider(None, finished=not aborted)
+        if crawl_state:
+            crawl_state.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tehnomanija XML Sitemap Spider")
+    parser.add_argument('--incremental', action='store_true', help="only crawl new or changed products (sitemap <lastmod>)")
+    parser.add_argument('--state-db', default='crawl_state.sqlite3', help="crawl state database for --incremental")
+    parser.add_argument('--max-age-days', type=float, default=None, help="re-crawl unchanged products older than this")
+    parser.add_argument('--no-fast-path', action='store_true', help="always extract products with Selenium")
+    parser.add_argument('--workers', type=int, default=1, help="number of Chrome worker processes")
+    parser.add_argument('--frontier-file', default=None, help="persist collected product URLs to this file")
+    parser.add_argument('--health-endpoint', action='append', default=None, help="connectivity check URL (repeatable)")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run from its last checkpoint")
+    parser.add_argument('--checkpoint-file', default=None, help="checkpoint journal (default: tehnomanija_checkpoint.jsonl)")
+    parser.add_argument('--checkpoint-every', type=int, default=25, help="products between checkpoints")
+    parser.add_argument('--price-history-db', default=None, help="record prices in this price history database (e.g. price_history.sqlite3)")
+    parser.add_argument('--spec-catalog', action='store_true', help="also write the integer-coded spec catalogue")
+    parser.add_argument('--write-batch-size', type=int, default=500, help="CSV rows buffered per batch write")
+    parser.add_argument('--flush-interval', type=float, default=5.0, help="seconds before buffered CSV rows are written anyway")
+    parser.add_argument('--no-fsync', action='store_true', help="don't fsync output files at checkpoints (faster, less crash-safe)")
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default=None, help="write compressed CSV files (.csv.gz / .csv.zst)")
+    parser.add_argument('--compression-level', type=int, default=None, help="compression level (default: gzip 6, zstd 3)")
+    args = parser.parse_args()
+
     print("Starting Tehnomanija XML Sitemap Spider...")
     print("Using multiple XML parsing methods for maximum compatibility")
     print("=" * 60)
     
     try:
-        scraper = TehnomanijaSeleniumSpider()
+        scraper = TehnomanijaSeleniumSpider(
+            incremental=args.incremental,
+            state_db=args.state_db,
+            max_age_days=args.max_age_days,
+            fast_path=not args.no_fast_path,
+            workers=max(1, args.workers),
+            frontier_file=args.frontier_file,
+            health_endpoints=args.health_endpoint or DEFAULT_ENDPOINTS,
+            resume=args.resume,
+            checkpoint_file=args.checkpoint_file,
+            checkpoint_every=max(1, args.checkpoint_every),
+            price_history_db=args.price_history_db,
+            spec_catalog=args.spec_catalog,
+            write_batch_size=max(1, args.write_batch_size),
+            flush_interval=args.flush_interval,
+            fsync_checkpoints=not args.no_fsync,
+            compression=args.compression,
+            compression_level=args.compression_level,
+        )
         scraper.run()
     except KeyboardInterrupt:
         print("\nScript interrupted by user")
@@ -0,0 +1,165 @@
+# Browserless extraction for Tehnomanija product pages.
+#
+# Product data (GTIN, title, brand, price, specifications and the gallery
+# images) is already present in the HTML served by the shop, so most pages
+# can be parsed with lxml from a plain HTTP response. The spider falls back
+# to Selenium only if one of the REQUIRED_FIELDS is missing.
+
+import json
+import re
+
+try:
+    from lxml import html as lxml_html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+REQUIRED_FIELDS = ('gtin', 'title', 'price')
+
+BRAND_PATTERN = re.compile(r'"brand":"([^"]+)"')
+
+
+# Selenium path: collects the whole payload in one execute_script round-trip
+# instead of a find_element / .text / get_attribute call per field, spec and image.
+PRODUCT_PAYLOAD_SCRIPT = r"""
+const text = (el) => el ? (el.innerText || el.textContent || '').trim() : '';
+const attr = (selector, name) => {
+    const el = document.querySelector(selector);
+    return el && el.getAttribute(name) ? el.getAttribute(name).trim() : null;
+};
+
+let brand = null;
+for (const script of document.scripts) {
+    const match = script.innerHTML.match(/"brand":"([^"]+)"/);
+    if (match) { brand = match[1]; break; }
+}
+
+let price = null;
+const priceElement = document.querySelector('span[data-price-type="finalPrice"] > span');
+if (priceElement) {
+    price = text(priceElement).replace('RSD', '').trim();
+} else {
+    price = attr('meta[property="product:price:amount"]', 'content');
+}
+
+const specs = [];
+for (const row of document.querySelectorAll('#product-attribute-specs-table tbody tr td ul li')) {
+    const spans = row.querySelectorAll('span');
+    if (spans.length >= 2) {
+        const key = text(spans[0]);
+        const value = text(spans[spans.length - 1]);
+        if (key && value && key !== value) specs.push([key, value]);
+    }
+}
+
+const images = [];
+for (const frame of document.querySelectorAll('.fotorama__stage__frame[href]')) {
+    const href = (frame.getAttribute('href') || '').trim();
+    if (href && !href.includes('data:')) images.push(href);
+}
+
+return {
+    gtin: attr('div.loadbeeTabContent', 'data-loadbee-gtin'),
+    title: text(document.querySelector('h1.page-title span')) || text(document.querySelector('h1.page-title')) || null,
+    brand: brand,
+    price: price,
+    longdescription: attr('meta[property="og:description"]', 'content'),
+    specs: specs,
+    images: images,
+};
+"""
+
+
+def new_payload():
+    """Empty product payload shared by the HTTP and Selenium extraction paths"""
+    return {
+        'gtin': None,
+        'title': None,
+        'brand': None,
+        'price': None,
+        'longdescription': None,
+        'specs': [],
+        'images': [],
+    }
+
+
+def payload_from_script(result):
+    """Normalise the execute_script result into a payload"""
+    payload = new_payload()
+    payload.update({key: value for key, value in (result or {}).items() if key in payload})
+    payload['specs'] = [tuple(spec) for spec in payload['specs'] or []]
+    payload['images'] = list(payload['images'] or [])
+    return payload
+
+
+def is_complete(payload):
+    return all(payload.get(field) for field in REQUIRED_FIELDS)
+
+
+def _first_text(root, xpath):
+    for element in root.xpath(xpath):
+        text = element.text_content().strip()
+        if text:
+            return text
+    return None
+
+
+def _first_attr(root, xpath):
+    values = root.xpath(xpath)
+    return values[0].strip() if values and values[0].strip() else None
+
+
+def _gallery_images(root):
+    """Image URLs from the Magento gallery config (fotorama frames are built by JS)"""
+    for script in root.xpath('//script[@type="text/x-magento-init"]/text()'):
+        if 'mage/gallery/gallery' not in script:
+            continue
+        try:
+            config = json.loads(script)
+        except ValueError:
+            continue
+        for widget in config.values():
+            gallery = widget.get('mage/gallery/gallery') if isinstance(widget, dict) else None
+            if gallery and gallery.get('data'):
+                return [image.get('full') or image.get('img') for image in gallery['data'] if image.get('full') or image.get('img')]
+    return []
+
+
+def extract_product_html(page_html):
+    """Extract the product payload from the served HTML of a product page"""
+    payload = new_payload()
+    root = lxml_html.fromstring(page_html)
+
+    payload['gtin'] = _first_attr(root, '//div[contains(@class, "loadbeeTabContent")]/@data-loadbee-gtin')
+
+    payload['title'] = (
+        _first_text(root, '//h1[contains(@class, "page-title")]//span')
+        or _first_text(root, '//h1[contains(@class, "page-title")]')
+    )
+
+    for script in root.xpath('//script/text()'):
+        match = BRAND_PATTERN.search(script)
+        if match:
+            payload['brand'] = match.group(1)
+            break
+
+    price_text = _first_text(root, '//span[@data-price-type="finalPrice"]/span')
+    if price_text:
+        payload['price'] = price_text.replace('RSD', '').strip()
+    else:
+        payload['price'] = _first_attr(root, '//meta[@property="product:price:amount"]/@content')
+
+    payload['longdescription'] = _first_attr(root, '//meta[@property="og:description"]/@content')
+
+    for spec_row in root.xpath('//*[@id="product-attribute-specs-table"]//tbody/tr/td/ul/li'):
+        spans = spec_row.xpath('.//span')
+        if len(spans) >= 2:
+            key = spans[0].text_content().strip()
+            value = spans[-1].text_content().strip()
+            if key and value and key != value:
+                payload['specs'].append((key, value))
+
+    images = root.xpath('//*[contains(@class, "fotorama__stage__frame")]/@href') or _gallery_images(root)
+    payload['images'] = [url.strip() for url in images if url and 'data:' not in url]
+
+    return payload
@@ -0,0 +1,79 @@
+# Latency-adaptive throttle for the Selenium spider.
+#
+# Works like Scrapy's AutoThrottle extension (enabled for the Scrapy spider in
+# settings.py, whose AUTOTHROTTLE_* values are reused as defaults here): the
+# latency delay per domain moves towards latency / target_concurrency and
+# never drops after an error or non-200 response. Each domain also keeps a
+# decayed error rate (recent responses weigh more), and its delay is the
+# latency delay scaled by 2 ** (ERROR_BACKOFF * error rate): a domain that
+# keeps failing backs off towards max_delay, one error among many successes
+# barely matters, and errors on one domain never slow down another.
+
+import random
+import time
+from urllib.parse import urlsplit
+
+from project_nonproxy import settings
+
+ERROR_DECAY = 0.3    # weight of the newest response in the error rate
+ERROR_BACKOFF = 4.0  # delay multiplier is 2 ** (ERROR_BACKOFF * rate), up to 16x
+
+
+class AdaptiveThrottle:
+    def __init__(self, start_delay=None, min_delay=0.0, max_delay=None, target_concurrency=None, randomize=True):
+        self.start_delay = start_delay if start_delay is not None else getattr(settings, 'AUTOTHROTTLE_START_DELAY', 1.0)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, 'AUTOTHROTTLE_MAX_DELAY', 10.0)
+        self.target_concurrency = target_concurrency or getattr(settings, 'AUTOTHROTTLE_TARGET_CONCURRENCY', 1.0)
+        self.min_delay = min_delay
+        # Same as Scrapy's RANDOMIZE_DOWNLOAD_DELAY: 0.5x - 1.5x of the delay
+        self.randomize = randomize
+        self.delays = {}          # domain -> current delay
+        self.latency_delays = {}  # domain -> delay from latency alone
+        self.error_rates = {}     # domain -> decayed error rate (0..1)
+        self.errors = {}          # domain -> error count
+        self.responses = {}       # domain -> response count
+        self.last_request = {}
+        self.total_wait = 0.0
+
+    @staticmethod
+    def domain(url):
+        return urlsplit(url).hostname or ''
+
+    def delay_for(self, url):
+        return self.delays.get(self.domain(url), self.start_delay)
+
+    def wait(self, url):
+        """Sleep until the current delay for url's domain has passed since the last request"""
+        domain = self.domain(url)
+        delay = self.delays.get(domain, self.start_delay)
+        if self.randomize:
+            delay *= random.uniform(0.5, 1.5)
+        last = self.last_request.get(domain)
+        if last is not None:
+            remaining = last + delay - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+                self.total_wait += remaining
+        self.last_request[domain] = time.monotonic()
+
+    def record(self, url, latency, ok=True):
+        """Adjust the domain delay from an observed response latency (seconds)"""
+        domain = self.domain(url)
+        self.responses[domain] = self.responses.get(domain, 0) + 1
+        rate = self.error_rates.get(domain, 0.0) * (1 - ERROR_DECAY)
+        old_delay = self.latency_delays.get(domain, self.start_delay)
+        if not ok:
+            self.errors[domain] = self.errors.get(domain, 0) + 1
+            rate += ERROR_DECAY
+            # Failed responses say little about latency, keep the delay (at least the start delay)
+            latency_delay = max(old_delay, self.start_delay)
+        else:
+            target_delay = latency / self.target_concurrency
+            latency_delay = max(target_delay, (old_delay + target_delay) / 2.0)
+        self.error_rates[domain] = rate
+        self.latency_delays[domain] = latency_delay
+        new_delay = latency_delay * 2 ** (ERROR_BACKOFF * rate)
+        self.delays[domain] = min(self.max_delay, max(self.min_delay, new_delay))
+
+    def error_rate(self, url):
+        return self.error_rates.get(self.domain(url), 0.0)
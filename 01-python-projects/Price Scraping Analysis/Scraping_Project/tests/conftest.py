@@ -0,0 +1,5 @@
+# Tests run from Scraping_Project: python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy'))
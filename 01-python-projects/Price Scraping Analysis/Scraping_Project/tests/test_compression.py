@@ -0,0 +1,39 @@
+import logging
+
+import pytest
+from scrapy.settings import Settings
+
+from project_nonproxy import compression, settings as project_settings
+from project_nonproxy.compression import resolve_compression
+from project_nonproxy.pipelines import ProductPipeline
+
+
+class Spider:
+    name = 'gigatron'
+    logger = logging.getLogger('test')
+
+
+def test_codec_names():
+    assert resolve_compression('GZ') == 'gzip'
+    assert resolve_compression('none') is None
+    assert resolve_compression(None) is None
+    with pytest.raises(ValueError):
+        resolve_compression('lz4')
+
+
+def test_zstd_without_zstandard_is_an_error(monkeypatch):
+    monkeypatch.setattr(compression, 'HAS_ZSTD', False)
+    with pytest.raises(ValueError, match='zstandard'):
+        resolve_compression('zstd')
+    assert resolve_compression('gzip') == 'gzip'
+
+
+def test_pipeline_does_not_write_gzip_instead_of_zstd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(compression, 'HAS_ZSTD', False)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.set('OUTPUT_COMPRESSION', 'zstd')
+    with pytest.raises(ValueError):
+        ProductPipeline(settings).open_spider(Spider)
+    assert list(tmp_path.iterdir()) == []
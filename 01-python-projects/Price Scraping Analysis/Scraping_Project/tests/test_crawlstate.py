@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from project_nonproxy.crawlstate import CrawlStateStore
+
+URL = 'https://gigatron.rs/proizvod/1'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CrawlStateStore(str(tmp_path / 'crawl_state.sqlite3'))
+    yield store
+    store.close()
+
+
+def test_unchanged_lastmod_is_skipped(store):
+    assert store.needs_crawl('gigatron', URL, '2026-01-01')
+    store.mark_crawled('gigatron', URL)
+    assert not store.needs_crawl('gigatron', URL, '2026-01-01')
+    assert store.needs_crawl('gigatron', URL, '2026-02-01')
+
+
+def test_url_is_crawled_until_marked(store):
+    assert store.needs_crawl('gigatron', URL, '2026-01-01')
+    assert store.needs_crawl('gigatron', URL, '2026-01-01')
+
+
+def test_missing_lastmod_is_always_crawled(store):
+    store.needs_crawl('gigatron', URL)
+    store.mark_crawled('gigatron', URL)
+    assert store.needs_crawl('gigatron', URL)
+    assert store.needs_crawl('gigatron', URL, '')
+
+
+def test_max_age(store, monkeypatch):
+    for lastmod in ('2026-01-01', None):
+        url = f'{URL}-{lastmod}'
+        store.needs_crawl('gigatron', url, lastmod)
+        store.mark_crawled('gigatron', url)
+        assert not store.needs_crawl('gigatron', url, lastmod, max_age=3600)
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 7200)
+        assert store.needs_crawl('gigatron', url, lastmod, max_age=3600)
+        monkeypatch.undo()
@@ -0,0 +1,113 @@
+# The Selenium spider's CSVPipeline killed mid-crawl with fsync off, then
+# resumed from the journaled checkpoint offset. A killed process keeps what
+# it handed to the OS, so the page cache lost in a machine crash is emulated
+# by cutting the file back into the last checkpointed segment.
+import csv
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from project_nonproxy.compression import HAS_ZSTD, open_text
+from project_nonproxy.spiders.tehnomanija import CSVPipeline, ProductItem
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy')
+
+WRITER = '''
+import json
+import os
+import sys
+sys.path.insert(0, sys.argv[1])
+from project_nonproxy.spiders.tehnomanija import CSVPipeline, ProductItem
+
+def product(i):
+    return ProductItem(providerkey=str(i), title=f'TV {i}\\nline two "65"', price='1.000')
+
+pipeline = CSVPipeline('tehnomanija_master.csv', ProductItem, batch_size=1, fsync=False, compression=sys.argv[2] or None)
+pipeline.open_spider(None)
+offsets = []
+for batch in range(2):
+    for i in range(batch * 5, batch * 5 + 5):
+        pipeline.process_item(product(i), None)
+    offsets.append(pipeline.checkpoint())
+with open('offsets.tmp', 'w') as f:
+    json.dump(offsets, f)
+os.replace('offsets.tmp', 'offsets.json')
+i = 10
+while True:  # Killed in here, after the checkpoints
+    pipeline.process_item(product(i), None)
+    i += 1
+'''
+
+
+def product(i):
+    return ProductItem(providerkey=str(i), title=f'TV {i}\nline two "65"', price='1.000')
+
+
+def read_keys(path):
+    with open_text(path) as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows[0] == list(ProductItem.fields)
+    assert all(len(row) == len(ProductItem.fields) and row[5].endswith('line two "65"') for row in rows[1:])
+    return [int(row[0]) for row in rows[1:]]
+
+
+def kill_writer(tmp_path, compression):
+    process = subprocess.Popen([sys.executable, '-c', WRITER, os.path.abspath(PROJECT_DIR), compression or ''], cwd=tmp_path)
+    try:
+        deadline = time.monotonic() + 30
+        while not (tmp_path / 'offsets.json').exists():
+            assert process.poll() is None and time.monotonic() < deadline
+            time.sleep(0.05)
+        time.sleep(0.2)
+    finally:
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+    with open(tmp_path / 'offsets.json') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', pytest.param('zstd', marks=pytest.mark.skipif(not HAS_ZSTD, reason='zstandard'))])
+def test_resume_after_kill_drops_the_lost_tail(tmp_path, monkeypatch, compression):
+    monkeypatch.chdir(tmp_path)
+    first_checkpoint, checkpoint = kill_writer(tmp_path, compression)
+    filename = 'tehnomanija_master.csv' + {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+    assert os.path.getsize(filename) > checkpoint  # Rows after the checkpoint reached the OS
+
+    with open(filename, 'rb') as f:
+        data = f.read(checkpoint)
+    if compression:
+        cut = checkpoint - 7  # Inside the second member/frame
+        kept = list(range(5))
+    else:
+        cut = data.rindex(b'line two')  # Right after the quoted newline of the last row
+        kept = list(range(9))
+    with open(filename, 'r+b') as f:
+        f.truncate(cut)
+
+    pipeline = CSVPipeline('tehnomanija_master.csv', ProductItem, fsync=False, compression=compression)
+    pipeline.open_spider(None, resume_offset=checkpoint)
+    assert pipeline.count == len(kept)
+    if compression:
+        assert os.path.getsize(filename) == first_checkpoint
+    for i in range(12):  # The resumed crawl redoes everything after the checkpoint
+        pipeline.process_item(product(i), None)
+    pipeline.close_spider(None)
+
+    assert read_keys(filename) == list(range(12))
+    assert pipeline.duplicates == len(kept)
+
+
+def test_resume_with_nothing_complete_starts_over(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('tehnomanija_master.csv.gz', 'wb') as f:
+        f.write(b'\x1f\x8b\x08\x00')  # Torn header of the first member
+    pipeline = CSVPipeline('tehnomanija_master.csv', ProductItem, compression='gzip')
+    pipeline.open_spider(None, resume_offset=500)
+    pipeline.process_item(product(1), None)
+    pipeline.close_spider(None)
+    assert read_keys('tehnomanija_master.csv.gz') == [1]
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from project_nonproxy.dedup import FingerprintSet, row_fingerprint
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_nonproxy')
+
+
+def test_duplicate_rows_are_added_once():
+    seen = FingerprintSet()
+    assert seen.add(['1', 'TV', '1.000'])
+    assert not seen.add(['1', 'TV', '1.000'])
+    assert not seen.add(('1', 'TV', '1.000'))  # Same values, any sequence type
+    assert ['1', 'TV', '1.000'] in seen
+    assert len(seen) == 1
+
+
+def test_distinct_rows_are_kept():
+    seen = FingerprintSet()
+    rows = [
+        ['1', 'TV', '1.000'],
+        ['1', 'TV', '1.001'],
+        ['1', 'TV1', '.000'],  # Same characters, different field boundary
+        ['1', 'TV', '1.000', ''],
+        ['1', None, '1.000'],
+    ]
+    assert all(seen.add(row) for row in rows)
+    assert len(seen) == len(rows)
+    assert ['2', 'TV', '1.000'] not in seen
+    # None and the empty string write the same CSV cell
+    assert not seen.add(['1', '', '1.000'])
+
+
+def test_fingerprint_is_the_same_in_another_process():
+    # Unlike hash(), blake2b does not depend on PYTHONHASHSEED
+    row = ['8806094934126', 'Samsung televizor', 'Proizvođač']
+    script = f'import sys; sys.path.insert(0, {os.path.abspath(PROJECT_DIR)!r}); ' \
+             f'from project_nonproxy.dedup import row_fingerprint; print(row_fingerprint({row!r}))'
+    env = dict(os.environ, PYTHONHASHSEED='123')
+    output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True).stdout
+    assert int(output) == row_fingerprint(row)
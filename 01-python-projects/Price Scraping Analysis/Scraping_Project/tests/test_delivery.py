@@ -0,0 +1,211 @@
+# Uploads against a local paramiko SFTP server that serves a temp directory.
+import gzip
+import os
+import socket
+import threading
+
+import paramiko
+import pytest
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_OK
+
+from project_nonproxy import delivery
+from project_nonproxy.delivery import DeliveryState, HostKeyError, SFTPPool, Uploader
+
+CHUNK_MB = 64 / 1024  # 64 KiB chunks, a few pipelined writes each
+
+
+class Server(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if (username, password) == ('feed', 'secret') else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class Handle(SFTPHandle):
+    def write(self, offset, data):
+        site = self.site
+        if not self.transport.is_active():
+            return paramiko.sftp.SFTP_CONNECTION_LOST  # Pipelined writes still queued after the drop
+        site.writes.append((os.path.basename(self.filename), offset))
+        if len(site.writes) == site.drop_after_writes:
+            site.transport.close()  # Connection dropped in the middle of a chunk
+            return paramiko.sftp.SFTP_CONNECTION_LOST
+        return super().write(offset, data)
+
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class FolderSFTPServer(SFTPServerInterface):
+    def __init__(self, server, site):
+        super().__init__(server)
+        self.site = site
+
+    def path(self, path):
+        return os.path.join(self.site.root, self.canonicalize(path).lstrip('/'))
+
+    def open(self, path, flags, attr):
+        path = self.path(path)
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        mode = 'r+b' if flags & os.O_RDWR else 'wb' if flags & os.O_WRONLY else 'rb'
+        handle = Handle(flags)
+        handle.site = self.site
+        handle.transport = self.site.transport
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self.path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def chattr(self, path, attr):
+        if attr._flags & attr.FLAG_SIZE:
+            os.truncate(self.path(path), attr.st_size)
+        return SFTP_OK
+
+    def remove(self, path):
+        os.remove(self.path(path))
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        os.replace(self.path(oldpath), self.path(newpath))
+        return SFTP_OK
+
+
+class Site:
+    """SFTP server on 127.0.0.1 serving `root`"""
+
+    def __init__(self, root):
+        self.root = root
+        self.key = paramiko.ECDSAKey.generate()
+        self.writes = []  # (filename, offset) of every write request
+        self.drop_after_writes = None
+        self.transport = None
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            transport = self.transport = paramiko.Transport(sock)
+            transport.add_server_key(self.key)
+            transport.set_subsystem_handler('sftp', SFTPServer, FolderSFTPServer, self)
+            transport.start_server(server=Server())
+
+    def known_hosts(self, path, key=None):
+        host_keys = paramiko.HostKeys()
+        host_keys.add(f'[127.0.0.1]:{self.port}', self.key.get_name(), key or self.key)
+        host_keys.save(str(path))
+        return str(path)
+
+    def close(self):
+        self.listener.close()
+        if self.transport:
+            self.transport.close()
+
+
+@pytest.fixture
+def site(tmp_path):
+    remote = tmp_path / 'remote'
+    remote.mkdir()
+    site = Site(str(remote))
+    yield site
+    site.close()
+
+
+@pytest.fixture(autouse=True)
+def no_retry_sleep(monkeypatch, tmp_path):
+    monkeypatch.setattr(delivery.time, 'sleep', lambda seconds: None)
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))  # No real ~/.ssh/known_hosts
+
+
+def make_uploader(site, tmp_path, **pool_options):
+    if 'known_hosts' not in pool_options:
+        pool_options['known_hosts'] = site.known_hosts(tmp_path / 'known_hosts')
+    pool = SFTPPool('127.0.0.1', site.port, 'feed', 'secret', timeout=5, **pool_options)
+    return pool, Uploader(pool, DeliveryState(str(tmp_path / 'state.json')), chunk_mb=CHUNK_MB)
+
+
+@pytest.fixture
+def master_csv(tmp_path):
+    path = tmp_path / 'gigatron_scrapy_master.csv'
+    # Incompressible, so every 64 KiB chunk needs several 32 KiB writes
+    path.write_bytes(os.urandom(5 * 64 * 1024 + 1000))
+    return str(path)
+
+
+def test_chunked_upload_is_renamed_from_part(site, tmp_path, master_csv):
+    pool, uploader = make_uploader(site, tmp_path)
+    try:
+        assert uploader.upload_all([master_csv]) == {master_csv: 'uploaded'}
+        assert uploader.upload_all([master_csv]) == {master_csv: 'unchanged'}
+    finally:
+        pool.close()
+    assert os.listdir(site.root) == ['gigatron_scrapy_master.csv.gz']
+    assert {name for name, _ in site.writes} == {'gigatron_scrapy_master.csv.gz.part'}
+    with gzip.open(os.path.join(site.root, 'gigatron_scrapy_master.csv.gz')) as f:
+        assert f.read() == open(master_csv, 'rb').read()
+    assert DeliveryState(str(tmp_path / 'state.json')).get(master_csv)['chunks'] == 6
+
+
+def test_upload_resumes_after_a_dropped_connection(site, tmp_path, master_csv):
+    site.drop_after_writes = 8  # In the third chunk
+    pool, uploader = make_uploader(site, tmp_path)
+    try:
+        assert uploader.upload_all([master_csv]) == {master_csv: 'uploaded'}
+    finally:
+        pool.close()
+    with gzip.open(os.path.join(site.root, 'gigatron_scrapy_master.csv.gz')) as f:
+        assert f.read() == open(master_csv, 'rb').read()
+    assert not os.path.exists(os.path.join(site.root, 'gigatron_scrapy_master.csv.gz.part'))
+    # The retry continued after the two complete chunks instead of starting over
+    # The retry rewrote the third chunk from its start, chunks 1 and 2 were not sent again
+    offsets = [offset for _, offset in site.writes]
+    third_chunk = offsets[6]
+    assert offsets[7:9] == [offsets[7], third_chunk]
+    assert offsets.count(0) == 1 and offsets.count(third_chunk) == 2
+
+
+def test_unknown_host_key_is_refused(site, tmp_path, master_csv):
+    pool, uploader = make_uploader(site, tmp_path, known_hosts=None)  # ~/.ssh/known_hosts, missing
+    with pytest.raises(HostKeyError):
+        pool.acquire()
+    assert uploader.upload_all([master_csv]) == {master_csv: 'failed'}
+    assert os.listdir(site.root) == []
+
+
+def test_changed_host_key_is_refused(site, tmp_path):
+    known_hosts = site.known_hosts(tmp_path / 'known_hosts_old', key=paramiko.ECDSAKey.generate())
+    pool, _ = make_uploader(site, tmp_path, known_hosts=known_hosts)
+    with pytest.raises(HostKeyError, match='does not match'):
+        pool.acquire()
+
+
+def test_host_key_check_can_be_turned_off(site, tmp_path, master_csv, monkeypatch):
+    monkeypatch.setenv('SFTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('SFTP_SKIP_HOST_KEY_CHECK', '1')
+    assert delivery.sftp_config_from_env()['verify_host_key'] is False
+    pool, uploader = make_uploader(site, tmp_path, known_hosts=None, verify_host_key=False)
+    try:
+        assert uploader.upload_all([master_csv]) == {master_csv: 'uploaded'}
+    finally:
+        pool.close()
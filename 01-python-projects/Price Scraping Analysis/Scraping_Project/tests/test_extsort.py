@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from project_nonproxy import extsort
+from project_nonproxy.extsort import ExternalSorter, estimate_row_size
+
+
+def make_rows(count):
+    rng = random.Random(7)
+    # Duplicate keys check the merge keeps the stable order, the values need csv quoting
+    return [[str(rng.randrange(count // 4)), f'TV {i}; "65"\nline two', str(i)] for i in range(count)]
+
+
+def key(row):
+    return row[0]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_spilled_runs_merge_like_sorted(tmp_path, compression):
+    rows = make_rows(1000)
+    sorter = ExternalSorter(key, memory_budget=50 * estimate_row_size(rows[0]), temp_dir=str(tmp_path), compression=compression)
+    for row in rows:
+        sorter.add(row)
+    assert len(sorter.run_files) >= 10
+    assert list(tmp_path.iterdir())  # The runs are on disk
+    assert list(sorter.sorted_rows()) == sorted(rows, key=key)
+    assert sorter.count == len(rows)
+    sorter.cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_too_many_runs_are_merged_in_passes(tmp_path, monkeypatch):
+    monkeypatch.setattr(extsort, 'MAX_MERGE_FANIN', 4)
+    rows = make_rows(400)
+    sorter = ExternalSorter(key, memory_budget=1, temp_dir=str(tmp_path))  # One run per row
+    for row in rows:
+        sorter.add(row)
+    assert list(sorter.sorted_rows()) == sorted(rows, key=key)
+    assert len(sorter.run_files) <= 4
+    sorter.cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rows_within_the_budget_never_touch_the_disk(tmp_path):
+    rows = make_rows(100)
+    sorter = ExternalSorter(key, memory_budget=1024 * 1024, temp_dir=str(tmp_path))
+    for row in rows:
+        sorter.add(row)
+    assert list(sorter.sorted_rows()) == sorted(rows, key=key)
+    assert sorter.run_files == [] and list(tmp_path.iterdir()) == []
@@ -0,0 +1,243 @@
+# Gigatron crawls with conditional requests and incremental crawling against
+# a local copy of the benchmark pages. Each crawl runs in its own process
+# (the reactor can only be started once).
+import csv
+import json
+import os
+import subprocess
+import sys
+import threading
+import sqlite3
+from email.utils import formatdate
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.join(HERE, '..', 'project_nonproxy')
+FIXTURES = os.path.join(HERE, '..', 'benchmarks', 'fixtures', 'gigatron')
+
+CRAWL = '''
+import json
+import sys
+sys.path.insert(0, sys.argv[1])
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from project_nonproxy.spiders.gigatron import GigatronSpider
+from project_nonproxy.items import SpecItem
+from scrapy.exceptions import DropItem
+
+class LocalGigatronSpider(GigatronSpider):
+    custom_settings = {'DOWNLOAD_DELAY': 0, 'ROBOTSTXT_OBEY': False}
+
+class DropSpecs:
+    def process_item(self, item):
+        if isinstance(item, SpecItem):
+            raise DropItem('test')
+        return item
+
+settings = get_project_settings()
+settings.setdict({
+    'GIGATRON_JSON_LD_ONLY': sys.argv[3] == 'json-ld',
+    'CONDITIONAL_REQUESTS_ENABLED': True,
+    'INCREMENTAL_CRAWL': True,
+    'AUTOTHROTTLE_ENABLED': False,
+    'METRICS_ENABLED': False,
+    'LOG_LEVEL': 'CRITICAL',
+    **json.loads(sys.argv[4]),
+})
+process = CrawlerProcess(settings)
+crawler = process.create_crawler(LocalGigatronSpider)
+process.crawl(crawler, sitemap_urls=[sys.argv[2]])
+process.start()
+with open('stats.json', 'w') as f:
+    json.dump(crawler.stats.get_stats(), f, default=str)
+'''
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """/sitemap.xml lists every fixture page as /proizvod/<slug>"""
+    lastmods = {}  # slug -> <lastmod>, None leaves it out
+    validators = 'last-modified'  # Sent with the pages: 'last-modified', 'etag' or 'none'
+    etag_version = 1
+    conditional_headers = []  # (slug, If-None-Match, If-Modified-Since, status) per page request
+
+    def do_GET(self):
+        if self.path == '/sitemap.xml':
+            host = f'http://{self.headers["Host"]}'
+            urls = ''
+            for name in sorted(os.listdir(FIXTURES)):
+                lastmod = self.lastmods.get(name[:-5], '2026-01-01')
+                lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+                urls += f'<url><loc>{host}/proizvod/{name[:-5]}</loc>{lastmod}</url>'
+            body = f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.startswith('/proizvod/'):
+            self.send_page(self.path[len('/proizvod/'):])
+            return
+        super().do_GET()
+
+    def send_page(self, slug):
+        path = os.path.join(FIXTURES, f'{slug}.html')
+        headers = {}
+        if self.validators == 'etag':
+            headers['ETag'] = f'"{slug}-{self.etag_version}"'
+        elif self.validators == 'last-modified':
+            headers['Last-Modified'] = formatdate(os.path.getmtime(path), usegmt=True)
+        if_none_match, if_modified_since = self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')
+        not_modified = (if_none_match and if_none_match == headers.get('ETag')) or \
+                       (if_modified_since and if_modified_since == headers.get('Last-Modified'))
+        status = 304 if not_modified else 200
+        self.conditional_headers.append((slug, if_none_match, if_modified_since, status))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if not_modified:
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(monkeypatch):
+    monkeypatch.setattr(FixtureHandler, 'lastmods', {})
+    monkeypatch.setattr(FixtureHandler, 'conditional_headers', [])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/sitemap.xml'
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(tmp_path, sitemap_url, mode, **settings):
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE='project_nonproxy.settings')
+    subprocess.run([sys.executable, '-c', CRAWL, os.path.abspath(PROJECT_DIR), sitemap_url, mode, json.dumps(settings)],
+                   cwd=tmp_path, env=env, check=True, timeout=120)
+    outputs = {}
+    for suffix in ('master', 'spec', 'media'):
+        path = tmp_path / f'gigatron_scrapy_{suffix}.csv'
+        if path.exists():
+            with open(path, newline='', encoding='utf-8') as f:
+                outputs[suffix] = list(csv.DictReader(f, delimiter=';'))
+            path.unlink()
+    return outputs
+
+
+def test_json_ld_only_run_does_not_hide_pages_from_a_full_crawl(tmp_path, site):
+    refresh = crawl(tmp_path, site, 'json-ld')
+    assert len(refresh['master']) == 3
+    assert 'spec' not in refresh and 'media' not in refresh
+
+    full = crawl(tmp_path, site, 'full')
+    assert len(full['master']) == 3
+    assert {row['providerKey'] for row in full['spec']} == {row['providerkey'] for row in full['master']}
+    assert len(full['media']) == 3
+
+    # Only the full crawl marks pages as crawled, so now every page is skipped
+    assert crawl(tmp_path, site, 'full') == {}
+
+
+def providerkeys(outputs):
+    return sorted(row['providerkey'] for row in outputs.get('master', []))
+
+
+def test_incremental_run_only_outputs_changed_products(tmp_path, site):
+    full = crawl(tmp_path, site, 'full')
+    FixtureHandler.lastmods['samsung-televizor-qe65q80catxxh-1234567'] = '2026-02-01'
+    delta = crawl(tmp_path, site, 'full')
+    assert len(providerkeys(full)) == 3
+    assert len(providerkeys(delta)) == 1 and providerkeys(delta)[0] in providerkeys(full)
+
+
+def test_pages_without_lastmod_are_crawled_every_run(tmp_path, site):
+    FixtureHandler.lastmods.update(dict.fromkeys(name[:-5] for name in os.listdir(FIXTURES)))
+    assert len(providerkeys(crawl(tmp_path, site, 'full'))) == 3
+    assert len(providerkeys(crawl(tmp_path, site, 'full'))) == 3
+    # With a max age they are skipped until the last crawl gets too old
+    assert crawl(tmp_path, site, 'full', INCREMENTAL_MAX_AGE_DAYS=1) == {}
+
+
+def test_max_age_refreshes_unchanged_pages(tmp_path, site):
+    crawl(tmp_path, site, 'full')
+    assert len(providerkeys(crawl(tmp_path, site, 'full', INCREMENTAL_MAX_AGE_DAYS=1e-9))) == 3
+
+
+def test_pages_with_dropped_items_are_crawled_again(tmp_path, site):
+    pipelines = {'project_nonproxy.pipelines.ProductPipeline': 300, '__main__.DropSpecs': 310}
+    crawl(tmp_path, site, 'full', ITEM_PIPELINES=pipelines)
+    assert len(providerkeys(crawl(tmp_path, site, 'full'))) == 3
+
+
+def crawl_stats(tmp_path):
+    with open(tmp_path / 'stats.json') as f:
+        return json.load(f)
+
+
+def saved_validators(tmp_path):
+    with sqlite3.connect(tmp_path / 'http_validators.sqlite3') as conn:
+        rows = conn.execute("SELECT url, etag, last_modified, content_hash, items FROM http_validators").fetchall()
+    return {url.rsplit('/', 1)[1]: (etag, last_modified, content_hash, json.loads(items) if items else None)
+            for url, etag, last_modified, content_hash, items in rows}
+
+
+@pytest.mark.parametrize('validators, header', [('etag', 1), ('last-modified', 2)])
+def test_not_modified_pages_replay_the_cached_items(tmp_path, site, monkeypatch, validators, header):
+    monkeypatch.setattr(FixtureHandler, 'validators', validators)
+    first = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    saved = saved_validators(tmp_path)
+    assert len(saved) == 4  # The page without a GTIN has validators, but no items
+    assert sum(entry[3] is not None for entry in saved.values()) == 3
+    if validators == 'etag':
+        assert all(etag == f'"{slug}-1"' and last_modified is None for slug, (etag, last_modified, _, _) in saved.items())
+    assert 'conditional/not_modified' not in crawl_stats(tmp_path)
+
+    FixtureHandler.conditional_headers.clear()
+    second = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    sent = {request[0]: request[header] for request in FixtureHandler.conditional_headers}
+    # Conditional headers only for the pages whose items can be replayed
+    assert sorted(slug for slug, value in sent.items() if value) == sorted(slug for slug, entry in saved.items() if entry[3])
+    assert sum(status == 304 for *_, status in FixtureHandler.conditional_headers) == 3
+    assert crawl_stats(tmp_path)['conditional/not_modified'] == 3
+    assert second == first
+
+
+def test_unchanged_body_without_validators_replays_the_cached_items(tmp_path, site, monkeypatch):
+    monkeypatch.setattr(FixtureHandler, 'validators', 'none')
+    first = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    assert all(etag is None and last_modified is None and content_hash
+               for etag, last_modified, content_hash, _ in saved_validators(tmp_path).values())
+    second = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    assert all(if_none_match is None and if_modified_since is None
+               for _, if_none_match, if_modified_since, _ in FixtureHandler.conditional_headers)
+    assert crawl_stats(tmp_path)['conditional/same_content'] == 3
+    assert second == first
+
+
+def test_changed_etag_on_an_unchanged_page_is_saved(tmp_path, site, monkeypatch):
+    monkeypatch.setattr(FixtureHandler, 'validators', 'etag')
+    first = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    monkeypatch.setattr(FixtureHandler, 'etag_version', 2)
+    second = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    assert crawl_stats(tmp_path)['conditional/same_content'] == 3
+    saved = saved_validators(tmp_path)
+    assert all(etag == f'"{slug}-2"' for slug, (etag, *_) in saved.items() if saved[slug][3])
+    assert sum(entry[3] is not None for entry in saved.values()) == 3
+    # The new ETag is sent next time, so the server can answer 304 again
+    third = crawl(tmp_path, site, 'full', INCREMENTAL_CRAWL=False)
+    assert crawl_stats(tmp_path)['conditional/not_modified'] == 3
+    assert first == second == third
@@ -0,0 +1,56 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from project_nonproxy.health import ConnectivityMonitor
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_each_thread_gets_its_own_session(endpoint):
+    monitor = ConnectivityMonitor([endpoint], timeout=2)
+    sessions = []
+    results = []
+
+    def probe():
+        results.append(monitor.check_now())
+        sessions.append(monitor.session)
+
+    threads = [threading.Thread(target=probe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 4
+    assert len({id(session) for session in sessions}) == 4
+    assert monitor.session is monitor.session
+    monitor.stop()
+    assert monitor._sessions == []
+
+
+def test_failures_trip_the_circuit():
+    monitor = ConnectivityMonitor(['http://127.0.0.1:9/'], timeout=0.5)
+    assert monitor.check_now() is False
+    assert not monitor.is_up
+    assert monitor.wait_until_up(timeout=0.01) is False
+    monitor.stop()
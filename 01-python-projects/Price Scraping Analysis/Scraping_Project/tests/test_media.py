@@ -0,0 +1,42 @@
+import csv
+import logging
+
+from scrapy.settings import Settings
+
+from project_nonproxy import settings as project_settings
+from project_nonproxy.items import MediaItem
+from project_nonproxy.pipelines import MediaPipeline
+
+
+class Spider:
+    name = 'gigatron'
+    logger = logging.getLogger('test')
+
+
+def test_image_dedupe_filters_the_rows_not_the_items(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.set('MEDIA_DEDUPE_IMAGES', True)
+    pipeline = MediaPipeline(settings)
+    pipeline.open_spider(Spider())
+    items = [
+        MediaItem(providerKey='1', imageurl_1='http://x/logo.jpg', imageurl_2='http://x/1.jpg'),
+        MediaItem(providerKey='2', imageurl_1='http://x/logo.jpg', imageurl_2='http://x/2.jpg'),
+        MediaItem(providerKey='3', imageurl_1='http://x/logo.jpg'),  # Only images already written
+    ]
+    originals = [dict(item) for item in items]
+    for item in items:
+        assert pipeline.process_item(item, Spider()) is item
+    pipeline.close_spider(Spider())
+
+    # Later pipelines and the feed exports still get every image
+    assert [dict(item) for item in items] == originals
+    with open(pipeline.filename, newline='') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows == [
+        ['providerKey', 'imageurl_1', 'imageurl_2'],
+        ['1', 'http://x/logo.jpg', 'http://x/1.jpg'],
+        ['2', 'http://x/2.jpg', ''],
+    ]
+    assert pipeline.dropped_images == 2
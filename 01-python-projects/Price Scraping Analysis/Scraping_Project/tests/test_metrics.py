@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+from scrapy.settings import Settings
+
+from project_nonproxy import settings as project_settings
+from project_nonproxy.items import MediaItem, ProductItem, SpecItem
+from project_nonproxy.metrics import Histogram, Metrics
+from project_nonproxy.pipelines import BasePipeline, MediaPipeline, ProductPipeline, SpecPipeline
+
+
+def test_histogram_percentiles_stay_within_the_observed_range():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.observe(value / 1000)
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.05, rel=0.15)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.15)
+    assert 0.001 <= histogram.percentile(1) and histogram.percentile(100) <= 0.1
+    assert Histogram().percentile(50) is None
+
+
+def test_openmetrics_buckets_are_cumulative():
+    metrics = Metrics('gigatron')
+    metrics.inc('items', {'type': 'ProductItem'}, 3)
+    for value in (0.001, 0.01, 0.1):
+        metrics.observe('pipeline_seconds', value, {'type': 'ProductItem'})
+    text = metrics.to_openmetrics()
+    lines = text.splitlines()
+    assert 'scrapy_items_total{type="ProductItem"} 3' in lines
+    assert 'scrapy_pipeline_seconds_bucket{type="ProductItem",le="+Inf"} 3' in lines
+    assert 'scrapy_pipeline_seconds_count{type="ProductItem"} 3' in lines
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines if line.startswith('scrapy_pipeline_seconds_bucket')]
+    assert buckets == sorted(buckets)
+    assert text.endswith('# EOF\n')
+
+
+class Spider:
+    name = 'gigatron'
+    logger = logging.getLogger('test')
+
+
+def test_each_pipeline_is_timed_under_its_own_label(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    spider = Spider()
+    spider.metrics = Metrics(spider.name)
+    pipelines = [ProductPipeline(settings), SpecPipeline(settings), MediaPipeline(settings)]
+    for pipeline in pipelines:
+        pipeline.open_spider(spider)
+    items = [ProductItem(providerkey='1', title='TV'), SpecItem(providerKey='1', SpecificationKey='Boja'),
+             MediaItem(providerKey='1', imageurl_1='http://x/1.jpg')]
+    for item in items:
+        for pipeline in pipelines:
+            assert pipeline.process_item(item, spider) is item
+    for pipeline in pipelines:
+        pipeline.close_spider(spider)
+
+    series = spider.metrics.histograms['pipeline_seconds']
+    assert sorted(dict(labels)['pipeline'] for labels in series) == ['MediaPipeline', 'ProductPipeline', 'SpecPipeline']
+    assert all(histogram.count == len(items) for histogram in series.values())
+
+
+def test_pipeline_exceptions_are_counted_and_raised():
+    class FailingPipeline(BasePipeline):
+        def process_item(self, item, spider):
+            raise ValueError('bad item')
+
+    spider = Spider()
+    spider.metrics = Metrics(spider.name)
+    with pytest.raises(ValueError):
+        FailingPipeline(None).process_item(ProductItem(providerkey='1'), spider)
+    labels = {'pipeline': 'FailingPipeline'}
+    assert spider.metrics.histogram('pipeline_seconds', labels).count == 1
+    assert spider.metrics.counters['pipeline_exceptions'] == {(('exception', 'ValueError'), ('pipeline', 'FailingPipeline')): 1}
+
+
+def test_pipelines_run_untimed_without_metrics():
+    class Pipeline(BasePipeline):
+        def process_item(self, item, spider):
+            return item
+
+    item = ProductItem(providerkey='1')
+    assert Pipeline(None).process_item(item, Spider()) is item
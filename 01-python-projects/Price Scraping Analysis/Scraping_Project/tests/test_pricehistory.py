@@ -0,0 +1,42 @@
+import logging
+
+from scrapy.settings import Settings
+
+from project_nonproxy import settings as project_settings
+from project_nonproxy.items import ProductItem
+from project_nonproxy.pipelines import ProductPipeline
+from project_nonproxy.pricehistory import PriceHistoryStore
+
+
+class Spider:
+    name = 'gigatron'
+    logger = logging.getLogger('test')
+
+
+def crawl(settings, prices):
+    pipeline = ProductPipeline(settings)
+    pipeline.open_spider(Spider)
+    for gtin, price in prices:
+        pipeline.process_item(ProductItem(providerkey=gtin, gtin=gtin, title='TV', price=price), Spider)
+    pipeline.close_spider(Spider)
+
+
+def test_price_history_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    crawl(settings, [('1', '100')])
+    assert not any(path.suffix.startswith('.sqlite') for path in tmp_path.iterdir())
+
+
+def test_price_changes_are_recorded_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.set('PRICE_HISTORY_DB', 'history.sqlite3')
+    crawl(settings, [('1', '100'), ('2', '50')])
+    crawl(settings, [('1', '90'), ('2', '50')])
+    store = PriceHistoryStore('history.sqlite3')
+    changes = store.deltas('gigatron')
+    store.close()
+    assert [(change['gtin'], change['old_price'], change['new_price']) for change in changes] == [('1', 100, 90)]
@@ -0,0 +1,29 @@
+import sys
+
+import pytest
+
+from project_nonproxy.records import Record
+from project_nonproxy.spiders.tehnomanija import MediaItem, ProductItem, SpecItem
+
+
+@pytest.mark.parametrize('item_class', [ProductItem, SpecItem, MediaItem])
+def test_items_are_slotted(item_class):
+    item = item_class()
+    assert not hasattr(item, '__dict__')
+    with pytest.raises(AttributeError):
+        item.unknown_attribute = 'x'
+    assert sys.getsizeof(item) == sys.getsizeof(Record.__new__(Record))
+
+
+def test_subclass_without_slots_is_rejected():
+    with pytest.raises(TypeError):
+        class Unslotted(Record):
+            fields = ('a',)
+
+
+def test_row_round_trip():
+    item = SpecItem(providerKey='1', SpecificationKey='Boja', SpecificationValue='Crna')
+    assert SpecItem.from_row(item.to_row()) == item
+    assert item.get('missing', 'x') == 'x'
+    with pytest.raises(KeyError):
+        item['missing'] = 'x'
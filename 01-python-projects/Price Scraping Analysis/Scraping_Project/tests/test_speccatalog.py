@@ -0,0 +1,109 @@
+import csv
+import logging
+
+import pytest
+from scrapy.settings import Settings
+
+from project_nonproxy import settings as project_settings
+from project_nonproxy.compression import open_text
+from project_nonproxy.items import SpecItem
+from project_nonproxy.pipelines import SpecPipeline
+from project_nonproxy.speccatalog import SpecCatalog
+
+
+def read_rows(path):
+    with open_text(path) as f:
+        return list(csv.reader(f, delimiter=';'))
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_resume_from_checkpoint(tmp_path, compression):
+    basename = str(tmp_path / 'tehnomanija_spec')
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider()
+    catalog.add('1', 'Boja', 'Crna')
+    catalog.add('1', 'Težina', '2 kg')
+    offset = catalog.checkpoint()
+    catalog.add('2', 'Boja', 'Bela')  # After the checkpoint, redone on resume
+    catalog.checkpoint()
+    catalog.close_spider()
+
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider(resume_offset=offset)
+    assert catalog.count == 2
+    catalog.add('2', 'Boja', 'Bela')
+    catalog.close_spider()
+
+    assert catalog.filename.endswith({None: '.csv', 'gzip': '.csv.gz', 'zstd': '.csv.zst'}[compression])
+    assert read_rows(catalog.filename) == [['providerKey', 'key_id', 'value_id'], ['1', '0', '0'], ['1', '1', '1'], ['2', '0', '2']]
+    assert read_rows(catalog.keys_filename)[1:] == [['0', 'Boja'], ['1', 'Težina']]
+    assert read_rows(catalog.values_filename)[1:] == [['0', 'Crna'], ['1', '2 kg'], ['2', 'Bela']]
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_torn_compressed_dictionary_is_repaired(tmp_path, compression):
+    basename = str(tmp_path / 'spec')
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider()
+    catalog.add('1', 'Boja', 'Crna')
+    catalog.checkpoint()
+    catalog.add('1', 'Ekran', 'OLED')
+    catalog.keys_file.flush()
+    with open(catalog.keys_filename, 'rb') as f:
+        data = f.read()
+    with open(catalog.keys_filename, 'wb') as f:
+        f.write(data[:-3])  # Crash in the middle of a frame
+
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider()
+    assert catalog.keys == ['Boja']
+    catalog.add('2', 'Ekran', 'OLED')
+    catalog.close_spider()
+    assert read_rows(catalog.keys_filename)[1:] == [['0', 'Boja'], ['1', 'Ekran']]
+
+
+class Spider:
+    name = 'gigatron'
+    logger = logging.getLogger('test')
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_resume_when_the_checkpoint_did_not_reach_the_disk(tmp_path, compression):
+    basename = str(tmp_path / 'tehnomanija_spec')
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider()
+    catalog.add('1', 'Boja', 'Crna')
+    catalog.checkpoint()
+    catalog.add('2', 'Boja', 'Bela')
+    offset = catalog.checkpoint()
+    catalog.close_spider()
+    with open(catalog.filename, 'r+b') as f:
+        f.truncate(offset - 3)  # Torn last row / member / frame
+
+    catalog = SpecCatalog(basename, compression)
+    catalog.open_spider(resume_offset=offset)
+    assert catalog.count == 1
+    catalog.add('2', 'Boja', 'Bela')
+    catalog.close_spider()
+    assert read_rows(catalog.filename) == [['providerKey', 'key_id', 'value_id'], ['1', '0', '0'], ['2', '0', '1']]
+
+
+def test_catalog_is_opt_in():
+    settings = Settings()
+    settings.setmodule(project_settings)
+    assert 'catalog' not in settings.getdict('PIPELINE_OUTPUT_FORMATS')['spec']
+
+
+def test_pipeline_does_not_change_items(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    settings.setmodule(project_settings)
+    settings.set('PIPELINE_OUTPUT_FORMATS', {'spec': ['csv', 'catalog']})
+    settings.set('OUTPUT_COMPRESSION', 'gzip')
+    pipeline = SpecPipeline(settings)
+    pipeline.open_spider(Spider)
+    item = SpecItem(providerKey='1', SpecificationKey='Boja', SpecificationValue=None)
+    assert pipeline.process_item(item, Spider) is item
+    assert item['SpecificationValue'] is None
+    pipeline.close_spider(Spider)
+    assert read_rows('gigatron_scrapy_spec_codes.csv.gz') == [['providerKey', 'key_id', 'value_id'], ['1', '0', '0']]
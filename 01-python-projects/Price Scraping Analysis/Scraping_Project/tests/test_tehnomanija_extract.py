@@ -0,0 +1,83 @@
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from project_nonproxy.health import ConnectivityMonitor
+from project_nonproxy.spiders.tehnomanija import TehnomanijaSeleniumSpider
+from project_nonproxy.tehnomanija_extract import extract_product_html, is_complete
+from project_nonproxy.throttle import AdaptiveThrottle
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures', 'tehnomanija')
+SAMSUNG = os.path.join(FIXTURES, 'samsung-televizor-qe65q80catxxh-8806094934126.html')
+
+
+def read_fixture(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_product_page():
+    payload = extract_product_html(read_fixture(SAMSUNG))
+    assert is_complete(payload)
+    assert payload['gtin'] == '8806094934126'
+    assert payload['title'] == 'Samsung televizor QE65Q80CATXXH, 65", QLED, 4K'
+    assert payload['brand'] == 'Samsung'
+    assert payload['price'] == '149.999'
+    assert payload['longdescription'].startswith('Samsung QLED televizor')
+    assert len(payload['specs']) == 24
+    assert payload['specs'][:2] == [('Proizvođač', 'Samsung'), ('Model', 'QE65Q80CATXXH')]
+    assert len(payload['images']) == 6
+    assert all(url.startswith('https://www.tehnomanija.rs/media/catalog/product/') for url in payload['images'])
+
+
+def test_page_without_gtin_is_incomplete():
+    payload = extract_product_html(read_fixture(os.path.join(FIXTURES, 'lg-bez-gtin-123.html')))
+    assert payload['gtin'] is None
+    assert payload['title'] and payload['specs']
+    assert not is_complete(payload)
+
+
+class CompressingHandler(BaseHTTPRequestHandler):
+    """Serves the Samsung page, brotli whenever the client accepts it (like a CDN would)"""
+
+    def do_GET(self):
+        accepted = [encoding.strip() for encoding in self.headers.get('Accept-Encoding', '').split(',')]
+        body = read_fixture(SAMSUNG)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if 'br' in accepted:
+            body = b'not really brotli'
+            self.send_header('Content-Encoding', 'br')
+        elif 'gzip' in accepted:
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def product_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CompressingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/samsung-televizor-qe65q80catxxh-8806094934126.html'
+    server.shutdown()
+    server.server_close()
+
+
+def test_fast_path_only_asks_for_encodings_it_can_decode(product_url):
+    # Only the parts of the spider the fast path uses, no browser
+    spider = TehnomanijaSeleniumSpider.__new__(TehnomanijaSeleniumSpider)
+    spider.throttle = AdaptiveThrottle(start_delay=0, randomize=False)
+    spider.health = ConnectivityMonitor([])
+    spider.setup_session()
+    payload = spider.fetch_product_http(product_url)
+    assert payload is not None and is_complete(payload)
+    assert payload['gtin'] == '8806094934126'
@@ -0,0 +1,49 @@
+from project_nonproxy.throttle import AdaptiveThrottle
+
+A = 'https://www.tehnomanija.rs/p/1'
+B = 'https://www.gigatron.rs/p/1'
+
+
+def make_throttle():
+    return AdaptiveThrottle(start_delay=1.0, max_delay=60.0, target_concurrency=1.0, randomize=False)
+
+
+def test_errors_on_one_domain_leave_the_other_unchanged():
+    throttle = make_throttle()
+    for _ in range(5):
+        throttle.record(A, 0.5)
+        throttle.record(B, 0.5)
+    delay_b = throttle.delay_for(B)
+
+    for _ in range(5):
+        throttle.record(A, 0, ok=False)
+
+    assert throttle.delay_for(B) == delay_b
+    assert throttle.error_rate(B) == 0
+    assert throttle.errors == {'www.tehnomanija.rs': 5}
+    assert throttle.delay_for(A) > 8 * delay_b
+
+
+def test_delay_follows_the_decayed_error_rate():
+    throttle = make_throttle()
+    for _ in range(20):
+        throttle.record(A, 0.5)
+    baseline = throttle.delay_for(A)
+
+    throttle.record(A, 0, ok=False)
+    after_error = throttle.delay_for(A)
+    assert after_error > baseline
+
+    # Successes decay the error rate and the delay comes back down
+    for _ in range(20):
+        throttle.record(A, 0.5)
+    assert throttle.error_rate(A) < 0.01
+    assert throttle.delay_for(A) < after_error
+    assert abs(throttle.delay_for(A) - baseline) < 0.05
+
+
+def test_persistent_errors_are_capped_at_max_delay():
+    throttle = AdaptiveThrottle(start_delay=1.0, max_delay=10.0, randomize=False)
+    for _ in range(30):
+        throttle.record(A, 0, ok=False)
+    assert throttle.delay_for(A) == 10.0